@@ -0,0 +1,179 @@
+"""Per-bot system context cache for bot_runner.
+
+The context is "who you are" + the last completed output + up to 10 docs
+(1000 chars each). Rebuilding it meant an ORDER BY query and re-reading the
+docs folder on every run; both parts are now cached:
+
+  * last output — keyed by the last completed run id. bot_runner calls
+    record_output() after a run completes. Other processes (standalone
+    workers, worker.py) complete runs of the same bot too, so each build
+    checks the id of the bot's latest completed run (an index-only lookup on
+    ix_runs_bot_status_finished) and only loads the output when it changed.
+  * docs — keyed by the folder's signature (directory + file mtimes/sizes).
+    upload_doc and FilesTool.write_file call invalidate_docs(); edits made
+    outside the app are noticed within DOCS_RECHECK_S, when the signature is
+    re-checked (in a thread, like the reads).
+
+With both warm, building the context is one id lookup and no file reads.
+"""
+import asyncio
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import select
+
+from models import Bot, Run, RunBody
+
+DOCS_RECHECK_S = float(os.getenv("CONTEXT_DOCS_RECHECK_S", "10"))
+MAX_DOCS = 10
+DOC_CHARS = 1000
+DOCS_CHARS = 4000
+OUTPUT_CHARS = 2000
+
+
+class _LastOutput:
+    __slots__ = ("run_id", "finished_at", "text")
+
+    def __init__(self, run_id: Optional[str], finished_at, text: Optional[str]):
+        self.run_id = run_id
+        self.finished_at = finished_at
+        self.text = text
+
+
+class _Docs:
+    __slots__ = ("signature", "checked_at", "text")
+
+    def __init__(self, signature: tuple, text: str):
+        self.signature = signature
+        self.checked_at = time.monotonic()
+        self.text = text
+
+
+_outputs: Dict[str, _LastOutput] = {}
+_docs: Dict[str, _Docs] = {}
+_docs_invalidations = 0  # a load that raced invalidate_docs() is not cached
+
+
+def _format_output(finished_at, output: Optional[str]) -> Optional[str]:
+    if not output:
+        return None
+    ts = finished_at.strftime("%d.%m.%Y %H:%M") if finished_at else "?"
+    return f"\nDein letztes Ergebnis ({ts}):\n{output[:OUTPUT_CHARS]}"
+
+
+def _naive(dt):
+    """SQLite hands back naive datetimes, bot_runner passes aware UTC ones — compare them naive."""
+    return dt.replace(tzinfo=None) if dt is not None else None
+
+
+def record_output(bot_id: str, run_id: str, finished_at, output: Optional[str]):
+    """A run completed — it is now the bot's last output (unless a later one already is)."""
+    current = _outputs.get(bot_id)
+    finished_at = _naive(finished_at)
+    if current is not None and current.finished_at and finished_at and current.finished_at > finished_at:
+        return
+    _outputs[bot_id] = _LastOutput(run_id, finished_at, _format_output(finished_at, output))
+
+
+async def _last_output(bot: Bot, db) -> Optional[str]:
+    latest = (await db.execute(
+        select(Run.id, Run.finished_at).filter(
+            Run.bot_id == bot.id,
+            Run.status == "completed"
+        ).order_by(Run.finished_at.desc()).limit(1)
+    )).first()
+    cached = _outputs.get(bot.id)
+    if latest is None:
+        _outputs[bot.id] = _LastOutput(None, None, None)
+    elif cached is None or cached.run_id != latest.id:
+        output = (await db.execute(select(RunBody.output).filter(RunBody.run_id == latest.id))).scalar()
+        _outputs[bot.id] = _LastOutput(latest.id, _naive(latest.finished_at),
+                                       _format_output(latest.finished_at, output))
+    return _outputs[bot.id].text
+
+
+def _docs_signature(path: str) -> Tuple[tuple, list]:
+    """(signature, the files that make up the context) — the first MAX_DOCS regular files."""
+    try:
+        dir_mtime = os.stat(path).st_mtime_ns
+        names = sorted(os.listdir(path))[:MAX_DOCS]
+    except OSError:
+        return (), []
+    files = []
+    for fname in names:
+        fpath = os.path.join(path, fname)
+        try:
+            st = os.stat(fpath)
+        except OSError:
+            continue
+        if os.path.isfile(fpath):
+            files.append((fname, st.st_mtime_ns, st.st_size))
+    return (dir_mtime, tuple(files)), [f[0] for f in files]
+
+
+def _read_docs(path: str, names) -> str:
+    docs_content = []
+    for fname in names:
+        try:
+            with open(os.path.join(path, fname), "r", encoding="utf-8", errors="ignore") as f:
+                docs_content.append(f"--- {fname} ---\n{f.read()[:DOC_CHARS]}")
+        except Exception:
+            pass
+    if not docs_content:
+        return ""
+    return "\nDeine gespeicherten Notizen:\n" + "\n".join(docs_content)[:DOCS_CHARS]
+
+
+def _load_docs(path: str, cached: Optional[_Docs]) -> _Docs:
+    signature, names = _docs_signature(path)
+    if cached is not None and cached.signature == signature:
+        cached.checked_at = time.monotonic()
+        return cached
+    return _Docs(signature, _read_docs(path, names))
+
+
+async def _docs_text(path: Optional[str]) -> str:
+    if not path:
+        return ""
+    cached = _docs.get(path)
+    if cached is not None and time.monotonic() - cached.checked_at < DOCS_RECHECK_S:
+        return cached.text
+    invalidations = _docs_invalidations
+    entry = await asyncio.to_thread(_load_docs, path, cached)
+    if invalidations == _docs_invalidations:
+        _docs[path] = entry
+    return entry.text
+
+
+def invalidate_docs(path: Optional[str]):
+    """A file in `path` was written by the app — re-read it on the next run."""
+    global _docs_invalidations
+    if path:
+        _docs_invalidations += 1
+        _docs.pop(path, None)
+
+
+def forget(bot: Bot):
+    """Drop everything cached for a deleted bot."""
+    _outputs.pop(bot.id, None)
+    invalidate_docs(bot.docs_path)
+
+
+def clear():
+    _outputs.clear()
+    _docs.clear()
+
+
+async def build(bot: Bot, db) -> str:
+    """System context for a run of `bot`. `db` is an AsyncSession (latest run id, output on a miss)."""
+    parts = []
+    if bot.description:
+        parts.append(f"Du bist {bot.name}. {bot.description}")
+    last_output = await _last_output(bot, db)
+    if last_output:
+        parts.append(last_output)
+    docs = await _docs_text(bot.docs_path)
+    if docs:
+        parts.append(docs)
+    return "\n".join(parts) if parts else f"Du bist {bot.name}."
@@ -4,89 +4,92 @@ import json
 import asyncio
 import hashlib
 from datetime import datetime, timezone
-from typing import Dict, Set, Optional
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+from models import Bot, Run, RunBody, Result, new_id, utcnow
+import db_writer
+import rollups
+import search_index
+import events
+import ws_hub
+import run_replay
+import llm_clients
+import settings_cache
+import bot_context
+import limits
+import run_jobs
+import run_queue
 
-from sqlalchemy.orm import Session
-from models import Bot, Run, Result, Setting, new_id, utcnow
-
-# Active WebSocket connections per bot_id
-ws_connections: Dict[str, Set] = {}
 # Active tasks for cancellation
 active_tasks: Dict[str, asyncio.Task] = {}
+_broadcast_listeners: List = []  # see add_broadcast_listener()
 
-# Concurrency limiter
-_semaphore: Optional[asyncio.Semaphore] = None
 
-def get_semaphore() -> asyncio.Semaphore:
-    global _semaphore
-    if _semaphore is None:
-        _semaphore = asyncio.Semaphore(3)
-    return _semaphore
 
+def broadcast(bot_id: str, message: dict):
+    if message.get("run_id"):
+        run_replay.record(bot_id, message["run_id"], message)
+    ws_hub.publish(bot_id, message)
+    for listener in _broadcast_listeners:
+        listener(bot_id, message)
 
-async def broadcast(bot_id: str, message: dict):
-    conns = ws_connections.get(bot_id, set())
-    dead = set()
-    for ws in conns:
-        try:
-            await ws.send_json(message)
-        except Exception:
-            dead.add(ws)
-    conns -= dead
 
+def add_broadcast_listener(listener):
+    """Also hand every live run message to `listener(bot_id, message)` (worker_relay)."""
+    _broadcast_listeners.append(listener)
+
+
+# Streamed LLM deltas are batched into one "token" message per STREAM_FLUSH_MS
+STREAM_FLUSH_S = float(os.getenv("STREAM_FLUSH_MS", "50")) / 1000
+
+
+class TokenStream:
+    """Collects a run's streamed output and forwards it as {"type": "token"} messages."""
+
+    def __init__(self, bot_id: str, run_id: str):
+        self.bot_id = bot_id
+        self.run_id = run_id
+        self.parts: List[str] = []  # everything streamed so far, across tool-call rounds
+        self._pending: List[str] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+    def feed(self, text: Optional[str]):
+        if not text:
+            return
+        self.parts.append(text)
+        self._pending.append(text)
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(STREAM_FLUSH_S, self.flush)
 
-def _get_setting(db, key: str) -> Optional[str]:
-    s = db.query(Setting).get(key)
-    return s.value if s else None
+    def flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._pending:
+            broadcast(self.bot_id, {"type": "token", "run_id": self.run_id, "text": "".join(self._pending)})
+            self._pending = []
 
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
 
-def _get_key_for_model(model: str, db) -> tuple:
+
+def _get_key_for_model(model: str, settings: settings_cache.SettingsSnapshot) -> tuple:
     """Returns (provider, api_key_or_url) for the given model."""
     if model.startswith("gpt") or model.startswith("o1") or model.startswith("o3") or model.startswith("o4"):
-        return "openai", _get_setting(db, "openai_api_key")
+        return "openai", settings.get("openai_api_key")
     elif model.startswith("claude"):
-        return "anthropic", _get_setting(db, "anthropic_api_key")
+        return "anthropic", settings.get("anthropic_api_key")
     elif model.startswith("gemini"):
-        return "google", _get_setting(db, "google_api_key")
+        return "google", settings.get("google_api_key")
     elif model.startswith("mistral") or model.startswith("pixtral") or model.startswith("codestral"):
-        return "mistral", _get_setting(db, "mistral_api_key")
+        return "mistral", settings.get("mistral_api_key")
     elif "/" in model:  # ollama format: llama3.1:8b or similar
-        return "ollama", _get_setting(db, "ollama_base_url") or "http://localhost:11434"
+        return "ollama", settings.get("ollama_base_url") or "http://localhost:11434"
     else:
         # Default: try openai
-        return "openai", _get_setting(db, "openai_api_key")
-
-
-def _build_context(bot: Bot, db) -> str:
-    """Build system context with bot memory (last output + docs)."""
-    parts = []
-    if bot.description:
-        parts.append(f"Du bist {bot.name}. {bot.description}")
-
-    # Last run output
-    last_run = db.query(Run).filter(
-        Run.bot_id == bot.id,
-        Run.status == "completed"
-    ).order_by(Run.finished_at.desc()).first()
-    if last_run and last_run.output:
-        ts = last_run.finished_at.strftime("%d.%m.%Y %H:%M") if last_run.finished_at else "?"
-        parts.append(f"\nDein letztes Ergebnis ({ts}):\n{last_run.output[:2000]}")
-
-    # Bot docs
-    if bot.docs_path and os.path.isdir(bot.docs_path):
-        docs_content = []
-        for fname in sorted(os.listdir(bot.docs_path))[:10]:
-            fpath = os.path.join(bot.docs_path, fname)
-            if os.path.isfile(fpath):
-                try:
-                    with open(fpath, "r", encoding="utf-8", errors="ignore") as f:
-                        docs_content.append(f"--- {fname} ---\n{f.read()[:1000]}")
-                except Exception:
-                    pass
-        if docs_content:
-            parts.append(f"\nDeine gespeicherten Notizen:\n" + "\n".join(docs_content)[:4000])
-
-    return "\n".join(parts) if parts else f"Du bist {bot.name}."
+        return "openai", settings.get("openai_api_key")
 
 
 # Pricing per 1M tokens (input, output)
@@ -113,26 +116,57 @@ def _estimate_cost(model: str, tokens_in: int, tokens_out: int) -> float:
     return (tokens_in * prices[0] + tokens_out * prices[1]) / 1_000_000
 
 
-async def run_bot(bot: Bot, run: Run, db_factory, input_context: str = None):
-    """Execute a bot run with context, token tracking, and timeout."""
+def lease_for(bot: Bot, settings: settings_cache.SettingsSnapshot) -> limits.Lease:
+    """The limits a run of `bot` is subject to (runs without a key use the mock provider)."""
+    provider, key = _get_key_for_model(bot.model, settings)
+    return limits.lease(settings, provider if key else "mock", bot.model, key)
+
+
+async def run_bot(bot: Bot, run: Run, db_factory, input_context: str = None, lease: limits.Lease = None):
+    """Execute a bot run with context, token tracking, and timeout.
+
+    db_factory must return an AsyncSession (e.g. database.AsyncSessionLocal) —
+    all DB access here happens on the event loop. Runs normally come from
+    run_queue with their lease already acquired; without one, run_bot waits
+    for the limits itself.
+    """
     log_lines = []
-    sem = get_semaphore()
+    stream = TokenStream(bot.id, run.id)
 
     async def log(msg: str):
+        stream.flush()  # streamed text before this line goes out first
         ts = datetime.now().strftime("%H:%M:%S")
         line = f"{ts}  {msg}"
         log_lines.append(line)
-        await broadcast(bot.id, {"type": "log", "run_id": run.id, "line": line})
+        broadcast(bot.id, {"type": "log", "run_id": run.id, "line": line})
 
-    await log(f"Starte {bot.emoji} {bot.name}...")
-    await broadcast(bot.id, {"type": "status", "bot_id": bot.id, "status": "running"})
+    if run.status == "queued":
+        started_at = utcnow()
+
+        async def mark_running(db):
+            db_run = await db.get(Run, run.id)
+            if db_run:
+                db_run.status = "running"
+                db_run.started_at = started_at  # duration counts from here, not from queueing
 
-    # Wait for semaphore slot
-    async with sem:
+        await db_writer.submit(mark_running)
+        run.status, run.started_at = "running", started_at
+
+    await log(f"Starte {bot.emoji} {bot.name}...")
+    broadcast(bot.id, {"type": "status", "bot_id": bot.id, "run_id": run.id, "status": "running"})
+    events.publish("run_started", run_id=run.id, bot_id=bot.id, trigger=run.trigger)
+
+    # Wait for a slot on every limit that applies (provider / model / key, see limits.py)
+    if lease is None:
+        lease = lease_for(bot, await settings_cache.snapshot())
+        blocked = lease.blocked_by()
+        if blocked:
+            await log(f"⏳ Warte auf freien Slot ({blocked})...")
+    async with lease:
         try:
             timeout = bot.max_runtime_seconds if hasattr(bot, 'max_runtime_seconds') and bot.max_runtime_seconds else 120
             output, tokens_in, tokens_out = await asyncio.wait_for(
-                _call_llm(bot, log, db_factory, input_context),
+                _call_llm(bot, log, db_factory, input_context, on_delta=stream.feed, lease=lease),
                 timeout=timeout
             )
             await log(f"✅ Fertig.")
@@ -140,21 +174,22 @@ async def run_bot(bot: Bot, run: Run, db_factory, input_context: str = None):
             output_hash = hashlib.md5(output.encode()).hexdigest()[:16] if output else None
             cost = _estimate_cost(bot.model, tokens_in or 0, tokens_out or 0)
 
-            db = db_factory()
-            try:
-                db_run = db.query(Run).get(run.id)
+            finished_at = utcnow()
+
+            async def finish(db):
+                db_run = await db.get(Run, run.id)
+                if db_run is None or db_run.status == "cancelled" or not await run_jobs.owns(db, db_run):
+                    return False  # cancelled through another process, or our lease was recovered meanwhile
                 db_run.status = "completed"
-                db_run.output = output
-                db_run.log = "\n".join(log_lines)
-                db_run.finished_at = utcnow()
+                db_run.model = bot.model
+                db_run.finished_at = finished_at
                 db_run.tokens_in = tokens_in
                 db_run.tokens_out = tokens_out
                 db_run.cost_estimate = cost
                 db_run.output_hash = output_hash
-                try:
-                    db_run.duration_ms = int((db_run.finished_at.replace(tzinfo=None) - db_run.started_at.replace(tzinfo=None)).total_seconds() * 1000)
-                except Exception:
-                    db_run.duration_ms = 0
+                db_run.duration_ms = _duration_ms(db_run)
+                await db.merge(RunBody(run_id=run.id, output=output, log="\n".join(log_lines)))
+                await rollups.record_run(db, db_run)
 
                 result = Result(
                     id=new_id(), bot_id=bot.id, run_id=run.id,
@@ -162,32 +197,42 @@ async def run_bot(bot: Bot, run: Run, db_factory, input_context: str = None):
                     content=output,
                 )
                 db.add(result)
-                db.commit()
-            finally:
-                db.close()
+                await search_index.index_run(db, run.id, result.title, output, "\n".join(log_lines))
+                return True
+
+            if not await db_writer.submit(finish):
+                raise asyncio.CancelledError
+            bot_context.record_output(bot.id, run.id, finished_at, output)
 
-            await broadcast(bot.id, {"type": "status", "bot_id": bot.id, "status": "completed"})
-            await broadcast(bot.id, {"type": "run_complete", "run_id": run.id, "status": "completed"})
+            broadcast(bot.id, {"type": "status", "bot_id": bot.id, "run_id": run.id, "status": "completed"})
+            broadcast(bot.id, {"type": "run_complete", "run_id": run.id, "status": "completed"})
+            events.publish("run_finished", run_id=run.id, bot_id=bot.id, status="completed")
             await _check_triggers(bot.id, "completed", output, db_factory)
 
         except asyncio.TimeoutError:
             await log(f"⏰ Timeout nach {bot.max_runtime_seconds if hasattr(bot, 'max_runtime_seconds') else 120}s")
-            _save_error(run.id, "timeout", "Timeout — Bot hat zu lange gebraucht", log_lines, db_factory)
-            await broadcast(bot.id, {"type": "status", "bot_id": bot.id, "status": "timeout"})
+            if await _save_error(run.id, "timeout", "Timeout — Bot hat zu lange gebraucht", log_lines, bot.model,
+                                 output=stream.text or None):
+                broadcast(bot.id, {"type": "status", "bot_id": bot.id, "run_id": run.id, "status": "timeout"})
+                events.publish("run_finished", run_id=run.id, bot_id=bot.id, status="timeout")
 
         except asyncio.CancelledError:
             await log(f"🚫 Abgebrochen")
-            _save_error(run.id, "cancelled", "Manuell abgebrochen", log_lines, db_factory)
-            await broadcast(bot.id, {"type": "status", "bot_id": bot.id, "status": "cancelled"})
+            if await _save_error(run.id, "cancelled", "Manuell abgebrochen", log_lines, bot.model,
+                                 output=stream.text or None):
+                broadcast(bot.id, {"type": "status", "bot_id": bot.id, "run_id": run.id, "status": "cancelled"})
+                events.publish("run_finished", run_id=run.id, bot_id=bot.id, status="cancelled")
 
         except Exception as e:
             error_msg = _classify_error(e)
             await log(f"❌ Fehler: {error_msg}")
-            _save_error(run.id, "failed", error_msg, log_lines, db_factory)
-            await broadcast(bot.id, {"type": "status", "bot_id": bot.id, "status": "failed"})
+            if await _save_error(run.id, "failed", error_msg, log_lines, bot.model, output=stream.text or None):
+                broadcast(bot.id, {"type": "status", "bot_id": bot.id, "run_id": run.id, "status": "failed"})
+                events.publish("run_finished", run_id=run.id, bot_id=bot.id, status="failed")
 
     # Remove from active tasks
     active_tasks.pop(run.id, None)
+    run_replay.finish(run.id)
 
 
 def _classify_error(e: Exception) -> str:
@@ -207,36 +252,89 @@ def _classify_error(e: Exception) -> str:
         return str(e)[:200]
 
 
-def _save_error(run_id, status, error_msg, log_lines, db_factory):
-    db = db_factory()
+def _duration_ms(db_run: Run) -> int:
     try:
-        db_run = db.query(Run).get(run_id)
-        if db_run:
+        return int((db_run.finished_at.replace(tzinfo=None) - db_run.started_at.replace(tzinfo=None)).total_seconds() * 1000)
+    except Exception:
+        return 0
+
+
+async def _save_error(run_id, status, error_msg, log_lines, model=None, output=None) -> bool:
+    """Mark the run as failed/timed out/cancelled. `output` keeps what was streamed before.
+
+    False if the run isn't this worker's to finish (lease recovered, or finished
+    elsewhere); a run cancelled elsewhere still gets what was streamed here.
+    """
+    async def fail(db):
+        db_run = await db.get(Run, run_id)
+        if db_run is None:
+            return False
+        owned = await run_jobs.owns(db, db_run)
+        if not owned and db_run.status != "cancelled":
+            return False
+        if owned and db_run.finished_at is None:
             db_run.status = status
+            db_run.model = model
             db_run.error_message = error_msg
-            db_run.log = "\n".join(log_lines)
             db_run.finished_at = utcnow()
-            try:
-                db_run.duration_ms = int((db_run.finished_at.replace(tzinfo=None) - db_run.started_at.replace(tzinfo=None)).total_seconds() * 1000)
-            except Exception:
-                db_run.duration_ms = 0
-            db.commit()
-    finally:
-        db.close()
-
-
-async def _call_llm(bot: Bot, log, db_factory, input_context: str = None) -> tuple:
-    """Call LLM with optional tool-calling loop. Returns (output, tokens_in, tokens_out)."""
+            db_run.duration_ms = _duration_ms(db_run)
+            await rollups.record_run(db, db_run)
+        await db.merge(RunBody(run_id=run_id, output=output, log="\n".join(log_lines)))
+        await search_index.index_run(db, run_id, body=db_run.error_message, log="\n".join(log_lines))
+        return owned
+
+    return await db_writer.submit(fail)
+
+
+async def _openai_stream(client, kwargs: dict, on_delta, on_chunk=None) -> tuple:
+    """One streamed chat completion (OpenAI or OpenAI-compatible, e.g. Ollama).
+
+    Forwards content deltas to on_delta and reassembles tool calls from their
+    fragments; on_chunk is called for every chunk that carries either. Returns (text, tool_calls, finish_reason, tokens_in, tokens_out),
+    tool_calls in the assistant-message format the next round expects.
+    """
+    stream = await client.chat.completions.create(**kwargs, stream=True, stream_options={"include_usage": True})
+    text, calls = [], {}
+    finish_reason, tokens_in, tokens_out = None, 0, 0
+    async for chunk in stream:
+        if chunk.usage:  # final chunk, no choices
+            tokens_in, tokens_out = chunk.usage.prompt_tokens, chunk.usage.completion_tokens
+        if not chunk.choices:
+            continue
+        choice = chunk.choices[0]
+        delta = choice.delta
+        if on_chunk is not None and (delta.content or delta.tool_calls):
+            on_chunk()
+        if delta.content:
+            text.append(delta.content)
+            on_delta(delta.content)
+        for tc in delta.tool_calls or ():
+            call = calls.setdefault(tc.index, {"id": None, "type": "function", "function": {"name": "", "arguments": ""}})
+            if tc.id:
+                call["id"] = tc.id
+            if tc.function:
+                call["function"]["name"] += tc.function.name or ""
+                call["function"]["arguments"] += tc.function.arguments or ""
+        if choice.finish_reason:
+            finish_reason = choice.finish_reason
+    return "".join(text), [calls[i] for i in sorted(calls)], finish_reason, tokens_in, tokens_out
+
+
+async def _call_llm(bot: Bot, log, db_factory, input_context: str = None, on_delta=None, lease=None) -> tuple:
+    """Call LLM with optional tool-calling loop. Returns (output, tokens_in, tokens_out).
+
+    OpenAI, Anthropic and Ollama stream; every text delta is passed to on_delta.
+    Every API request goes through lease.request() (buckets, 429 retries,
+    adaptive concurrency) and charges its tokens to the lease.
+    """
     import json as _json
     from tools import get_tool_schemas, execute_tool_call
 
-    db = db_factory()
-    try:
-        provider, key = _get_key_for_model(bot.model, db)
-        system_prompt = _build_context(bot, db)
-        brave_key = _get_setting(db, "brave_api_key")
-    finally:
-        db.close()
+    settings = await settings_cache.snapshot()
+    provider, key = _get_key_for_model(bot.model, settings)
+    brave_key = settings.get("brave_api_key")
+    async with db_factory() as db:
+        system_prompt = await bot_context.build(bot, db)
 
     user_message = bot.prompt
     if input_context:
@@ -250,11 +348,16 @@ async def _call_llm(bot: Bot, log, db_factory, input_context: str = None) -> tup
         pass
 
     tool_schemas = get_tool_schemas(enabled_tools, brave_key, bot.docs_path) if enabled_tools else []
+    emit = on_delta or (lambda text: None)
+    lease = lease or limits.Lease([], [], [])
+
+    def on_delta(text):
+        lease.first_token()
+        emit(text)
 
     if provider == "openai" and key:
         await log(f"Verwende OpenAI ({bot.model})...")
-        import openai
-        client = openai.AsyncOpenAI(api_key=key)
+        client = llm_clients.get("openai", key)
         messages = [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_message},
@@ -265,29 +368,29 @@ async def _call_llm(bot: Bot, log, db_factory, input_context: str = None) -> tup
             kwargs = {"model": bot.model, "messages": messages, "max_tokens": 4000}
             if tool_schemas and iteration < 8:
                 kwargs["tools"] = tool_schemas
-            resp = await client.chat.completions.create(**kwargs)
-            if resp.usage:
-                total_in += resp.usage.prompt_tokens
-                total_out += resp.usage.completion_tokens
-
-            choice = resp.choices[0]
-            if choice.finish_reason == "tool_calls" and choice.message.tool_calls:
-                messages.append(choice.message)
-                for tc in choice.message.tool_calls:
-                    fn = tc.function.name
-                    args = _json.loads(tc.function.arguments) if tc.function.arguments else {}
+            text, tool_calls, finish_reason, tokens_in, tokens_out = await lease.request(
+                # first_token on tool-call chunks too: a tool-only round streams no text
+                lambda: _openai_stream(client, kwargs, on_delta, lease.first_token))
+            lease.record_tokens(tokens_in + tokens_out)
+            total_in += tokens_in
+            total_out += tokens_out
+
+            if finish_reason == "tool_calls" and tool_calls:
+                messages.append({"role": "assistant", "content": text or None, "tool_calls": tool_calls})
+                for tc in tool_calls:
+                    fn = tc["function"]["name"]
+                    args = _json.loads(tc["function"]["arguments"]) if tc["function"]["arguments"] else {}
                     await log(f"🔧 Tool: {fn}({', '.join(f'{k}={v!r}' for k,v in args.items())})")
                     result = await execute_tool_call(fn, args, enabled_tools, brave_key, bot.docs_path)
-                    messages.append({"role": "tool", "tool_call_id": tc.id, "content": result[:4000]})
+                    messages.append({"role": "tool", "tool_call_id": tc["id"], "content": result[:4000]})
             else:
-                return choice.message.content or "", total_in, total_out
+                return text, total_in, total_out
 
         return messages[-1].get("content", "") if isinstance(messages[-1], dict) else "", total_in, total_out
 
     elif provider == "anthropic" and key:
         await log(f"Verwende Anthropic ({bot.model})...")
-        import anthropic
-        client = anthropic.AsyncAnthropic(api_key=key)
+        client = llm_clients.get("anthropic", key)
 
         # Convert tool schemas to Anthropic format
         anthro_tools = []
@@ -306,7 +409,17 @@ async def _call_llm(bot: Bot, log, db_factory, input_context: str = None) -> tup
             kwargs = {"model": bot.model, "max_tokens": 4000, "system": system_prompt, "messages": messages}
             if anthro_tools and iteration < 8:
                 kwargs["tools"] = anthro_tools
-            resp = await client.messages.create(**kwargs)
+            async def request():
+                async with client.messages.stream(**kwargs) as stream:
+                    async for event in stream:
+                        if event.type in ("content_block_start", "content_block_delta"):
+                            lease.first_token()  # text or tool_use
+                        if event.type == "content_block_delta" and event.delta.type == "text_delta":
+                            on_delta(event.delta.text)
+                    return await stream.get_final_message()
+
+            resp = await lease.request(request)
+            lease.record_tokens(resp.usage.input_tokens + resp.usage.output_tokens)
             total_in += resp.usage.input_tokens
             total_out += resp.usage.output_tokens
 
@@ -333,69 +446,78 @@ async def _call_llm(bot: Bot, log, db_factory, input_context: str = None) -> tup
         import google.generativeai as genai
         genai.configure(api_key=key)
         model = genai.GenerativeModel(bot.model, system_instruction=system_prompt)
-        resp = await asyncio.to_thread(model.generate_content, user_message)
+        resp = await lease.request(lambda: asyncio.to_thread(model.generate_content, user_message))
         tokens_in = resp.usage_metadata.prompt_token_count if hasattr(resp, 'usage_metadata') else 0
         tokens_out = resp.usage_metadata.candidates_token_count if hasattr(resp, 'usage_metadata') else 0
+        lease.record_tokens(tokens_in + tokens_out)
         return resp.text, tokens_in, tokens_out
 
     elif provider == "mistral" and key:
         await log(f"Verwende Mistral ({bot.model})...")
-        from mistralai import Mistral
-        client = Mistral(api_key=key)
-        resp = await asyncio.to_thread(
+        client = llm_clients.get("mistral", key)
+        resp = await lease.request(lambda: asyncio.to_thread(
             client.chat.complete, model=bot.model,
             messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_message}],
-        )
+        ))
         usage = resp.usage
+        lease.record_tokens((usage.prompt_tokens + usage.completion_tokens) if usage else 0)
         return resp.choices[0].message.content, usage.prompt_tokens if usage else 0, usage.completion_tokens if usage else 0
 
     elif provider == "ollama":
         base_url = key if key != "ollama" else "http://localhost:11434"
         await log(f"Verwende Ollama ({bot.model})...")
-        import openai
-        client = openai.AsyncOpenAI(base_url=f"{base_url}/v1", api_key="ollama")
-        resp = await client.chat.completions.create(
-            model=bot.model,
-            messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_message}],
-        )
-        usage = resp.usage
-        return resp.choices[0].message.content, usage.prompt_tokens if usage else 0, usage.completion_tokens if usage else 0
+        client = llm_clients.get("ollama", "ollama", f"{base_url}/v1")
+        text, _, _, tokens_in, tokens_out = await lease.request(lambda: _openai_stream(client, {
+            "model": bot.model,
+            "messages": [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_message}],
+        }, on_delta, lease.first_token))
+        lease.record_tokens(tokens_in + tokens_out)
+        return text, tokens_in, tokens_out
 
     else:
         await log("⚠️ Kein API-Key konfiguriert — verwende Mock...")
         await asyncio.sleep(1)
-        return (
+        text = (
             f"[Mock] Kein API-Key für '{bot.model}' konfiguriert.\n"
             f"Bitte in den Einstellungen einen Key hinterlegen.\n\n"
-            f"Bot: {bot.name}\nPrompt: {bot.prompt[:200]}",
-            0, 0
+            f"Bot: {bot.name}\nPrompt: {bot.prompt[:200]}"
         )
+        on_delta(text)
+        return text, 0, 0
 
 
 async def _check_triggers(source_bot_id: str, event: str, output: str, db_factory):
     """Fire triggers with payload (output forwarding)."""
     from models import Trigger
-    db = db_factory()
-    try:
-        triggers = db.query(Trigger).filter(
+    async with db_factory() as db:
+        triggers = (await db.execute(select(Trigger).filter(
             Trigger.source_bot == source_bot_id,
             Trigger.event == event,
             Trigger.enabled == True,
-        ).all()
+        ))).scalars().all()
 
+        targets = []
         for trigger in triggers:
-            target = db.query(Bot).get(trigger.target_bot)
+            target = await db.get(Bot, trigger.target_bot)
             if target:
-                run = Run(
-                    id=new_id(),
-                    bot_id=target.id,
-                    trigger=f"trigger:{source_bot_id}",
-                    status="running",
-                    input=output[:4000] if output else None,  # Forward output as input
-                )
-                db.add(run)
-                db.commit()
-                task = asyncio.create_task(run_bot(target, run, db_factory, input_context=output))
-                active_tasks[run.id] = task
-    finally:
-        db.close()
+                targets.append(target)
+
+    if not targets:
+        return
+
+    runs = [Run(
+        id=new_id(),
+        bot_id=target.id,
+        trigger=f"trigger:{source_bot_id}",
+        status="queued",
+        input=output[:4000] if output else None,  # Forward output as input
+    ) for target in targets]
+
+    async def insert_runs(db):
+        db.add_all(runs)
+
+    await db_writer.submit(insert_runs)
+    events.publish("trigger_fired", source_bot_id=source_bot_id, event=event,
+                   runs=[{"run_id": run.id, "bot_id": run.bot_id} for run in runs])
+    for target, run in zip(targets, runs):
+        run_queue.submit(target, run, input_context=output)
@@ -1,20 +1,101 @@
 import os
-from sqlalchemy import create_engine
+import zlib
+from typing import Optional
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 
 DB_PATH = os.getenv("DATABASE_URL", "sqlite:///./openorchestrator.db")
 
+
+def _async_url(url: str) -> str:
+    """Map a sync SQLAlchemy URL to its async driver (sqlite -> aiosqlite)."""
+    if url.startswith("sqlite:///"):
+        return url.replace("sqlite:///", "sqlite+aiosqlite:///", 1)
+    return url
+
+
+# Applied to every new SQLite connection (both engines). WAL lets the dashboard's
+# reads proceed while a run commits; busy_timeout makes writers wait instead of
+# failing with "database is locked".
+SQLITE_PRAGMAS = {
+    "auto_vacuum": "INCREMENTAL",  # only takes effect on a brand-new file; see migration 005
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"),
+    "mmap_size": os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)),
+    "cache_size": os.getenv("SQLITE_CACHE_SIZE", "-65536"),  # negative = KiB, i.e. 64 MB
+    "temp_store": "MEMORY",
+}
+
+
+def pack_text(value: Optional[str]) -> Optional[bytes]:
+    """zlib-compress a large text body (run logs/outputs) for storage."""
+    if value is None:
+        return None
+    return zlib.compress(value.encode("utf-8"), 6)
+
+
+def unpack_text(value) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, str):  # rows written before compression
+        return value
+    return zlib.decompress(value).decode("utf-8")
+
+
+def _configure_sqlite(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+    # inflate(blob) -> text, so SQL can still look inside compressed bodies
+    dbapi_connection.create_function("inflate", 1, unpack_text, deterministic=True)
+
+
+# Sync engine — DDL, migrations and the remaining sync (threadpool) routes
 engine = create_engine(DB_PATH, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine — everything running on the event loop (runner, scheduler, async routes)
+async_engine = create_async_engine(_async_url(DB_PATH))
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+if DB_PATH.startswith("sqlite"):
+    event.listen(engine, "connect", _configure_sqlite)
+    event.listen(async_engine.sync_engine, "connect", _configure_sqlite)
+
 
 class Base(DeclarativeBase):
     pass
 
 
 def get_db():
+    """Sync session dependency. Only use from plain `def` routes (they run in the threadpool)."""
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+def read_snapshot(db):
+    """Pin all further SELECTs of this sync session to one WAL snapshot.
+
+    pysqlite only opens a transaction for writes, so consecutive reads would
+    otherwise each see the latest commit. Ends with the session (rollback/close).
+    """
+    db.connection().exec_driver_sql("BEGIN")
+
+
+async def get_async_db():
+    """Async session dependency for `async def` routes — never blocks the event loop."""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def dispose_engines():
+    await async_engine.dispose()
+    engine.dispose()
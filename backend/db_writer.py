@@ -0,0 +1,115 @@
+"""Single-writer commit queue — groups run/result/log writes into batched transactions.
+
+SQLite allows one writer at a time. Instead of every finishing run opening its
+own session and racing for the lock, runner code submits small write jobs here;
+one task drains the queue and commits up to BATCH_MAX jobs per transaction.
+
+A job is `async def job(db: AsyncSession) -> Any` that only stages changes
+(db.add, attribute updates) — the writer commits. submit() resolves once the
+job's batch is durable and returns the job's return value.
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+from database import AsyncSessionLocal
+
+logger = logging.getLogger("db_writer")
+
+BATCH_MAX = int(os.getenv("DB_WRITER_BATCH_MAX", "64"))
+BATCH_WINDOW_S = float(os.getenv("DB_WRITER_BATCH_WINDOW_MS", "20")) / 1000
+
+Job = Callable[[Any], Awaitable[Any]]
+
+_queue: Optional[asyncio.Queue] = None
+_task: Optional[asyncio.Task] = None
+
+
+async def submit(job: Job) -> Any:
+    """Queue a write job and wait until it is committed. Runs inline if the writer is not started."""
+    if _task is None or _task.done():
+        async with AsyncSessionLocal() as db:
+            result = await job(db)
+            await db.commit()
+            return result
+    fut = asyncio.get_running_loop().create_future()
+    await _queue.put((job, fut))
+    return await fut
+
+
+async def _run_batch(batch: List[Tuple[Job, asyncio.Future]]):
+    results = []
+    try:
+        async with AsyncSessionLocal() as db:
+            for job, _ in batch:
+                results.append(await job(db))
+            await db.commit()
+    except Exception:
+        if len(batch) == 1:
+            raise
+        # One bad job must not sink its neighbours — replay them one transaction each
+        logger.exception("Batch of %d writes failed, retrying individually", len(batch))
+        for job, fut in batch:
+            try:
+                async with AsyncSessionLocal() as db:
+                    res = await job(db)
+                    await db.commit()
+                if not fut.done():
+                    fut.set_result(res)
+            except Exception as e:
+                if not fut.done():
+                    fut.set_exception(e)
+        return
+    for (_, fut), res in zip(batch, results):
+        if not fut.done():
+            fut.set_result(res)
+
+
+async def _writer_loop():
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await _queue.get()]
+        deadline = loop.time() + BATCH_WINDOW_S
+        while len(batch) < BATCH_MAX:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        try:
+            await _run_batch(batch)
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+        finally:
+            for _ in batch:
+                _queue.task_done()
+
+
+def start_writer():
+    """Start the writer task on the running loop (call from the FastAPI lifespan)."""
+    global _queue, _task
+    if _task is not None and not _task.done():
+        return
+    _queue = asyncio.Queue()
+    _task = asyncio.create_task(_writer_loop(), name="db-writer")
+    print("[db_writer] Started")
+
+
+async def stop_writer():
+    """Flush pending writes and stop the writer task."""
+    global _task
+    if _task is None:
+        return
+    await _queue.join()
+    _task.cancel()
+    try:
+        await _task
+    except asyncio.CancelledError:
+        pass
+    _task = None
+    print("[db_writer] Stopped")
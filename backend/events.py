@@ -0,0 +1,98 @@
+"""Global event stream — run, trigger and pipeline events with resumable ids.
+
+Producers (bot_runner, pipeline_runner) call publish() on the event loop; it
+appends to an in-memory ring of the last EVENT_BUFFER events and wakes every
+subscriber. Subscribers read from the ring by sequence number, so a slow
+client never blocks a producer — it just falls behind, and if it falls off the
+end of the ring it gets a "reset" event telling it to reload its state.
+
+Event ids are "<boot>:<seq>". A client reconnecting with Last-Event-ID gets
+everything after that id; an id from another process (restart) or one that
+has already left the ring yields "reset" first.
+"""
+import asyncio
+import os
+import time
+import uuid
+from collections import deque
+from itertools import islice
+from typing import AsyncIterator, Callable, List, Optional, Tuple
+
+EVENT_BUFFER = int(os.getenv("EVENT_BUFFER", "1000"))
+
+_boot = uuid.uuid4().hex[:8]
+_seq = 0
+_ring: deque = deque(maxlen=EVENT_BUFFER)  # (seq, event)
+_wakeup: Optional[asyncio.Event] = None
+_listeners: List[Callable[[dict], None]] = []  # see add_listener()
+
+
+def _event_id(seq: int) -> str:
+    return f"{_boot}:{seq}"
+
+
+def _signal():
+    global _wakeup
+    if _wakeup is not None:
+        _wakeup.set()
+    _wakeup = asyncio.Event()
+
+
+def publish(type: str, **data) -> str:
+    """Append an event and wake subscribers. Must be called on the event loop."""
+    global _seq
+    _seq += 1
+    event = {"id": _event_id(_seq), "type": type, "ts": time.time(), **data}
+    _ring.append((_seq, event))
+    _signal()
+    for listener in _listeners:
+        listener(event)
+    return event["id"]
+
+
+def add_listener(listener: Callable[[dict], None]):
+    """Also hand every published event to `listener` (worker_relay forwards them to the API node)."""
+    _listeners.append(listener)
+
+
+def _parse(last_event_id: Optional[str]) -> Optional[int]:
+    """Sequence to resume after, or None if the id can't be resumed from."""
+    if not last_event_id:
+        return _seq  # fresh subscriber: live events only
+    boot, _, seq = last_event_id.partition(":")
+    if boot != _boot or not seq.isdigit():
+        return None
+    seq = int(seq)
+    oldest = _ring[0][0] if _ring else _seq + 1
+    if seq > _seq or seq < oldest - 1:
+        return None
+    return seq
+
+
+async def subscribe(last_event_id: Optional[str] = None, heartbeat: float = 15.0) -> AsyncIterator[Tuple[str, Optional[dict]]]:
+    """Yield ("event", event) from after last_event_id on, ("reset", event) when
+    the client must resync, and ("heartbeat", None) when idle for `heartbeat` s."""
+    if _wakeup is None:
+        _signal()
+    after = _parse(last_event_id)
+    if after is None:
+        yield "reset", {"id": _event_id(_seq), "type": "reset"}
+        after = _seq
+    while True:
+        wakeup = _wakeup
+        oldest = _ring[0][0] if _ring else _seq + 1
+        if after < oldest - 1:
+            # Fell off the ring while we were sending
+            yield "reset", {"id": _event_id(_seq), "type": "reset"}
+            after = _seq
+            continue
+        pending = list(islice(_ring, max(0, after - oldest + 1), None))  # seqs in the ring are contiguous
+        if pending:
+            for _, event in pending:
+                yield "event", event
+            after = pending[-1][0]
+            continue
+        try:
+            await asyncio.wait_for(wakeup.wait(), heartbeat)
+        except asyncio.TimeoutError:
+            yield "heartbeat", None
@@ -0,0 +1,136 @@
+"""Streaming run exports — CSV / NDJSON, optionally gzipped, in constant memory.
+
+Rows come from a server-side cursor (yield_per) on a session owned by the
+generator, are encoded in chunks of CHUNK_ROWS and handed straight to a
+StreamingResponse. Nothing holds more than one chunk, however long the history.
+Bodies (input/output/log) are only joined and decompressed when requested.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from database import SessionLocal
+from models import Run, RunBody, naive_utc
+
+CHUNK_ROWS = 500
+
+FIELDS = {
+    "id": Run.id,
+    "started_at": Run.started_at,
+    "finished_at": Run.finished_at,
+    "status": Run.status,
+    "trigger": Run.trigger,
+    "model": Run.model,
+    "duration_ms": Run.duration_ms,
+    "tokens_in": Run.tokens_in,
+    "tokens_out": Run.tokens_out,
+    "cost_estimate": Run.cost_estimate,
+    "error_message": Run.error_message,
+    "input": RunBody.input,
+    "output": RunBody.output,
+    "log": RunBody.log,
+}
+BODY_FIELDS = {"input", "output", "log"}
+DEFAULT_FIELDS = [f for f in FIELDS if f != "log"]
+# GET /api/bots/{id}/export-csv without `fields` keeps its original layout
+LEGACY_CSV_HEADER = "Zeitpunkt;Status;Dauer (s);Tokens;Kosten ($);Output"
+LEGACY_CSV_FIELDS = ["started_at", "status", "duration_ms", "tokens_in", "tokens_out", "cost_estimate", "output"]
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    if not fields:
+        return DEFAULT_FIELDS
+    selected = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in selected if f not in FIELDS]
+    if unknown or not selected:
+        raise HTTPException(400, f"Unbekannte Felder: {', '.join(unknown)}. Erlaubt: {', '.join(FIELDS)}")
+    return selected
+
+
+def _value(v):
+    return v.isoformat() if isinstance(v, datetime) else v
+
+
+def _rows(bot_id: str, fields: List[str], since: Optional[datetime], until: Optional[datetime],
+          newest_first: bool = False) -> Iterator[list]:
+    stmt = select(*(FIELDS[f] for f in fields)).filter(Run.bot_id == bot_id)
+    if BODY_FIELDS & set(fields):
+        stmt = stmt.select_from(Run).outerjoin(RunBody, RunBody.run_id == Run.id)
+    if since:
+        stmt = stmt.filter(Run.started_at >= naive_utc(since))
+    if until:
+        stmt = stmt.filter(Run.started_at < naive_utc(until))
+    order = (Run.started_at.desc(), Run.id.desc()) if newest_first else (Run.started_at, Run.id)
+    stmt = stmt.order_by(*order).execution_options(yield_per=CHUNK_ROWS)
+
+    db = SessionLocal()
+    try:
+        for partition in db.execute(stmt).partitions():
+            yield partition
+    finally:
+        db.close()
+
+
+def _encode_csv(fields, partitions) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf, delimiter=";")
+    writer.writerow(fields)
+    for rows in partitions:
+        writer.writerows([_value(v) for v in row] for row in rows)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+def _legacy_csv_line(started_at, status, duration_ms, tokens_in, tokens_out, cost, output) -> str:
+    ts = started_at.strftime("%d.%m.%Y %H:%M") if started_at else ""
+    dur = f"{duration_ms / 1000:.1f}" if duration_ms else ""
+    tokens = str((tokens_in or 0) + (tokens_out or 0))
+    cost = f"{cost:.4f}" if cost else "0"
+    output = (output or "").replace(";", ",").replace("\n", " ")[:500]
+    return f"{ts};{status};{dur};{tokens};{cost};{output}"
+
+
+def _encode_legacy_csv(partitions) -> Iterator[bytes]:
+    yield LEGACY_CSV_HEADER.encode("utf-8")
+    for rows in partitions:
+        yield "".join("\n" + _legacy_csv_line(*row) for row in rows).encode("utf-8")
+
+
+def _encode_ndjson(fields, partitions) -> Iterator[bytes]:
+    for rows in partitions:
+        yield "".join(
+            json.dumps({f: _value(v) for f, v in zip(fields, row)}, ensure_ascii=False) + "\n"
+            for row in rows
+        ).encode("utf-8")
+
+
+def _gzip(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    z = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        out = z.compress(chunk)
+        if out:
+            yield out
+    yield z.flush()
+
+
+def stream_runs(bot_id: str, fmt: str, fields: List[str], since: Optional[datetime] = None,
+                until: Optional[datetime] = None, gzip: bool = False) -> Iterator[bytes]:
+    """Byte chunks of the export; iterate it from a StreamingResponse."""
+    encode = _encode_csv if fmt == "csv" else _encode_ndjson
+    chunks = encode(fields, _rows(bot_id, fields, since, until))
+    return _gzip(chunks) if gzip else chunks
+
+
+def stream_legacy_csv(bot_id: str) -> Iterator[bytes]:
+    """All runs, newest first, in the original export-csv columns and formatting."""
+    return _encode_legacy_csv(_rows(bot_id, LEGACY_CSV_FIELDS, None, None, newest_first=True))
@@ -0,0 +1,126 @@
+"""ETag / conditional GET for rarely-changing read endpoints.
+
+Every cached resource belongs to a scope ("bots", "pipelines", …) with an
+in-process change version. Write paths call bump(scope) after committing; GET
+endpoints decorated with @etag_cached(scope) then
+
+  * answer If-None-Match with 304 while the version is unchanged (no DB, no JSON),
+  * otherwise serve the last serialized body for this URL if it was built at
+    the current version, and only run the endpoint when it was not.
+
+The version is read *before* the endpoint queries, so a write racing a rebuild
+can only make the cached entry look older than it is, never newer.
+"""
+import asyncio
+import functools
+import inspect
+import json
+import threading
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+# "runs" has no @etag_cached endpoint: it keys the dashboard's version (see stamp())
+SCOPES = ("bots", "triggers", "templates", "settings", "channels", "pipelines", "runs")
+MAX_ENTRIES = 256
+
+_boot = uuid.uuid4().hex[:8]  # ETags from a previous process never match
+_versions: Dict[str, int] = {scope: 0 for scope in SCOPES}
+_cache: Dict[str, Tuple[int, str, bytes]] = {}
+_lock = threading.Lock()
+
+
+def bump(*scopes: str):
+    """Mark scopes as changed. Call after the write is committed."""
+    with _lock:
+        for scope in scopes:
+            _versions[scope] += 1
+
+
+def bump_all():
+    bump(*SCOPES)
+
+
+def stamp(*scopes: str) -> str:
+    """Combined change version of several scopes — cheap, no DB."""
+    with _lock:
+        return f"{_boot}-" + ".".join(str(_versions[scope]) for scope in scopes)
+
+
+def _etag(scope: str, version: int) -> str:
+    return f'W/"{scope}-{_boot}-{version}"'
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    return bool(header) and (header.strip() == "*" or etag in (t.strip() for t in header.split(",")))
+
+
+def _json_response(body: bytes, etag: str, status_code: int = 200) -> Response:
+    return Response(body, status_code=status_code, media_type="application/json",
+                    headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+def _cache_key(request: Request) -> str:
+    return f"{request.url.path}?{'&'.join(sorted(f'{k}={v}' for k, v in request.query_params.multi_items()))}"
+
+
+def etag_cached(scope: str, model: Optional[Any] = None):
+    """Serve a GET endpoint through the ETag cache. `model` (e.g. List[BotOut]) is
+    used to serialize the result, since the returned Response bypasses response_model."""
+    adapter = TypeAdapter(model) if model is not None else None
+
+    def serialize(result) -> bytes:
+        if adapter is not None:
+            return adapter.dump_json(adapter.validate_python(result, from_attributes=True))
+        return json.dumps(jsonable_encoder(result), ensure_ascii=False).encode("utf-8")
+
+    def decorate(fn):
+        takes_request = "request" in inspect.signature(fn).parameters
+
+        def lookup(request: Request):
+            version = _versions[scope]
+            etag = _etag(scope, version)
+            if _not_modified(request, etag):
+                return version, etag, Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+            entry = _cache.get(_cache_key(request))
+            if entry and entry[0] == version:
+                return version, etag, _json_response(entry[2], etag)
+            return version, etag, None
+
+        def store(request: Request, version: int, etag: str, result) -> Response:
+            body = serialize(result)
+            with _lock:
+                if len(_cache) >= MAX_ENTRIES:
+                    _cache.clear()
+                _cache[_cache_key(request)] = (version, etag, body)
+            return _json_response(body, etag)
+
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(request: Request, **kwargs):
+                version, etag, hit = lookup(request)
+                if hit is not None:
+                    return hit
+                result = await fn(request=request, **kwargs) if takes_request else await fn(**kwargs)
+                return store(request, version, etag, result)
+        else:
+            @functools.wraps(fn)
+            def wrapper(request: Request, **kwargs):
+                version, etag, hit = lookup(request)
+                if hit is not None:
+                    return hit
+                result = fn(request=request, **kwargs) if takes_request else fn(**kwargs)
+                return store(request, version, etag, result)
+
+        # Tell FastAPI about the injected Request parameter
+        params = list(inspect.signature(fn).parameters.values())
+        if not takes_request:
+            params.insert(0, inspect.Parameter("request", inspect.Parameter.KEYWORD_ONLY, annotation=Request))
+        params = [p.replace(kind=inspect.Parameter.KEYWORD_ONLY) for p in params]
+        wrapper.__signature__ = inspect.Signature(params)
+        return wrapper
+    return decorate
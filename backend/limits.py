@@ -0,0 +1,471 @@
+"""Provider/model/key limits for LLM runs — concurrency caps and RPM/TPM token buckets.
+
+Configured with the setting "rate_limits" (JSON); every section is optional and
+"*" is the default for names without their own entry:
+
+    {
+      "global":    {"concurrency": 10},
+      "providers": {"*": {"concurrency": 3}, "anthropic": {"concurrency": 2, "rpm": 50, "tpm": 40000}},
+      "models":    {"claude-opus-4-20250514": {"concurrency": 1}},
+      "keys":      {"*": {"rpm": 500}, "abcd": {"tpm": 200000}}
+    }
+
+Keys are addressed by their last four characters, as shown in the settings UI.
+
+"adaptive": true on a provider hands its concurrency to an AIMD controller:
+the limit starts at ADAPTIVE_INITIAL, grows by one after a window of healthy
+requests while runs are queueing for it, and is cut multiplicatively on a
+rate-limit error (429/529), on a latency spike (time to first token above
+AIMD_LATENCY_FACTOR × its moving average) or when the server error rate
+climbs. "concurrency" is then the ceiling. Rate-limited requests are retried
+with backoff (honouring Retry-After) before a run fails. GET /api/limits shows
+the current limits and the controllers' recent decisions.
+
+Without the setting every provider is adaptive between 1 and 16 concurrent
+runs (DEFAULT_CONFIG).
+
+A run holds one concurrency slot of every scope that applies to it
+(global, provider, model, key) for its whole duration; the slots are taken
+together once all are free, so a run never sits on a slot while it waits for
+another one. RPM buckets are charged once per API request, TPM buckets with
+the tokens the request actually used (after it returns — a bucket in debt
+holds back the next request until it has refilled).
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional
+
+DEFAULT_CONFIG = {"providers": {"*": {"concurrency": 16, "adaptive": True}}}
+SETTING_KEY = "rate_limits"
+
+ADAPTIVE_INITIAL = int(os.getenv("AIMD_INITIAL", "3"))
+ADAPTIVE_MAX = int(os.getenv("AIMD_MAX", "64"))  # ceiling when "concurrency" is not set
+RATE_LIMIT_BACKOFF = float(os.getenv("AIMD_RATE_LIMIT_BACKOFF", "0.5"))
+LATENCY_BACKOFF = float(os.getenv("AIMD_LATENCY_BACKOFF", "0.8"))
+LATENCY_FACTOR = float(os.getenv("AIMD_LATENCY_FACTOR", "2.5"))
+MAX_ERROR_RATE = float(os.getenv("AIMD_MAX_ERROR_RATE", "0.2"))
+COOLDOWN_S = float(os.getenv("AIMD_COOLDOWN_S", "5"))  # one decrease per burst of failures
+LATENCY_ALPHA = 0.1
+ERROR_WINDOW = 20
+
+RATE_LIMIT_RETRIES = int(os.getenv("RATE_LIMIT_RETRIES", "3"))
+BACKOFF_BASE_S = 2.0
+BACKOFF_MAX_S = 60.0
+
+
+def parse_config(raw: Optional[str]) -> dict:
+    """Validate the rate_limits setting. Raises ValueError with a readable message."""
+    if not raw:
+        return DEFAULT_CONFIG
+    try:
+        config = json.loads(raw)
+    except ValueError:
+        raise ValueError("rate_limits ist kein gültiges JSON")
+    if not isinstance(config, dict):
+        raise ValueError("rate_limits muss ein Objekt sein")
+    sections = [config.get("global") or {}] + [
+        rule for kind in ("providers", "models", "keys") for rule in (config.get(kind) or {}).values()
+    ]
+    for rule in sections:
+        if not isinstance(rule, dict):
+            raise ValueError("rate_limits: jede Regel muss ein Objekt sein")
+        for field in ("concurrency", "rpm", "tpm"):
+            value = rule.get(field)
+            if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 1):
+                raise ValueError(f"rate_limits: {field} muss eine positive Ganzzahl sein")
+        if not isinstance(rule.get("adaptive", False), bool):
+            raise ValueError("rate_limits: adaptive muss true oder false sein")
+    return config
+
+
+def is_rate_limited(e: Exception) -> bool:
+    status = getattr(e, "status_code", None)
+    if status in (429, 529):  # 529 = Anthropic "overloaded"
+        return True
+    err = str(e).lower()
+    return "rate_limit" in err or "429" in err
+
+
+def _is_server_error(e: Exception) -> bool:
+    status = getattr(e, "status_code", None)
+    if isinstance(status, int):
+        return status >= 500
+    name = type(e).__name__
+    return "Connection" in name or "Timeout" in name
+
+
+def _retry_after(e: Exception) -> Optional[float]:
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    try:
+        return min(float(headers.get("retry-after")), BACKOFF_MAX_S)
+    except (TypeError, ValueError):
+        return None
+
+
+class ConcurrencyLimit:
+    """Counting limit whose capacity can change while runs hold or wait for it."""
+
+    def __init__(self, scope: "Scope", limit: Optional[int]):
+        self.scope = scope
+        self.static_limit = limit  # None = unlimited
+        self.adaptive: Optional["AdaptiveController"] = None
+        self.active = 0
+        self.waiting = 0
+        self._changed = asyncio.Event()
+
+    @property
+    def limit(self) -> Optional[int]:
+        if self.adaptive is None:
+            return self.static_limit
+        return self.adaptive.value()
+
+    def available(self) -> bool:
+        limit = self.limit
+        return limit is None or self.active < limit
+
+    def set_limit(self, limit: Optional[int]):
+        self.static_limit = limit
+        self._notify()
+
+    def release(self):
+        self.active -= 1
+        self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+        for listener in _listeners:
+            listener()
+
+    async def wait_change(self):
+        await self._changed.wait()
+
+
+class TokenBucket:
+    """Continuously refilling bucket of `per_minute` units; may go into debt."""
+
+    def __init__(self, scope: "Scope", field: str, per_minute: int):
+        self.scope = scope
+        self.field = field
+        self.per_minute = per_minute
+        self.level = float(per_minute)
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.per_minute, self.level + (now - self._updated) * self.per_minute / 60)
+        self._updated = now
+
+    def set_rate(self, per_minute: int):
+        self._refill()
+        self.per_minute = per_minute
+        self.level = min(self.level, per_minute)
+
+    def delay(self, amount: float) -> float:
+        """Seconds until `amount` units are available."""
+        self._refill()
+        missing = min(amount, self.per_minute) - self.level
+        return max(0.0, missing * 60 / self.per_minute)
+
+    def take(self, amount: float):
+        self._refill()
+        self.level -= amount
+
+    def available(self) -> float:
+        self._refill()
+        return max(0.0, self.level)
+
+
+class AdaptiveController:
+    """AIMD concurrency for one provider (see module docstring)."""
+
+    def __init__(self, limit: ConcurrencyLimit):
+        self.limit = limit
+        self.current = float(min(ADAPTIVE_INITIAL, self.ceiling()))
+        self.latency: Optional[float] = None  # moving average, seconds to first token
+        self.samples = 0
+        self.successes = 0
+        self.outcomes: deque = deque(maxlen=ERROR_WINDOW)  # True = ok
+        self.decisions: deque = deque(maxlen=50)
+        self._last_decrease = 0.0
+
+    def ceiling(self) -> int:
+        return self.limit.static_limit or ADAPTIVE_MAX
+
+    def value(self) -> int:
+        return max(1, min(int(self.current), self.ceiling()))
+
+    def error_rate(self) -> float:
+        if len(self.outcomes) < ERROR_WINDOW // 2:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def record_success(self, latency: float):
+        self.outcomes.append(True)
+        if self.latency is not None and self.samples >= 5 and latency > self.latency * LATENCY_FACTOR:
+            # A spike is not folded into the baseline, or it would raise the bar for the next one
+            self._decrease(LATENCY_BACKOFF, f"Latenz {latency:.1f}s > {LATENCY_FACTOR:g}× Ø {self.latency:.1f}s")
+            return
+        self.latency = latency if self.latency is None else self.latency + LATENCY_ALPHA * (latency - self.latency)
+        self.samples += 1
+        if self.error_rate() > MAX_ERROR_RATE:
+            return
+        self.successes += 1
+        saturated = self.limit.waiting > 0 or self.limit.active >= self.value()
+        if self.successes >= self.value() and saturated and self.value() < self.ceiling():
+            self.successes = 0
+            self._set(self.current + 1, "increase", "stabil, Runs warten")
+
+    def record_error(self, rate_limited: bool):
+        self.outcomes.append(False)
+        if rate_limited:
+            self._decrease(RATE_LIMIT_BACKOFF, "Rate-Limit")
+        elif self.error_rate() > MAX_ERROR_RATE:
+            self._decrease(RATE_LIMIT_BACKOFF, f"Fehlerquote {self.error_rate():.0%}")
+
+    def _decrease(self, factor: float, reason: str):
+        now = time.monotonic()
+        if now - self._last_decrease < COOLDOWN_S:
+            return
+        self._last_decrease = now
+        self.successes = 0
+        self._set(max(1.0, self.value() * factor), "decrease", reason)
+
+    def _set(self, value: float, action: str, reason: str):
+        before = self.value()
+        self.current = min(value, float(self.ceiling()))
+        after = self.value()
+        if after == before:
+            return
+        self.decisions.append({"ts": time.time(), "action": action, "from": before, "to": after, "reason": reason})
+        print(f"[limits] {self.limit.scope.label}: {before} → {after} ({reason})")
+        self.limit._notify()
+
+    def to_dict(self) -> dict:
+        return {
+            "limit": self.value(), "ceiling": self.ceiling(),
+            "latency_s": round(self.latency, 3) if self.latency is not None else None,
+            "error_rate": round(self.error_rate(), 3),
+            "decisions": list(self.decisions),
+        }
+
+
+class Scope(NamedTuple):
+    id: str      # "provider:anthropic", "key:<digest>", …
+    kind: str    # config section: global / providers / models / keys
+    name: str    # entry looked up in that section
+    label: str   # shown in the run log and /api/limits
+
+
+_listeners: List = []  # called whenever a slot frees up or a limit changes (run_queue)
+
+
+def add_listener(fn):
+    _listeners.append(fn)
+
+
+_config: dict = DEFAULT_CONFIG
+_config_generation: Optional[int] = None
+_limits: Dict[str, ConcurrencyLimit] = {}
+_buckets: Dict[str, TokenBucket] = {}  # "<field>:<scope id>"
+
+
+def _rule(scope: Scope) -> dict:
+    if scope.kind == "global":
+        return _config.get("global") or {}
+    section = _config.get(scope.kind) or {}
+    return section.get(scope.name) or section.get("*") or {}
+
+
+def _scopes(provider: str, model: str, key: Optional[str]) -> List[Scope]:
+    """Every scope that applies to a run."""
+    scopes = [
+        Scope("global", "global", "", "global"),
+        Scope(f"provider:{provider}", "providers", provider, provider),
+        Scope(f"model:{model}", "models", model, model),
+    ]
+    if key:
+        digest = hashlib.sha1(f"{provider}:{key}".encode()).hexdigest()[:12]
+        scopes.append(Scope(f"key:{digest}", "keys", key[-4:], f"{provider} …{key[-4:]}"))
+    return scopes
+
+
+def _apply_settings(settings):
+    """Re-read the config when the settings generation changed; resize existing limits."""
+    global _config, _config_generation
+    if settings.generation == _config_generation:
+        return
+    try:
+        _config = parse_config(settings.get(SETTING_KEY))
+    except ValueError as e:
+        print(f"[limits] {e} — using defaults")
+        _config = DEFAULT_CONFIG
+    _config_generation = settings.generation
+    for limit in _limits.values():
+        _configure(limit)
+    for bucket_id, bucket in list(_buckets.items()):
+        per_minute = _rule(bucket.scope).get(bucket.field)
+        if per_minute:
+            bucket.set_rate(per_minute)
+        else:
+            del _buckets[bucket_id]
+
+
+def _configure(limit: ConcurrencyLimit):
+    """Apply the current rule to a limit: static cap, adaptive controller on/off."""
+    rule = _rule(limit.scope)
+    adaptive = limit.scope.kind == "providers" and rule.get("adaptive", False)
+    if adaptive and limit.adaptive is None:
+        limit.adaptive = AdaptiveController(limit)
+    elif not adaptive:
+        limit.adaptive = None
+    limit.set_limit(rule.get("concurrency"))
+
+
+class Lease:
+    """The limits one run is subject to. Use as `async with lease:` for the slots."""
+
+    def __init__(self, limits: List[ConcurrencyLimit], rpm: List[TokenBucket], tpm: List[TokenBucket]):
+        self.limits = limits
+        self.rpm = rpm
+        self.tpm = tpm
+        self.adaptive = next((limit.adaptive for limit in limits if limit.adaptive is not None), None)
+        self._held = False
+        self._first_token: Optional[float] = None
+
+    def blocked_by(self) -> Optional[str]:
+        """Label of the first full concurrency limit, or None if a slot is free now."""
+        return next((limit.scope.label for limit in self.limits if not limit.available()), None)
+
+    def try_acquire(self) -> bool:
+        """Take all slots now if every one is free (no waiting). Used by run_queue."""
+        if self._held or self.blocked_by() is not None:
+            return self._held
+        for limit in self.limits:
+            limit.active += 1
+        self._held = True
+        return True
+
+    def release(self):
+        if self._held:
+            self._held = False
+            for limit in self.limits:
+                limit.release()
+
+    async def __aenter__(self):
+        if self._held:  # handed over already acquired by run_queue
+            return self
+        for limit in self.limits:
+            limit.waiting += 1
+        try:
+            while True:
+                blocked = next((limit for limit in self.limits if not limit.available()), None)
+                if blocked is None:
+                    break
+                await blocked.wait_change()
+        finally:
+            for limit in self.limits:
+                limit.waiting -= 1
+        for limit in self.limits:
+            limit.active += 1
+        self._held = True
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+    async def before_request(self):
+        """Wait for the RPM/TPM buckets, then charge one request."""
+        while True:
+            delay = max([b.delay(1) for b in self.rpm + self.tpm] + [0.0])
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        for bucket in self.rpm:
+            bucket.take(1)
+
+    def record_tokens(self, tokens: int):
+        for bucket in self.tpm:
+            bucket.take(tokens or 0)
+
+    def first_token(self):
+        """Called on the first streamed output (text or tool call) — latency is measured up to here.
+
+        Requests that don't stream (no call) are measured to their end.
+        """
+        if self._first_token is None:
+            self._first_token = time.monotonic()
+
+    async def request(self, call):
+        """Run one API request (`call` returns a fresh awaitable per attempt).
+
+        Waits for the buckets, reports outcome and latency to the provider's
+        adaptive controller, and retries rate-limited attempts with backoff as
+        long as nothing has been streamed yet.
+        """
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            await self.before_request()
+            started, self._first_token = time.monotonic(), None
+            try:
+                result = await call()
+            except Exception as e:
+                rate_limited = is_rate_limited(e)
+                if self.adaptive is not None and (rate_limited or _is_server_error(e)):
+                    self.adaptive.record_error(rate_limited)
+                if not rate_limited or attempt == RATE_LIMIT_RETRIES or self._first_token is not None:
+                    raise
+                delay = _retry_after(e) or min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** attempt) * random.uniform(0.8, 1.2)
+                await asyncio.sleep(delay)
+                continue
+            if self.adaptive is not None:
+                self.adaptive.record_success((self._first_token or time.monotonic()) - started)
+            return result
+
+
+def lease(settings, provider: str, model: str, key: Optional[str]) -> Lease:
+    """Limits for a run of `model` on `provider` with API key `key` (settings: a SettingsSnapshot)."""
+    _apply_settings(settings)
+    limits, buckets = [], {"rpm": [], "tpm": []}
+    for scope in _scopes(provider, model, key):
+        rule = _rule(scope)
+        limit = _limits.get(scope.id)
+        if limit is None:
+            limit = _limits[scope.id] = ConcurrencyLimit(scope, None)
+            _configure(limit)
+        limits.append(limit)
+        for field in ("rpm", "tpm"):
+            if rule.get(field):
+                bucket_id = f"{field}:{scope.id}"
+                bucket = _buckets.get(bucket_id)
+                if bucket is None:
+                    bucket = _buckets[bucket_id] = TokenBucket(scope, field, rule[field])
+                buckets[field].append(bucket)
+    return Lease(limits, buckets["rpm"], buckets["tpm"])
+
+
+def snapshot() -> dict:
+    """Current limits, bucket levels and adaptive decisions (GET /api/limits)."""
+    return {
+        "config": _config,
+        "limits": [
+            {
+                "scope": limit.scope.kind, "name": limit.scope.label,
+                "limit": limit.limit, "static_limit": limit.static_limit,
+                "active": limit.active, "waiting": limit.waiting,
+                "adaptive": limit.adaptive.to_dict() if limit.adaptive is not None else None,
+            }
+            for limit in _limits.values()
+        ],
+        "buckets": [
+            {
+                "scope": bucket.scope.kind, "name": bucket.scope.label, "field": bucket.field,
+                "per_minute": bucket.per_minute, "available": round(bucket.available()),
+            }
+            for bucket in _buckets.values()
+        ],
+    }
@@ -0,0 +1,138 @@
+"""Process-wide LLM client registry — one pooled SDK client per (provider, key, base_url).
+
+Building an AsyncOpenAI/AsyncAnthropic per run means a cold connection pool and
+a fresh TLS handshake on every call. get() instead hands out a cached client
+whose httpx pool keeps connections alive between runs (HTTP/2 when the
+optional `h2` package is installed).
+
+Clients are never closed while a run might still be using them: invalidate()
+(called when /api/settings changes a provider's key/URL) and LRU eviction only
+*retire* an entry, and retired clients are closed RETIRE_S later, or in the
+FastAPI lifespan shutdown via close_all().
+"""
+import asyncio
+import importlib.util
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, List, Optional, Tuple
+
+import httpx
+
+MAX_CLIENTS = int(os.getenv("LLM_MAX_CLIENTS", "32"))
+MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "50"))
+MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY_S = float(os.getenv("LLM_KEEPALIVE_EXPIRY_S", "90"))
+RETIRE_S = float(os.getenv("LLM_CLIENT_RETIRE_S", "900"))  # longer than any run
+HTTP2 = importlib.util.find_spec("h2") is not None
+
+# Setting key -> provider whose clients it configures
+SETTING_PROVIDERS = {
+    "openai_api_key": "openai",
+    "anthropic_api_key": "anthropic",
+    "mistral_api_key": "mistral",
+    "ollama_base_url": "ollama",
+}
+
+_clients: "OrderedDict[Tuple[str, str, Optional[str]], Any]" = OrderedDict()
+_retired: List[Tuple[float, Any]] = []
+_lock = threading.Lock()  # invalidate() runs from the sync settings route's threadpool
+
+
+def _http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=HTTP2,
+        limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE,
+                            keepalive_expiry=KEEPALIVE_EXPIRY_S),
+        timeout=httpx.Timeout(600.0, connect=10.0),
+        follow_redirects=True,
+    )
+
+
+def _build(provider: str, api_key: str, base_url: Optional[str]):
+    if provider in ("openai", "ollama"):
+        import openai
+        return openai.AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=_http_client())
+    if provider == "anthropic":
+        import anthropic
+        return anthropic.AsyncAnthropic(api_key=api_key, base_url=base_url, http_client=_http_client())
+    if provider == "mistral":
+        from mistralai import Mistral  # sync client with its own pool, used via to_thread
+        return Mistral(api_key=api_key)
+    raise ValueError(f"Unbekannter Anbieter: {provider}")
+
+
+def get(provider: str, api_key: str, base_url: Optional[str] = None):
+    """Cached client for provider/key/base_url (created on first use)."""
+    _close_retired()
+    key = (provider, api_key, base_url)
+    with _lock:
+        client = _clients.get(key)
+        if client is not None:
+            _clients.move_to_end(key)
+            return client
+        client = _clients[key] = _build(provider, api_key, base_url)
+        while len(_clients) > MAX_CLIENTS:
+            _retire(_clients.popitem(last=False)[1])
+    return client
+
+
+@asynccontextmanager
+async def throwaway(provider: str, api_key: str, base_url: Optional[str] = None):
+    """An uncached client, closed on exit — for one-off calls like key validation."""
+    client = _build(provider, api_key, base_url)
+    try:
+        yield client
+    finally:
+        await _close(client)
+
+
+def invalidate(provider: Optional[str] = None):
+    """Retire the cached clients of one provider (all when None)."""
+    with _lock:
+        for key in [k for k in _clients if provider is None or k[0] == provider]:
+            _retire(_clients.pop(key))
+
+
+def invalidate_settings(setting_keys):
+    """Retire clients of every provider whose key/URL setting is in setting_keys."""
+    for provider in {SETTING_PROVIDERS[k] for k in setting_keys if k in SETTING_PROVIDERS}:
+        invalidate(provider)
+
+
+def _retire(client):
+    _retired.append((time.monotonic(), client))
+
+
+def _take_retired(older_than: float) -> list:
+    now = time.monotonic()
+    with _lock:
+        due = [client for ts, client in _retired if now - ts >= older_than]
+        _retired[:] = [(ts, client) for ts, client in _retired if now - ts < older_than]
+    return due
+
+
+async def _close(client):
+    close = getattr(client, "close", None)  # not every SDK client has one
+    if close is None:
+        return
+    try:
+        result = close()
+        if asyncio.iscoroutine(result):
+            await result
+    except Exception as e:
+        print(f"[llm_clients] close failed: {e}")
+
+
+def _close_retired():
+    for client in _take_retired(RETIRE_S):
+        asyncio.ensure_future(_close(client))
+
+
+async def close_all():
+    """Close every client (lifespan shutdown)."""
+    invalidate()
+    for client in _take_retired(0):
+        await _close(client)
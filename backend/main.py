@@ -4,21 +4,38 @@ Slim entrypoint. Route groups are in routers/.
 """
 import os
 import json
-import asyncio
-from typing import List
+from typing import List, Optional
+from datetime import datetime
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, Depends, HTTPException, WebSocket, WebSocketDisconnect, UploadFile, File
+from fastapi import FastAPI, Depends, HTTPException, Request, Response, WebSocket, WebSocketDisconnect, UploadFile, File
 from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.orm import Session, selectinload, undefer
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import delete, func, select
 
-from database import engine, Base, SessionLocal, get_db
-from models import Bot, Run, Result, Trigger, Setting, Pipeline, WaitlistEntry, TelegramLink, Credential, BotCredential, new_id, utcnow
+from database import engine, Base, SessionLocal, get_db, get_async_db, read_snapshot, dispose_engines
+from models import Bot, Run, RunBody, RunJob, UsageRollup, Result, Trigger, Pipeline, WaitlistEntry, TelegramLink, Credential, BotCredential, new_id, utcnow
 import telegram_bot
-from schemas import BotCreate, BotUpdate, BotOut, TriggerCreate, TriggerOut, RunOut, ResultOut
-from bot_runner import run_bot, ws_connections, active_tasks
+import db_writer
+import rollups
+import search_index
+import exports
+import http_cache
+import events
+import ws_hub
+import run_replay
+import llm_clients
+import settings_cache
+import bot_context
+import run_queue
+import pipeline_runner
+from http_cache import etag_cached
+from query_budget import query_budget
+from pagination import paginate, limit_param, encode_cursor, decode_cursor, NEXT_CURSOR_HEADER
+from schemas import BotCreate, BotUpdate, BotOut, TriggerCreate, TriggerOut, RunOut, RunSummaryOut, ResultOut
+from bot_runner import active_tasks
 from scheduler import init_scheduler, shutdown_scheduler, register_bot, unregister_bot
 from migrations import run_migrations
 
@@ -26,13 +43,17 @@ from migrations import run_migrations
 from routers.settings import router as settings_router
 from routers.channels_router import router as channels_router
 from routers.pipelines_router import router as pipelines_router
+from routers.maintenance_router import router as maintenance_router
+from routers.limits_router import router as limits_router
+from routers.workspace_router import router as workspace_router
+from routers.internal_router import router as internal_router
 
 BOT_DATA = os.getenv("BOT_DATA_PATH", "/srv/openOrchestrator/bot-data")
 
 # ── Startup ───────────────────────────────────────────────
 
-run_migrations()
 Base.metadata.create_all(bind=engine)
+run_migrations()
 
 
 def _on_telegram_link(token, chat_id, username, first_name):
@@ -64,12 +85,20 @@ def _on_telegram_link(token, chat_id, username, first_name):
 
 @asynccontextmanager
 async def lifespan(app):
+    db_writer.start_writer()
+    run_queue.start()  # EMBEDDED_WORKER=0: runs execute in `python -m worker` processes
+    await run_queue.restore()  # also recovers runs a crashed process left "running"
+    await pipeline_runner.recover()
     init_scheduler()
     telegram_bot.set_link_callback(_on_telegram_link)
     telegram_bot.start()
     yield
     telegram_bot.stop()
     shutdown_scheduler()
+    await run_queue.stop()
+    await db_writer.stop_writer()
+    await llm_clients.close_all()
+    await dispose_engines()
 
 
 app = FastAPI(title="openOrchestrator", version="0.3.0", lifespan=lifespan)
@@ -77,16 +106,24 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], allow_credentials=True,
     allow_methods=["*"], allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Include routers
 app.include_router(settings_router)
 app.include_router(channels_router)
 app.include_router(pipelines_router)
+app.include_router(maintenance_router)
+app.include_router(limits_router)
+app.include_router(workspace_router)
+app.include_router(internal_router)
 
 
-def db_factory():
-    return SessionLocal()
+def _bots_by_id(db: Session, bot_ids) -> dict:
+    """Batch-load (id, name, emoji) for a set of bots — one IN query instead of one get per row."""
+    if not bot_ids:
+        return {}
+    return {b.id: b for b in db.query(Bot.id, Bot.name, Bot.emoji).filter(Bot.id.in_(bot_ids))}
 
 
 def _bot_to_out(b: Bot) -> dict:
@@ -99,6 +136,8 @@ def _bot_to_out(b: Bot) -> dict:
 # ── Bot CRUD ──────────────────────────────────────────────
 
 @app.get("/api/bots", response_model=List[BotOut])
+@etag_cached("bots", List[BotOut])
+@query_budget(1)
 def list_bots(db: Session = Depends(get_db)):
     bots = db.query(Bot).order_by(Bot.created_at.desc()).all()
     return [_bot_to_out(b) for b in bots]
@@ -125,6 +164,7 @@ def create_bot(data: BotCreate, db: Session = Depends(get_db)):
     db.add(bot)
     db.commit()
     db.refresh(bot)
+    http_cache.bump("bots")
     if bot.schedule:
         register_bot(bot.id, bot.schedule)
     return _bot_to_out(bot)
@@ -143,6 +183,7 @@ def update_bot(bot_id: str, data: BotUpdate, db: Session = Depends(get_db)):
     bot.updated_at = utcnow()
     db.commit()
     db.refresh(bot)
+    http_cache.bump("bots", "pipelines")  # pipelines show step bot names
     if bot.schedule and bot.enabled:
         register_bot(bot.id, bot.schedule)
     else:
@@ -156,11 +197,18 @@ def delete_bot(bot_id: str, db: Session = Depends(get_db)):
     if not bot:
         raise HTTPException(404, "Bot not found")
     unregister_bot(bot_id)
+    bot_context.forget(bot)
     db.query(Result).filter(Result.bot_id == bot_id).delete()
+    db.query(RunBody).filter(
+        RunBody.run_id.in_(db.query(Run.id).filter(Run.bot_id == bot_id))
+    ).delete(synchronize_session=False)
+    db.query(RunJob).filter(RunJob.bot_id == bot_id).delete()
     db.query(Run).filter(Run.bot_id == bot_id).delete()
+    db.query(UsageRollup).filter(UsageRollup.bot_id == bot_id).delete()
     db.query(Trigger).filter((Trigger.source_bot == bot_id) | (Trigger.target_bot == bot_id)).delete()
     db.delete(bot)
     db.commit()
+    http_cache.bump("bots", "triggers", "pipelines")
     return {"ok": True}
 
 
@@ -181,20 +229,21 @@ def duplicate_bot(bot_id: str, db: Session = Depends(get_db)):
     db.add(dup)
     db.commit()
     db.refresh(dup)
+    http_cache.bump("bots")
     return _bot_to_out(dup)
 
 
 # ── Runs ──────────────────────────────────────────────────
 
-@app.post("/api/bots/{bot_id}/run", response_model=RunOut)
-async def run_bot_endpoint(bot_id: str, db: Session = Depends(get_db)):
-    bot = db.query(Bot).get(bot_id)
+@app.post("/api/bots/{bot_id}/run", response_model=RunSummaryOut)
+async def run_bot_endpoint(bot_id: str, db: AsyncSession = Depends(get_async_db)):
+    bot = await db.get(Bot, bot_id)
     if not bot:
         raise HTTPException(404, "Bot not found")
-    run = Run(id=new_id(), bot_id=bot_id, trigger="manual", status="running")
+    run = Run(id=new_id(), bot_id=bot_id, trigger="manual", status="queued")
     db.add(run)
-    db.commit()
-    db.refresh(run)
+    await db.commit()
+    await db.refresh(run)
     bot_data = Bot(
         id=bot.id, name=bot.name, emoji=bot.emoji, description=bot.description,
         prompt=bot.prompt, model=bot.model, tools=bot.tools, schedule=bot.schedule,
@@ -202,54 +251,80 @@ async def run_bot_endpoint(bot_id: str, db: Session = Depends(get_db)):
         max_runtime_seconds=bot.max_runtime_seconds,
     )
     run_data = Run(id=run.id, bot_id=run.bot_id, trigger=run.trigger, status=run.status, started_at=run.started_at)
-    task = asyncio.create_task(run_bot(bot_data, run_data, db_factory))
-    active_tasks[run.id] = task
-    return run
+    run_queue.submit(bot_data, run_data)
+    return run_queue.annotate([run])[0]
 
 
 @app.post("/api/runs/{run_id}/cancel")
-async def cancel_run(run_id: str, db: Session = Depends(get_db)):
+async def cancel_run(run_id: str, db: AsyncSession = Depends(get_async_db)):
     task = active_tasks.get(run_id)
     if task and not task.done():
         task.cancel()
         return {"ok": True, "message": "Run wird abgebrochen..."}
-    run = db.query(Run).get(run_id)
-    if run and run.status == "running":
+    run_queue.cancel(run_id)
+    run = await db.get(Run, run_id)
+    if run and run.status in ("running", "queued"):
         run.status = "cancelled"
         run.finished_at = utcnow()
         run.error_message = "Manuell abgebrochen"
-        db.commit()
+        await rollups.record_run(db, run)
+        await db.execute(delete(RunJob).where(RunJob.run_id == run_id))
+        await db.commit()
+        http_cache.bump("runs")
         return {"ok": True, "message": "Run abgebrochen"}
     raise HTTPException(404, "Run nicht gefunden oder bereits beendet")
 
 
-@app.get("/api/bots/{bot_id}/runs", response_model=List[RunOut])
-def list_runs(bot_id: str, db: Session = Depends(get_db)):
-    return db.query(Run).filter(Run.bot_id == bot_id).order_by(Run.started_at.desc()).limit(50).all()
+@app.get("/api/bots/{bot_id}/runs", response_model=List[RunSummaryOut])
+@query_budget(1)
+def list_runs(bot_id: str, response: Response, cursor: Optional[str] = None, limit: int = limit_param(),
+              db: Session = Depends(get_db)):
+    query = db.query(Run).filter(Run.bot_id == bot_id)
+    return run_queue.annotate(paginate(query, response, Run.started_at, Run.id, cursor, limit))
+
+
+@app.get("/api/runs/{run_id}", response_model=RunOut)
+def get_run(run_id: str, db: Session = Depends(get_db)):
+    run = db.query(Run).options(selectinload(Run.body).options(undefer(RunBody.log))).filter(Run.id == run_id).first()
+    if not run:
+        raise HTTPException(404, "Run nicht gefunden")
+    return run_queue.annotate([run])[0]
 
 
 @app.get("/api/bots/{bot_id}/results", response_model=List[ResultOut])
-def list_results(bot_id: str, db: Session = Depends(get_db)):
-    return db.query(Result).filter(Result.bot_id == bot_id).order_by(Result.created_at.desc()).limit(50).all()
+@query_budget(1)
+def list_results(bot_id: str, response: Response, cursor: Optional[str] = None, limit: int = limit_param(),
+                 db: Session = Depends(get_db)):
+    query = db.query(Result).filter(Result.bot_id == bot_id)
+    return paginate(query, response, Result.created_at, Result.id, cursor, limit)
 
 
 # ── Bot Stats ─────────────────────────────────────────────
 
 @app.get("/api/bots/{bot_id}/stats")
+@query_budget(1)
 def get_bot_stats(bot_id: str, db: Session = Depends(get_db)):
-    runs = db.query(Run).filter(Run.bot_id == bot_id).all()
+    """Answered from usage_rollups (day buckets) — never scans runs."""
+    row = db.query(
+        func.sum(UsageRollup.runs), func.sum(UsageRollup.completed), func.sum(UsageRollup.failed),
+        func.sum(UsageRollup.duration_ms_total), func.sum(UsageRollup.duration_count),
+        func.sum(UsageRollup.tokens_in + UsageRollup.tokens_out), func.sum(UsageRollup.cost),
+    ).filter(UsageRollup.bot_id == bot_id, UsageRollup.period == "day").first()
+    return _stats_out(*row)
+
+
+def _stats_out(runs, completed, failed, dur_total, dur_count, tokens, cost) -> dict:
+    runs, completed, failed, dur_total, dur_count, tokens, cost = (
+        v or 0 for v in (runs, completed, failed, dur_total, dur_count, tokens, cost)
+    )
     if not runs:
         return {"runs": 0, "completed": 0, "failed": 0, "rate": 0,
                 "avg_duration": 0, "total_tokens": 0, "total_cost": 0}
-    completed = sum(1 for r in runs if r.status == "completed")
-    durations = [r.duration_ms for r in runs if r.duration_ms]
-    tokens = sum((r.tokens_in or 0) + (r.tokens_out or 0) for r in runs)
-    cost = sum(r.cost_estimate or 0 for r in runs)
     return {
-        "runs": len(runs), "completed": completed,
-        "failed": sum(1 for r in runs if r.status == "failed"),
-        "rate": round(completed / len(runs) * 100),
-        "avg_duration": round(sum(durations) / len(durations)) if durations else 0,
+        "runs": runs, "completed": completed,
+        "failed": failed,
+        "rate": round(completed / runs * 100),
+        "avg_duration": round(dur_total / dur_count) if dur_count else 0,
         "total_tokens": tokens, "total_cost": round(cost, 4),
     }
 
@@ -257,11 +332,17 @@ def get_bot_stats(bot_id: str, db: Session = Depends(get_db)):
 # ── Activity Feed ─────────────────────────────────────────
 
 @app.get("/api/activity")
-def activity_feed(db: Session = Depends(get_db)):
-    runs = db.query(Run).order_by(Run.started_at.desc()).limit(20).all()
+@query_budget(3)
+def activity_feed(response: Response, cursor: Optional[str] = None, limit: int = limit_param(20),
+                  db: Session = Depends(get_db)):
+    runs = paginate(db.query(Run).options(selectinload(Run.body)), response, Run.started_at, Run.id, cursor, limit)
+    return _activity_items(runs, _bots_by_id(db, {r.bot_id for r in runs}))
+
+
+def _activity_items(runs, bots: dict) -> list:
     items = []
     for r in runs:
-        bot = db.query(Bot).get(r.bot_id)
+        bot = bots.get(r.bot_id)
         items.append({
             "id": r.id, "bot_id": r.bot_id,
             "bot_name": bot.name if bot else "?",
@@ -278,29 +359,101 @@ def activity_feed(db: Session = Depends(get_db)):
     return items
 
 
+# ── Dashboard ─────────────────────────────────────────────
+
+DASHBOARD_SCOPES = ("bots", "triggers", "pipelines", "runs")
+
+
+def _runs_changed(event: dict):
+    if event["type"].startswith("run_"):  # queued, started, finished — also relayed from workers
+        http_cache.bump("runs")
+
+
+events.add_listener(_runs_changed)
+
+
+@app.get("/api/dashboard")
+@query_budget(8)
+def dashboard(version: Optional[str] = None, activity_limit: int = limit_param(20), db: Session = Depends(get_db)):
+    """Everything the dashboard polls, from one consistent read.
+
+    Pass the last `version` back; if nothing changed the response is just
+    {"version": ..., "unchanged": true}. The version is made of the http_cache
+    change counters, read before any query, so an unchanged poll costs no SQL.
+    """
+    stamp = f"{http_cache.stamp(*DASHBOARD_SCOPES)}-{activity_limit}"
+    if version == stamp:
+        return {"version": stamp, "unchanged": True}
+    read_snapshot(db)
+    bots = db.query(Bot).order_by(Bot.created_at.desc()).all()
+
+    latest = db.query(
+        Run.bot_id, func.max(Run.started_at).label("started_at")
+    ).group_by(Run.bot_id).subquery()
+    last_runs = {r.bot_id: r for r in db.query(Run.bot_id, Run.status, Run.started_at).join(
+        latest, (Run.bot_id == latest.c.bot_id) & (Run.started_at == latest.c.started_at)
+    )}
+
+    stats = {row[0]: _stats_out(*row[1:]) for row in db.query(
+        UsageRollup.bot_id,
+        func.sum(UsageRollup.runs), func.sum(UsageRollup.completed), func.sum(UsageRollup.failed),
+        func.sum(UsageRollup.duration_ms_total), func.sum(UsageRollup.duration_count),
+        func.sum(UsageRollup.tokens_in + UsageRollup.tokens_out), func.sum(UsageRollup.cost),
+    ).filter(UsageRollup.period == "day").group_by(UsageRollup.bot_id)}
+    empty_stats = _stats_out(0, 0, 0, 0, 0, 0, 0)
+
+    recent = db.query(Run).options(selectinload(Run.body)).order_by(
+        Run.started_at.desc(), Run.id.desc()
+    ).limit(activity_limit).all()
+    triggers = db.query(Trigger).all()
+    pipeline_count = db.query(func.count(Pipeline.id)).scalar()
+
+    bot_items = []
+    for b in bots:
+        last = last_runs.get(b.id)
+        bot_items.append({
+            **BotOut.model_validate(_bot_to_out(b)).model_dump(mode="json"),
+            "last_status": last.status if last else None,
+            "last_run_at": last.started_at.isoformat() if last and last.started_at else None,
+            "stats": stats.get(b.id, empty_stats),
+        })
+    snapshot = {
+        "bots": bot_items,
+        "activity": _activity_items(recent, {b.id: b for b in bots}),
+        "triggers": [TriggerOut.model_validate(t).model_dump(mode="json") for t in triggers],
+        "system": {
+            "bots": len(bots),
+            "pipelines": pipeline_count,
+            "runs": sum(s["runs"] for s in stats.values()),
+            "running": run_queue.running(),
+            "queued": run_queue.size(),
+        },
+    }
+    return {"version": stamp, "unchanged": False, **snapshot}
+
+
 # ── Usage ─────────────────────────────────────────────────
 
 @app.get("/api/usage")
+@query_budget(1)
 def get_usage(db: Session = Depends(get_db)):
-    bots = db.query(Bot).all()
-    per_bot = []
-    for bot in bots:
-        stats = db.query(
-            func.count(Run.id), func.sum(Run.tokens_in),
-            func.sum(Run.tokens_out), func.sum(Run.cost_estimate),
-        ).filter(Run.bot_id == bot.id).first()
-        per_bot.append({
-            "bot_id": bot.id, "bot_name": bot.name, "bot_emoji": bot.emoji,
-            "runs": stats[0] or 0, "tokens_in": stats[1] or 0,
-            "tokens_out": stats[2] or 0, "cost": round(stats[3] or 0, 4),
-        })
-    totals = db.query(
-        func.count(Run.id), func.sum(Run.tokens_in),
-        func.sum(Run.tokens_out), func.sum(Run.cost_estimate),
-    ).first()
+    rows = db.query(
+        Bot.id, Bot.name, Bot.emoji,
+        func.sum(UsageRollup.runs), func.sum(UsageRollup.tokens_in),
+        func.sum(UsageRollup.tokens_out), func.sum(UsageRollup.cost),
+    ).outerjoin(
+        UsageRollup, (UsageRollup.bot_id == Bot.id) & (UsageRollup.period == "day")
+    ).group_by(Bot.id).all()
+    per_bot = [{
+        "bot_id": bot_id, "bot_name": name, "bot_emoji": emoji,
+        "runs": runs or 0, "tokens_in": tokens_in or 0,
+        "tokens_out": tokens_out or 0, "cost": round(cost or 0, 4),
+    } for bot_id, name, emoji, runs, tokens_in, tokens_out, cost in rows]
     return {
-        "total": {"runs": totals[0] or 0, "tokens_in": totals[1] or 0,
-                  "tokens_out": totals[2] or 0, "cost": round(totals[3] or 0, 4)},
+        "total": {"runs": sum(b["runs"] for b in per_bot),
+                  "tokens_in": sum(b["tokens_in"] for b in per_bot),
+                  "tokens_out": sum(b["tokens_out"] for b in per_bot),
+                  "cost": round(sum(b["cost"] for b in per_bot), 4)},
         "per_bot": per_bot,
     }
 
@@ -308,6 +461,8 @@ def get_usage(db: Session = Depends(get_db)):
 # ── Triggers ──────────────────────────────────────────────
 
 @app.get("/api/triggers", response_model=List[TriggerOut])
+@etag_cached("triggers", List[TriggerOut])
+@query_budget(1)
 def list_triggers(db: Session = Depends(get_db)):
     return db.query(Trigger).all()
 
@@ -317,6 +472,7 @@ def create_trigger(data: TriggerCreate, db: Session = Depends(get_db)):
     t = Trigger(id=new_id(), **data.model_dump())
     db.add(t)
     db.commit()
+    http_cache.bump("triggers")
     db.refresh(t)
     return t
 
@@ -328,6 +484,7 @@ def delete_trigger(trigger_id: str, db: Session = Depends(get_db)):
         raise HTTPException(404)
     db.delete(t)
     db.commit()
+    http_cache.bump("triggers")
     return {"ok": True}
 
 
@@ -344,8 +501,8 @@ def list_docs(bot_id: str, db: Session = Depends(get_db)):
 
 
 @app.post("/api/bots/{bot_id}/docs")
-async def upload_doc(bot_id: str, file: UploadFile = File(...), db: Session = Depends(get_db)):
-    bot = db.query(Bot).get(bot_id)
+async def upload_doc(bot_id: str, file: UploadFile = File(...), db: AsyncSession = Depends(get_async_db)):
+    bot = await db.get(Bot, bot_id)
     if not bot or not bot.docs_path:
         raise HTTPException(404)
     os.makedirs(bot.docs_path, exist_ok=True)
@@ -353,62 +510,120 @@ async def upload_doc(bot_id: str, file: UploadFile = File(...), db: Session = De
     content = await file.read()
     with open(path, "wb") as f:
         f.write(content)
+    bot_context.invalidate_docs(bot.docs_path)
     return {"name": file.filename, "size": len(content)}
 
 
 # ── WebSocket ─────────────────────────────────────────────
 
+def _subscribe_with_replay(conn: ws_hub.Connection, bot_ids, since: Optional[int]):
+    """Subscribe and, if `since` is given, first replay the buffered messages of
+    the bots' active runs after that seq. Nothing awaits in between, so no live
+    message can fall into the gap or arrive twice."""
+    if since is not None:
+        for bot_id in bot_ids:
+            for message in run_replay.replay(bot_id, since):
+                conn.send(message)
+    ws_hub.subscribe(conn, bot_ids)
+
+
 @app.websocket("/ws/bots/{bot_id}")
-async def websocket_endpoint(websocket: WebSocket, bot_id: str):
+async def websocket_endpoint(websocket: WebSocket, bot_id: str, since: Optional[int] = None):
+    """Log/status stream for one bot. ?since=<seq> replays the running runs
+    from after that seq (0 = from the start) before going live."""
     await websocket.accept()
-    if bot_id not in ws_connections:
-        ws_connections[bot_id] = set()
-    ws_connections[bot_id].add(websocket)
+    conn = ws_hub.Connection(websocket)
+    _subscribe_with_replay(conn, [bot_id], since)
     try:
         while True:
             await websocket.receive_text()
-    except WebSocketDisconnect:
-        ws_connections[bot_id].discard(websocket)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        ws_hub.disconnect(conn)
+
+
+@app.websocket("/ws")
+async def ws_multiplex(websocket: WebSocket):
+    """One socket for many bots: send {"subscribe": [ids], "since": seq?} / {"unsubscribe": [ids]}."""
+    await websocket.accept()
+    conn = ws_hub.Connection(websocket)
+    try:
+        while True:
+            msg = await websocket.receive_json()
+            if not isinstance(msg, dict):
+                continue
+            since = msg.get("since")
+            _subscribe_with_replay(conn, msg.get("subscribe") or [], since if isinstance(since, int) else None)
+            ws_hub.unsubscribe(conn, msg.get("unsubscribe") or [])
+    except (WebSocketDisconnect, RuntimeError, ValueError):
+        pass
+    finally:
+        ws_hub.disconnect(conn)
+
+
+# ── Event stream ──────────────────────────────────────────
+
+@app.get("/api/events")
+async def event_stream(request: Request, last_event_id: Optional[str] = None):
+    """Server-Sent Events: run/trigger/pipeline events. Resumes from Last-Event-ID."""
+    resume = request.headers.get("last-event-id") or last_event_id
+
+    async def stream():
+        yield "retry: 3000\n\n"
+        async for kind, event in events.subscribe(resume):
+            if kind == "heartbeat":
+                yield ": ping\n\n"
+            else:
+                yield f"id: {event['id']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.websocket("/ws/events")
+async def event_socket(websocket: WebSocket, last_event_id: Optional[str] = None):
+    """WebSocket variant of /api/events (same JSON events, heartbeat frames when idle)."""
+    await websocket.accept()
+    try:
+        async for kind, event in events.subscribe(last_event_id):
+            await websocket.send_json(event or {"type": "heartbeat"})
+    except (WebSocketDisconnect, RuntimeError):
+        pass
 
 
 # ── Search ────────────────────────────────────────────────
 
 @app.get("/api/search")
-def search_results(q: str, db: Session = Depends(get_db)):
-    """Full-text search across all bot outputs and results."""
+@query_budget(1)
+def search_results(
+    q: str,
+    response: Response,
+    bot_id: Optional[str] = None,
+    status: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = limit_param(20),
+    db: Session = Depends(get_db),
+):
+    """Full-text search across bot outputs and results (FTS5, bm25-ranked)."""
     if not q or len(q) < 2:
         return []
-    pattern = f"%{q}%"
-    runs = db.query(Run).filter(
-        Run.output.ilike(pattern)
-    ).order_by(Run.started_at.desc()).limit(20).all()
-    items = []
-    for r in runs:
-        bot = db.query(Bot).get(r.bot_id)
-        items.append({
-            "id": r.id, "type": "run", "bot_id": r.bot_id,
-            "bot_name": bot.name if bot else "?",
-            "bot_emoji": bot.emoji if bot else "🤖",
-            "status": r.status,
-            "preview": _highlight(r.output or "", q, 200),
-            "started_at": r.started_at.isoformat() if r.started_at else None,
-        })
-    return items
-
-
-def _highlight(text: str, query: str, max_len: int = 200) -> str:
-    """Find the query in text and return surrounding context."""
-    idx = text.lower().find(query.lower())
-    if idx == -1:
-        return text[:max_len]
-    start = max(0, idx - 60)
-    end = min(len(text), idx + len(query) + 140)
-    snippet = text[start:end]
-    if start > 0:
-        snippet = "..." + snippet
-    if end < len(text):
-        snippet = snippet + "..."
-    return snippet
+    hits = search_index.search(db, q, bot_id=bot_id, status=status, since=since, until=until,
+                               after=decode_cursor(cursor) if cursor else None, limit=limit + 1)
+    if len(hits) > limit:
+        hits = hits[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(hits[-1]["score"], hits[-1]["doc_id"])
+    return [{
+        "id": h["id"], "type": "run", "bot_id": h["bot_id"],
+        "bot_name": h["bot_name"] or "?",
+        "bot_emoji": h["bot_emoji"] or "🤖",
+        "status": h["status"],
+        "title": h["title"],
+        "preview": h["preview"],
+        "started_at": h["started_at"].isoformat() if h["started_at"] else None,
+    } for h in hits]
 
 
 # ── Export ────────────────────────────────────────────────
@@ -419,7 +634,7 @@ def export_bot(bot_id: str, db: Session = Depends(get_db)):
     bot = db.query(Bot).get(bot_id)
     if not bot:
         raise HTTPException(404)
-    runs = db.query(Run).filter(Run.bot_id == bot_id, Run.status == "completed").order_by(Run.started_at.desc()).limit(10).all()
+    runs = db.query(Run).options(selectinload(Run.body)).filter(Run.bot_id == bot_id, Run.status == "completed").order_by(Run.started_at.desc()).limit(10).all()
     return {
         "version": "1.0",
         "bot": {
@@ -457,33 +672,57 @@ def import_bot(data: dict, db: Session = Depends(get_db)):
     db.add(bot)
     db.commit()
     db.refresh(bot)
+    http_cache.bump("bots")
     if bot.schedule:
         register_bot(bot.id, bot.schedule)
     return _bot_to_out(bot)
 
 
-# ── Export CSV ────────────────────────────────────────────
+# ── Export runs (streaming) ───────────────────────────────
+
+@app.get("/api/bots/{bot_id}/export/runs")
+def export_runs(
+    bot_id: str,
+    format: str = "ndjson",
+    fields: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    gzip: bool = False,
+    db: Session = Depends(get_db),
+):
+    """Stream a bot's complete run history as CSV or NDJSON (constant memory)."""
+    if format not in exports.FORMATS:
+        raise HTTPException(400, f"Format muss eines von {', '.join(exports.FORMATS)} sein")
+    if not db.query(Bot.id).filter(Bot.id == bot_id).first():
+        raise HTTPException(404, "Bot not found")
+    selected = exports.parse_fields(fields)
+    filename = f"bot-{bot_id}-runs.{format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        exports.stream_runs(bot_id, format, selected, since, until, gzip),
+        media_type="application/gzip" if gzip else exports.FORMATS[format],
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
 
 @app.get("/api/bots/{bot_id}/export-csv")
-def export_csv(bot_id: str, db: Session = Depends(get_db)):
-    """Export bot runs as CSV."""
-    from fastapi.responses import PlainTextResponse
-    runs = db.query(Run).filter(Run.bot_id == bot_id).order_by(Run.started_at.desc()).limit(100).all()
-    lines = ["Zeitpunkt;Status;Dauer (s);Tokens;Kosten ($);Output"]
-    for r in runs:
-        ts = r.started_at.strftime("%d.%m.%Y %H:%M") if r.started_at else ""
-        dur = f"{r.duration_ms / 1000:.1f}" if r.duration_ms else ""
-        tokens = str((r.tokens_in or 0) + (r.tokens_out or 0))
-        cost = f"{r.cost_estimate:.4f}" if r.cost_estimate else "0"
-        output = (r.output or "").replace(";", ",").replace("\n", " ")[:500]
-        lines.append(f"{ts};{r.status};{dur};{tokens};{cost};{output}")
-    return PlainTextResponse("\n".join(lines), media_type="text/csv",
-                             headers={"Content-Disposition": f"attachment; filename=bot-{bot_id}-runs.csv"})
+def export_csv(bot_id: str, fields: Optional[str] = None, db: Session = Depends(get_db)):
+    """Export bot runs as CSV (all runs, streamed). Without `fields`: the original
+    columns (Zeitpunkt;Status;Dauer (s);Tokens;Kosten ($);Output); with `fields`:
+    those export fields, as in /export/runs?format=csv."""
+    if fields:
+        return export_runs(bot_id, format="csv", fields=fields, db=db)
+    if not db.query(Bot.id).filter(Bot.id == bot_id).first():
+        raise HTTPException(404, "Bot not found")
+    return StreamingResponse(
+        exports.stream_legacy_csv(bot_id), media_type="text/csv",
+        headers={"Content-Disposition": f"attachment; filename=bot-{bot_id}-runs.csv"},
+    )
 
 
 # ── System Info ───────────────────────────────────────────
 
 @app.get("/api/system")
+@query_budget(4)
 def system_info(db: Session = Depends(get_db)):
     """System status overview."""
     import sqlite3
@@ -494,11 +733,9 @@ def system_info(db: Session = Depends(get_db)):
     db_path = os.getenv("DATABASE_URL", "sqlite:///./openorchestrator.db").replace("sqlite:///", "")
     db_size = os.path.getsize(db_path) if os.path.exists(db_path) else 0
     # Active keys
-    keys_set = []
-    for key in ["openai_api_key", "anthropic_api_key", "google_api_key", "mistral_api_key"]:
-        s = db.query(Setting).get(key)
-        if s and s.value:
-            keys_set.append(key.replace("_api_key", "").capitalize())
+    key_names = ["openai_api_key", "anthropic_api_key", "google_api_key", "mistral_api_key"]
+    settings = settings_cache.snapshot_sync(db)
+    keys_set = [key.replace("_api_key", "").capitalize() for key in key_names if settings.get(key)]
     return {
         "version": "0.3.0",
         "bots": bot_count,
@@ -513,6 +750,7 @@ def system_info(db: Session = Depends(get_db)):
 # ── Templates & Health ────────────────────────────────────
 
 @app.get("/api/templates")
+@etag_cached("templates")
 def list_templates():
     from templates import TEMPLATES
     return TEMPLATES
@@ -598,9 +836,9 @@ def telegram_disconnect(link_id: str, db: Session = Depends(get_db)):
 
 
 @app.post("/api/telegram/test/{link_id}")
-async def telegram_test_message(link_id: str, db: Session = Depends(get_db)):
+async def telegram_test_message(link_id: str, db: AsyncSession = Depends(get_async_db)):
     """Send a test message to a connected Telegram."""
-    link = db.query(TelegramLink).filter(TelegramLink.id == link_id, TelegramLink.status == "connected").first()
+    link = (await db.execute(select(TelegramLink).filter(TelegramLink.id == link_id, TelegramLink.status == "connected"))).scalars().first()
     if not link:
         raise HTTPException(404, "Connection not found")
     result = await telegram_bot.send_message(
@@ -628,16 +866,18 @@ def waitlist_signup(data: dict, db: Session = Depends(get_db)):
 
 
 @app.get("/api/waitlist")
-def waitlist_list(db: Session = Depends(get_db)):
-    entries = db.query(WaitlistEntry).order_by(WaitlistEntry.created_at.desc()).all()
+def waitlist_list(response: Response, cursor: Optional[str] = None, limit: int = limit_param(),
+                  db: Session = Depends(get_db)):
+    entries = paginate(db.query(WaitlistEntry), response, WaitlistEntry.created_at, WaitlistEntry.id, cursor, limit)
     return [{"email": e.email, "created_at": e.created_at.isoformat()} for e in entries]
 
 
 # ── Credentials Vault ────────────────────────────────────
 
 @app.get("/api/credentials")
-def list_credentials(db: Session = Depends(get_db)):
-    creds = db.query(Credential).order_by(Credential.created_at.desc()).all()
+def list_credentials(response: Response, cursor: Optional[str] = None, limit: int = limit_param(),
+                     db: Session = Depends(get_db)):
+    creds = paginate(db.query(Credential), response, Credential.created_at, Credential.id, cursor, limit)
     return [{
         "id": c.id, "name": c.name, "cred_type": c.cred_type,
         "service": c.service, "shared": c.shared,
@@ -1,14 +1,37 @@
-"""Simple SQLite migrations — add missing columns/tables on startup."""
+"""Versioned SQLite migrations.
+
+Each migration runs once, in order, inside its own transaction and is recorded
+in schema_version. When the schema is current, run_migrations() costs a single
+SELECT. Add new migrations by appending to MIGRATIONS — never edit a released one.
+
+Base.metadata.create_all() runs first (see main.py), so fresh databases already
+have every table and model-declared index; migrations bring older databases up
+to the same shape.
+"""
 import sqlite3
 import os
 
+from database import pack_text
+
 DB_PATH = os.getenv("DATABASE_URL", "sqlite:///./openorchestrator.db").replace("sqlite:///", "")
 
 
-def run_migrations():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+def _add_columns(c, table, columns):
+    for col, typ, default in columns:
+        try:
+            c.execute(f"ALTER TABLE {table} ADD COLUMN {col} {typ} DEFAULT {default}")
+        except sqlite3.OperationalError:
+            pass  # column exists
+
+
+def _no_transaction(migrate):
+    """Mark a migration that must run outside BEGIN/COMMIT (e.g. VACUUM)."""
+    migrate.transactional = False
+    return migrate
 
+
+def _m001_baseline(c):
+    """Tables and columns added before versioning existed."""
     # Settings table
     c.execute("""CREATE TABLE IF NOT EXISTS settings (
         key TEXT PRIMARY KEY,
@@ -17,27 +40,19 @@ def run_migrations():
     )""")
 
     # New columns on bots
-    for col, typ, default in [
+    _add_columns(c, "bots", [
         ("enabled", "BOOLEAN", "1"),
         ("max_runtime_seconds", "INTEGER", "120"),
-    ]:
-        try:
-            c.execute(f"ALTER TABLE bots ADD COLUMN {col} {typ} DEFAULT {default}")
-        except sqlite3.OperationalError:
-            pass  # column exists
+    ])
 
     # New columns on runs
-    for col, typ, default in [
+    _add_columns(c, "runs", [
         ("tokens_in", "INTEGER", "NULL"),
         ("tokens_out", "INTEGER", "NULL"),
         ("cost_estimate", "REAL", "NULL"),
         ("error_message", "TEXT", "NULL"),
         ("output_hash", "TEXT", "NULL"),
-    ]:
-        try:
-            c.execute(f"ALTER TABLE runs ADD COLUMN {col} {typ} DEFAULT {default}")
-        except sqlite3.OperationalError:
-            pass
+    ])
 
     # Pipelines
     c.execute("""CREATE TABLE IF NOT EXISTS pipelines (
@@ -88,6 +103,161 @@ def run_migrations():
         PRIMARY KEY (bot_id, channel_id)
     )""")
 
-    conn.commit()
-    conn.close()
-    print("[migrations] done")
+
+def _m002_hot_path_indexes(c):
+    """Composite indexes for per-bot listings, last-run lookups and trigger fan-out."""
+    c.execute("CREATE INDEX IF NOT EXISTS ix_runs_bot_started ON runs (bot_id, started_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS ix_runs_bot_status_finished ON runs (bot_id, status, finished_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS ix_runs_started ON runs (started_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS ix_results_bot_created ON results (bot_id, created_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS ix_triggers_source_event_enabled ON triggers (source_bot, event, enabled)")
+    c.execute("CREATE INDEX IF NOT EXISTS ix_pipeline_runs_pipeline_started ON pipeline_runs (pipeline_id, started_at)")
+    c.execute("ANALYZE")
+
+
+def _m003_run_bodies(c, batch_size=1000):
+    """Move runs.input/output/log into compressed run_bodies and drop them from runs."""
+    c.execute("""CREATE TABLE IF NOT EXISTS run_bodies (
+        run_id TEXT PRIMARY KEY REFERENCES runs(id) ON DELETE CASCADE,
+        input BLOB,
+        output BLOB,
+        log BLOB
+    )""")
+    columns = {row[1] for row in c.execute("PRAGMA table_info(runs)")}
+    body_cols = [col for col in ("input", "output", "log") if col in columns]
+    if not body_cols:
+        return  # fresh database, created without inline bodies
+
+    select_cols = ", ".join(f"{col} AS {col}" if col in body_cols else f"NULL AS {col}" for col in ("input", "output", "log"))
+    last_rowid = 0
+    moved = 0
+    while True:
+        rows = c.execute(
+            f"SELECT rowid, id, {select_cols} FROM runs WHERE rowid > ? ORDER BY rowid LIMIT ?",
+            (last_rowid, batch_size),
+        ).fetchall()
+        if not rows:
+            break
+        last_rowid = rows[-1][0]
+        c.executemany(
+            "INSERT OR REPLACE INTO run_bodies (run_id, input, output, log) VALUES (?, ?, ?, ?)",
+            [(run_id, pack_text(inp), pack_text(out), pack_text(log)) for _, run_id, inp, out, log in rows],
+        )
+        moved += len(rows)
+
+    for col in body_cols:
+        try:
+            c.execute(f"ALTER TABLE runs DROP COLUMN {col}")
+        except sqlite3.OperationalError:
+            c.execute(f"UPDATE runs SET {col} = NULL")  # SQLite < 3.35: no DROP COLUMN
+    print(f"[migrations] moved {moved} run bodies to run_bodies")
+
+
+def _m004_usage_rollups(c):
+    """Record the model on each run and backfill usage_rollups from history."""
+    import rollups
+    _add_columns(c, "runs", [("model", "TEXT", "NULL")])
+    c.execute("""CREATE TABLE IF NOT EXISTS usage_rollups (
+        bot_id TEXT NOT NULL,
+        model TEXT NOT NULL DEFAULT '',
+        period TEXT NOT NULL,
+        bucket DATETIME NOT NULL,
+        runs INTEGER DEFAULT 0,
+        completed INTEGER DEFAULT 0,
+        failed INTEGER DEFAULT 0,
+        duration_ms_total INTEGER DEFAULT 0,
+        duration_count INTEGER DEFAULT 0,
+        tokens_in INTEGER DEFAULT 0,
+        tokens_out INTEGER DEFAULT 0,
+        cost REAL DEFAULT 0,
+        PRIMARY KEY (bot_id, model, period, bucket)
+    )""")
+    rollups.backfill(c)
+
+
+@_no_transaction
+def _m005_retention(c):
+    """Per-bot retention columns; switch the file to incremental auto-vacuum (one full VACUUM)."""
+    _add_columns(c, "bots", [
+        ("retention_keep_runs", "INTEGER", "NULL"),
+        ("retention_keep_days", "INTEGER", "NULL"),
+    ])
+    if c.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        c.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        c.execute("VACUUM")
+
+
+def _m006_search_index(c):
+    """FTS5 search index over run outputs, result titles and (optionally) logs."""
+    import search_index
+    search_index.rebuild(c)
+
+
+def _m007_pagination_indexes(c):
+    """Timestamp indexes for keyset-paginated lists that had none."""
+    c.execute("CREATE INDEX IF NOT EXISTS ix_waitlist_created ON waitlist (created_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS ix_credentials_created ON credentials (created_at)")
+
+
+MIGRATIONS = [
+    (1, "baseline", _m001_baseline),
+    (2, "hot path indexes", _m002_hot_path_indexes),
+    (3, "compressed run bodies", _m003_run_bodies),
+    (4, "usage rollups", _m004_usage_rollups),
+    (5, "retention", _m005_retention),
+    (6, "search index", _m006_search_index),
+    (7, "pagination indexes", _m007_pagination_indexes),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def _current_version(c) -> int:
+    try:
+        return c.execute("SELECT MAX(version) FROM schema_version").fetchone()[0] or 0
+    except sqlite3.OperationalError:
+        c.execute("""CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )""")
+        return 0
+
+
+def is_current() -> bool:
+    """Schema at LATEST_VERSION? Standalone workers check this instead of migrating (the API node does)."""
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    try:
+        return _current_version(conn.cursor()) >= LATEST_VERSION
+    finally:
+        conn.close()
+
+
+def run_migrations():
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.isolation_level = None  # explicit BEGIN/COMMIT per migration
+    try:
+        c = conn.cursor()
+        current = _current_version(c)
+        if current >= LATEST_VERSION:
+            return
+
+        for version, name, migrate in MIGRATIONS:
+            if version <= current:
+                continue
+            if not getattr(migrate, "transactional", True):
+                migrate(c)  # must be idempotent — it is not rolled back on failure
+                c.execute("INSERT INTO schema_version (version, name) VALUES (?, ?)", (version, name))
+                print(f"[migrations] applied {version:03d} {name}")
+                continue
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                migrate(c)
+                c.execute("INSERT INTO schema_version (version, name) VALUES (?, ?)", (version, name))
+                c.execute("COMMIT")
+            except Exception:
+                c.execute("ROLLBACK")
+                raise
+            print(f"[migrations] applied {version:03d} {name}")
+    finally:
+        conn.close()
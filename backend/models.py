@@ -1,7 +1,10 @@
 import uuid
 from datetime import datetime, timezone
-from sqlalchemy import Column, String, Text, Boolean, Integer, Float, DateTime, ForeignKey
-from database import Base
+from sqlalchemy import Column, String, Text, Boolean, Integer, Float, DateTime, ForeignKey, Index, LargeBinary
+from sqlalchemy.ext.associationproxy import association_proxy
+from sqlalchemy.orm import relationship, deferred
+from sqlalchemy.types import TypeDecorator
+from database import Base, pack_text, unpack_text
 
 
 def new_id():
@@ -12,6 +15,23 @@ def utcnow():
     return datetime.now(timezone.utc)
 
 
+def naive_utc(dt: datetime) -> datetime:
+    """A filter value for the naive-UTC columns: aware values are converted, naive ones taken as UTC."""
+    return dt.astimezone(timezone.utc).replace(tzinfo=None) if dt.tzinfo is not None else dt
+
+
+class CompressedText(TypeDecorator):
+    """Text stored zlib-compressed in a BLOB column."""
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return pack_text(value)
+
+    def process_result_value(self, value, dialect):
+        return unpack_text(value)
+
+
 class TelegramLink(Base):
     __tablename__ = "telegram_links"
     id = Column(String, primary_key=True, default=new_id)
@@ -30,6 +50,10 @@ class WaitlistEntry(Base):
     email = Column(String, nullable=False, unique=True)
     created_at = Column(DateTime, default=utcnow)
 
+    __table_args__ = (
+        Index("ix_waitlist_created", "created_at"),
+    )
+
 
 class Setting(Base):
     __tablename__ = "settings"
@@ -52,6 +76,8 @@ class Bot(Base):
     notify = Column(Text, default='["dashboard"]')
     enabled = Column(Boolean, default=True)
     max_runtime_seconds = Column(Integer, default=120)
+    retention_keep_runs = Column(Integer, nullable=True)  # None = global setting / keep all
+    retention_keep_days = Column(Integer, nullable=True)
     created_at = Column(DateTime, default=utcnow)
     updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
 
@@ -65,16 +91,19 @@ class Trigger(Base):
     target_action = Column(String, default="start")
     enabled = Column(Boolean, default=True)
 
+    __table_args__ = (
+        Index("ix_triggers_source_event_enabled", "source_bot", "event", "enabled"),
+    )
+
 
 class Run(Base):
+    """Narrow run metadata. Bodies (input/output/log) live in run_bodies."""
     __tablename__ = "runs"
     id = Column(String, primary_key=True, default=new_id)
     bot_id = Column(String, ForeignKey("bots.id"), nullable=False)
     trigger = Column(String, default="manual")
     status = Column(String, default="running")
-    input = Column(Text, nullable=True)
-    output = Column(Text, nullable=True)
-    log = Column(Text, nullable=True)
+    model = Column(String, nullable=True)
     error_message = Column(Text, nullable=True)
     started_at = Column(DateTime, default=utcnow)
     finished_at = Column(DateTime, nullable=True)
@@ -84,6 +113,64 @@ class Run(Base):
     cost_estimate = Column(Float, nullable=True)
     output_hash = Column(String, nullable=True)
 
+    __table_args__ = (
+        Index("ix_runs_bot_started", "bot_id", "started_at"),
+        Index("ix_runs_bot_status_finished", "bot_id", "status", "finished_at"),
+        Index("ix_runs_started", "started_at"),
+    )
+
+    body = relationship("RunBody", uselist=False, cascade="all, delete-orphan")
+    # Lazy — touching any of these loads the body row (sync sessions only;
+    # async code must load RunBody explicitly)
+    input = association_proxy("body", "input", creator=lambda v: RunBody(input=v))
+    output = association_proxy("body", "output", creator=lambda v: RunBody(output=v))
+    log = association_proxy("body", "log", creator=lambda v: RunBody(log=v))
+
+
+class RunBody(Base):
+    """Compressed run input/output/log, one row per run, kept out of the hot runs table."""
+    __tablename__ = "run_bodies"
+    run_id = Column(String, ForeignKey("runs.id", ondelete="CASCADE"), primary_key=True)
+    input = Column(CompressedText, nullable=True)
+    output = Column(CompressedText, nullable=True)
+    log = deferred(Column(CompressedText, nullable=True))
+
+
+class RunJob(Base):
+    """Durable queue entry of a queued or running run, with its worker lease (see run_jobs.py)."""
+    __tablename__ = "run_jobs"
+    run_id = Column(String, ForeignKey("runs.id", ondelete="CASCADE"), primary_key=True)
+    bot_id = Column(String, nullable=False)
+    priority = Column(Integer, default=0)
+    state = Column(String, default="queued")  # queued | leased
+    worker_id = Column(String, nullable=True)
+    attempts = Column(Integer, default=0)
+    lease_expires_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=utcnow)
+
+    __table_args__ = (
+        Index("ix_run_jobs_state_lease", "state", "lease_expires_at"),
+        Index("ix_run_jobs_worker", "worker_id"),
+    )
+
+
+class UsageRollup(Base):
+    """Finished-run counters per bot, model and hour/day bucket (see rollups.py)."""
+    __tablename__ = "usage_rollups"
+    bot_id = Column(String, primary_key=True)
+    model = Column(String, primary_key=True, default="")
+    period = Column(String, primary_key=True)  # hour | day
+    bucket = Column(DateTime, primary_key=True)  # period start, UTC
+    runs = Column(Integer, default=0)
+    completed = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    duration_ms_total = Column(Integer, default=0)
+    duration_count = Column(Integer, default=0)
+    tokens_in = Column(Integer, default=0)
+    tokens_out = Column(Integer, default=0)
+    cost = Column(Float, default=0.0)
+
 
 class Pipeline(Base):
     __tablename__ = "pipelines"
@@ -115,6 +202,10 @@ class PipelineRun(Base):
     started_at = Column(DateTime, default=utcnow)
     finished_at = Column(DateTime, nullable=True)
 
+    __table_args__ = (
+        Index("ix_pipeline_runs_pipeline_started", "pipeline_id", "started_at"),
+    )
+
 
 class Channel(Base):
     __tablename__ = "channels"
@@ -146,6 +237,10 @@ class Result(Base):
     pinned = Column(Boolean, default=False)
     created_at = Column(DateTime, default=utcnow)
 
+    __table_args__ = (
+        Index("ix_results_bot_created", "bot_id", "created_at"),
+    )
+
 
 class Credential(Base):
     __tablename__ = "credentials"
@@ -158,6 +253,10 @@ class Credential(Base):
     created_at = Column(DateTime, default=utcnow)
     updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
 
+    __table_args__ = (
+        Index("ix_credentials_created", "created_at"),
+    )
+
 
 class BotCredential(Base):
     __tablename__ = "bot_credentials"
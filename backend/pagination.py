@@ -0,0 +1,71 @@
+"""Keyset (cursor) pagination for list endpoints.
+
+Pages are ordered newest first by (timestamp, id) and continue strictly after the
+last row of the previous page, so page N costs the same index range scan as
+page 1 — no OFFSET. The opaque cursor for the next page is returned in the
+X-Next-Cursor response header (absent on the last page); the body stays a
+plain list so existing clients keep working.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Optional, Tuple
+
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import and_, or_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+def limit_param(default: int = DEFAULT_LIMIT):
+    return Query(default, ge=1, le=MAX_LIMIT)
+
+
+def encode_cursor(key: Any, id_: Any) -> str:
+    if isinstance(key, datetime):
+        key = key.isoformat()
+    raw = json.dumps([key, id_], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        key, id_ = json.loads(raw)
+        return key, id_
+    except (ValueError, TypeError):
+        raise HTTPException(400, "Ungültiger Cursor")
+
+
+def _decode_timestamp_cursor(cursor: str) -> Tuple[datetime, Any]:
+    key, id_ = decode_cursor(cursor)
+    try:
+        return datetime.fromisoformat(key), id_
+    except (ValueError, TypeError):
+        raise HTTPException(400, "Ungültiger Cursor")
+
+
+def after(ts_col, id_col, cursor: str):
+    """WHERE clause for rows strictly after `cursor` in (ts DESC, id DESC) order.
+
+    The redundant `ts <= key` bound lets SQLite use the timestamp index as a range.
+    """
+    key, id_ = _decode_timestamp_cursor(cursor)
+    return and_(ts_col <= key, or_(ts_col < key, id_col < id_))
+
+
+def paginate(query, response: Response, ts_col, id_col, cursor: Optional[str], limit: int) -> list:
+    """Apply keyset ordering/filter to a sync ORM query and set X-Next-Cursor.
+
+    `query` must select a single entity that has `ts_col` and `id_col`.
+    """
+    if cursor:
+        query = query.filter(after(ts_col, id_col, cursor))
+    rows = query.order_by(ts_col.desc(), id_col.desc()).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(getattr(last, ts_col.key), getattr(last, id_col.key))
+    return rows
@@ -1,117 +1,142 @@
 """Pipeline runner — executes bot chains sequentially with output forwarding."""
 import asyncio
-from database import SessionLocal
-from models import Pipeline, PipelineStep, PipelineRun, Bot, Run, new_id, utcnow
-from bot_runner import run_bot, active_tasks
+from sqlalchemy import select, update
+from database import AsyncSessionLocal
+from models import Pipeline, PipelineStep, PipelineRun, Bot, Run, RunBody, new_id, utcnow
+import run_queue
+import db_writer
+import http_cache
+import events
+
+
+async def _insert(obj):
+    async def job(db):
+        db.add(obj)
+    await db_writer.submit(job)
+
+
+async def _update_pipeline_run(p_run_id: str, **fields):
+    async def job(db):
+        p_run = await db.get(PipelineRun, p_run_id)
+        for k, v in fields.items():
+            setattr(p_run, k, v)
+    await db_writer.submit(job)
+    if "status" in fields:
+        http_cache.bump("pipelines")
+        events.publish("pipeline_finished", pipeline_run_id=p_run_id, status=fields["status"])
+
+
+async def _run_output(run_id: str):
+    """Returns the output of a completed run, or None if it did not complete."""
+    async with AsyncSessionLocal() as db:
+        row = (await db.execute(
+            select(Run.status, RunBody.output).outerjoin(RunBody, RunBody.run_id == Run.id).filter(Run.id == run_id)
+        )).first()
+        return (row.output or "") if row and row.status == "completed" else None
+
+
+async def recover():
+    """Startup: pipelines are orchestrated in this process — runs left "running" died with the last one."""
+    async def job(db):
+        result = await db.execute(
+            update(PipelineRun).where(PipelineRun.status == "running").values(status="failed", finished_at=utcnow())
+        )
+        return result.rowcount
+    if await db_writer.submit(job):
+        http_cache.bump("pipelines")
 
 
 async def run_pipeline(pipeline_id: str):
     """Run all steps in a pipeline sequentially."""
-    db = SessionLocal()
-    try:
-        pipeline = db.query(Pipeline).get(pipeline_id)
+    async with AsyncSessionLocal() as db:
+        pipeline = await db.get(Pipeline, pipeline_id)
         if not pipeline or not pipeline.enabled:
             return
 
-        steps = db.query(PipelineStep).filter(
+        steps = (await db.execute(select(PipelineStep).filter(
             PipelineStep.pipeline_id == pipeline_id
-        ).order_by(PipelineStep.step_order).all()
+        ).order_by(PipelineStep.step_order))).scalars().all()
 
         if not steps:
             return
 
-        # Create pipeline run
-        p_run = PipelineRun(id=new_id(), pipeline_id=pipeline_id, status="running", current_step=0)
-        db.add(p_run)
-        db.commit()
-
-        prev_output = None
-
-        for i, step in enumerate(steps):
-            bot = db.query(Bot).get(step.bot_id)
-            if not bot:
-                if pipeline.error_policy == "abort":
-                    p_run.status = "failed"
-                    p_run.finished_at = utcnow()
-                    db.commit()
-                    return
-                continue
-
-            p_run.current_step = i + 1
-            db.commit()
-
-            # Determine input
-            input_context = None
-            if step.input_mode == "forward" and prev_output:
-                input_context = prev_output
-            elif step.input_mode == "merge" and prev_output:
-                input_context = prev_output  # Runner merges with bot prompt
-
-            # Create and run bot
-            run = Run(
+        bots = {}
+        for step in steps:
+            if step.bot_id not in bots:
+                bots[step.bot_id] = await db.get(Bot, step.bot_id)
+
+    # Create pipeline run
+    p_run = PipelineRun(id=new_id(), pipeline_id=pipeline_id, status="running", current_step=0)
+    await _insert(p_run)
+    http_cache.bump("pipelines")
+    events.publish("pipeline_started", pipeline_id=pipeline_id, pipeline_run_id=p_run.id, steps=len(steps))
+
+    prev_output = None
+
+    for i, step in enumerate(steps):
+        bot = bots.get(step.bot_id)
+        if not bot:
+            if pipeline.error_policy == "abort":
+                await _update_pipeline_run(p_run.id, status="failed", finished_at=utcnow())
+                return
+            continue
+
+        await _update_pipeline_run(p_run.id, current_step=i + 1)
+
+        # Determine input
+        input_context = None
+        if step.input_mode == "forward" and prev_output:
+            input_context = prev_output
+        elif step.input_mode == "merge" and prev_output:
+            input_context = prev_output  # Runner merges with bot prompt
+
+        # Create and run bot
+        run = Run(
+            id=new_id(), bot_id=bot.id,
+            trigger=f"pipeline:{pipeline_id}:step:{i+1}",
+            status="queued", started_at=utcnow(),
+            input=input_context[:4000] if input_context else None,
+        )
+        await _insert(run)
+        events.publish("pipeline_step", pipeline_id=pipeline_id, pipeline_run_id=p_run.id,
+                       step=i + 1, bot_id=bot.id, run_id=run.id)
+
+        # Detach
+        bot_data = Bot(
+            id=bot.id, name=bot.name, emoji=bot.emoji, description=bot.description,
+            prompt=bot.prompt, model=bot.model, tools=bot.tools, schedule=bot.schedule,
+            docs_path=bot.docs_path, notify=bot.notify, enabled=bot.enabled,
+            max_runtime_seconds=bot.max_runtime_seconds,
+        )
+        run_data = Run(id=run.id, bot_id=run.bot_id, trigger=run.trigger, status=run.status, started_at=run.started_at)
+
+        # Run (through the queue, pipeline priority) and wait for completion
+        await run_queue.run_and_wait(bot_data, run_data, input_context=input_context)
+
+        # Check result
+        output = await _run_output(run.id)
+        if output is not None:
+            prev_output = output
+        elif pipeline.error_policy == "abort":
+            await _update_pipeline_run(p_run.id, status="failed", finished_at=utcnow())
+            return
+        elif pipeline.error_policy == "skip":
+            prev_output = None
+        elif pipeline.error_policy == "retry":
+            # One retry
+            run2 = Run(
                 id=new_id(), bot_id=bot.id,
-                trigger=f"pipeline:{pipeline_id}:step:{i+1}",
-                status="running",
+                trigger=f"pipeline:{pipeline_id}:step:{i+1}:retry",
+                status="queued", started_at=utcnow(),
                 input=input_context[:4000] if input_context else None,
             )
-            db.add(run)
-            db.commit()
-
-            # Detach
-            bot_data = Bot(
-                id=bot.id, name=bot.name, emoji=bot.emoji, description=bot.description,
-                prompt=bot.prompt, model=bot.model, tools=bot.tools, schedule=bot.schedule,
-                docs_path=bot.docs_path, notify=bot.notify, enabled=bot.enabled,
-                max_runtime_seconds=bot.max_runtime_seconds,
-            )
-            run_data = Run(id=run.id, bot_id=run.bot_id, trigger=run.trigger, status=run.status, started_at=run.started_at)
-
-            # Run and wait for completion
-            await run_bot(bot_data, run_data, lambda: SessionLocal(), input_context=input_context)
-
-            # Check result
-            db2 = SessionLocal()
-            try:
-                completed_run = db2.query(Run).get(run.id)
-                if completed_run.status == "completed":
-                    prev_output = completed_run.output
-                elif pipeline.error_policy == "abort":
-                    p_run = db.query(PipelineRun).get(p_run.id)
-                    p_run.status = "failed"
-                    p_run.finished_at = utcnow()
-                    db.commit()
-                    return
-                elif pipeline.error_policy == "skip":
-                    prev_output = None
-                elif pipeline.error_policy == "retry":
-                    # One retry
-                    run2 = Run(
-                        id=new_id(), bot_id=bot.id,
-                        trigger=f"pipeline:{pipeline_id}:step:{i+1}:retry",
-                        status="running", input=input_context[:4000] if input_context else None,
-                    )
-                    db.add(run2)
-                    db.commit()
-                    run2_data = Run(id=run2.id, bot_id=run2.bot_id, trigger=run2.trigger, status=run2.status, started_at=run2.started_at)
-                    await run_bot(bot_data, run2_data, lambda: SessionLocal(), input_context=input_context)
-                    db3 = SessionLocal()
-                    retry_run = db3.query(Run).get(run2.id)
-                    prev_output = retry_run.output if retry_run.status == "completed" else None
-                    db3.close()
-                    if not prev_output and pipeline.error_policy == "retry":
-                        p_run = db.query(PipelineRun).get(p_run.id)
-                        p_run.status = "failed"
-                        p_run.finished_at = utcnow()
-                        db.commit()
-                        return
-            finally:
-                db2.close()
-
-        # All steps done
-        p_run = db.query(PipelineRun).get(p_run.id)
-        p_run.status = "completed"
-        p_run.finished_at = utcnow()
-        db.commit()
-
-    finally:
-        db.close()
+            await _insert(run2)
+            run2_data = Run(id=run2.id, bot_id=run2.bot_id, trigger=run2.trigger, status=run2.status, started_at=run2.started_at)
+            await run_queue.run_and_wait(bot_data, run2_data, input_context=input_context)
+            prev_output = await _run_output(run2.id)
+            if not prev_output:
+                await _update_pipeline_run(p_run.id, status="failed", finished_at=utcnow())
+                return
+
+    # All steps done
+    await _update_pipeline_run(p_run.id, status="completed", finished_at=utcnow())
@@ -0,0 +1,99 @@
+"""Per-endpoint SQL statement budgets.
+
+    @app.get("/api/activity")
+    @query_budget(3)
+    def activity_feed(...): ...
+
+counts every statement the endpoint executes (both engines) and logs a warning
+when it exceeds its budget — or raises QueryBudgetExceeded when
+QUERY_BUDGET_STRICT=1, which is how to run the app in development/CI so an N+1
+regression fails loudly instead of slowing the dashboard poll.
+
+count_queries() is the same counter as a context manager for scripts:
+
+    with count_queries() as counter:
+        client.get("/api/pipelines")
+    print(counter.count, counter.statements)
+"""
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+from contextlib import contextmanager
+from typing import List, Optional
+
+from sqlalchemy import event
+
+from database import engine, async_engine
+
+logger = logging.getLogger("query_budget")
+
+STRICT = os.getenv("QUERY_BUDGET_STRICT", "").lower() in ("1", "true", "yes")
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryCounter:
+    def __init__(self, parent: Optional["QueryCounter"] = None):
+        self.count = 0
+        self.statements: List[str] = []
+        self.parent = parent  # nested counters also count towards the enclosing one
+
+
+_current: contextvars.ContextVar[Optional[QueryCounter]] = contextvars.ContextVar("query_counter", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    counter = _current.get()
+    while counter is not None:
+        counter.count += 1
+        counter.statements.append(statement)
+        counter = counter.parent
+
+
+event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+event.listen(async_engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+
+
+@contextmanager
+def count_queries():
+    counter = QueryCounter(parent=_current.get())
+    token = _current.set(counter)
+    try:
+        yield counter
+    finally:
+        _current.reset(token)
+
+
+def _check(name: str, budget: int, counter: QueryCounter):
+    if counter.count <= budget:
+        return
+    msg = f"{name} ran {counter.count} SQL statements (budget {budget})"
+    if STRICT:
+        raise QueryBudgetExceeded(msg + ":\n" + "\n".join(counter.statements))
+    logger.warning(msg)
+
+
+def query_budget(budget: int):
+    """Pin the number of SQL statements an endpoint may issue (sync or async)."""
+    def decorate(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with count_queries() as counter:
+                    result = await fn(*args, **kwargs)
+                _check(fn.__name__, budget, counter)
+                return result
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with count_queries() as counter:
+                    result = fn(*args, **kwargs)
+                _check(fn.__name__, budget, counter)
+                return result
+        wrapper.query_budget = budget
+        return wrapper
+    return decorate
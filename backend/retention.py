@@ -0,0 +1,139 @@
+"""Retention & compaction — prunes old runs/results per bot and reclaims file space.
+
+Policy per bot (Bot.retention_keep_runs / Bot.retention_keep_days), falling back
+to the global settings of the same name. A run is removed once it is outside
+*any* configured limit. Running runs and runs with a pinned result are always
+kept. Usage rollups are not touched, so stats and cost history survive pruning.
+
+Deletes go through db_writer in chunks of CHUNK_SIZE runs so the write lock is
+only ever held briefly; afterwards the freed pages are returned to the OS with
+incremental VACUUM (auto_vacuum=INCREMENTAL, set up by migration 005).
+"""
+import asyncio
+import os
+import time
+from datetime import timedelta
+from typing import Optional
+
+from sqlalchemy import select, delete, exists, and_
+
+from database import AsyncSessionLocal, engine
+from models import Bot, Run, RunBody, Result, utcnow
+import db_writer
+import http_cache
+import settings_cache
+
+CHUNK_SIZE = int(os.getenv("RETENTION_CHUNK_SIZE", "500"))
+VACUUM_STEP_PAGES = int(os.getenv("RETENTION_VACUUM_STEP_PAGES", "2000"))
+
+last_report: Optional[dict] = None
+_lock = asyncio.Lock()
+
+
+def _int_or_none(value) -> Optional[int]:
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+async def _cutoff(db, bot: Bot, default_runs, default_days):
+    """started_at before which this bot's runs may be deleted, or None to keep everything."""
+    keep_runs = _int_or_none(bot.retention_keep_runs) or default_runs
+    keep_days = _int_or_none(bot.retention_keep_days) or default_days
+    cutoffs = []
+    if keep_days:
+        cutoffs.append((utcnow() - timedelta(days=keep_days)).replace(tzinfo=None))
+    if keep_runs:
+        nth = (await db.execute(
+            select(Run.started_at).filter(Run.bot_id == bot.id)
+            .order_by(Run.started_at.desc()).offset(keep_runs - 1).limit(1)
+        )).scalar_one_or_none()
+        if nth:
+            cutoffs.append(nth)
+    return max(cutoffs) if cutoffs else None
+
+
+def _db_pages():
+    with engine.connect() as conn:
+        page_size = conn.exec_driver_sql("PRAGMA page_size").scalar()
+        page_count = conn.exec_driver_sql("PRAGMA page_count").scalar()
+        freelist = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+    return page_size, page_count, freelist
+
+
+def _incremental_vacuum(pages: int):
+    # sqlite3's execute() steps a pragma once (= one page); executescript runs it to completion
+    conn = engine.raw_connection()
+    try:
+        conn.driver_connection.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+    finally:
+        conn.close()
+
+
+async def _delete_chunk(run_ids: list):
+    async def job(db):
+        results = await db.execute(delete(Result).where(Result.run_id.in_(run_ids), Result.pinned == False))
+        await db.execute(delete(RunBody).where(RunBody.run_id.in_(run_ids)))
+        runs = await db.execute(delete(Run).where(Run.id.in_(run_ids)))
+        return runs.rowcount, results.rowcount
+    return await db_writer.submit(job)
+
+
+async def run_retention(chunk_size: int = CHUNK_SIZE) -> dict:
+    """Apply all retention policies, then compact. Returns (and stores) a report."""
+    global last_report
+    async with _lock:
+        started = time.monotonic()
+        page_size, pages_before, _ = await asyncio.to_thread(_db_pages)
+        runs_deleted = results_deleted = 0
+
+        async with AsyncSessionLocal() as db:
+            settings = await settings_cache.snapshot(db)
+            default_runs = _int_or_none(settings.get("retention_keep_runs"))
+            default_days = _int_or_none(settings.get("retention_keep_days"))
+            bots = (await db.execute(select(Bot))).scalars().all()
+            cutoffs = [(b.id, await _cutoff(db, b, default_runs, default_days)) for b in bots]
+
+        pinned = exists().where(and_(Result.run_id == Run.id, Result.pinned == True))
+        for bot_id, cutoff in cutoffs:
+            if cutoff is None:
+                continue
+            while True:
+                async with AsyncSessionLocal() as db:
+                    run_ids = (await db.execute(
+                        select(Run.id).filter(
+                            Run.bot_id == bot_id, Run.started_at < cutoff,
+                            Run.status.notin_(("running", "queued")), ~pinned,
+                        ).order_by(Run.started_at).limit(chunk_size)
+                    )).scalars().all()
+                if not run_ids:
+                    break
+                n_runs, n_results = await _delete_chunk(run_ids)
+                runs_deleted += n_runs
+                results_deleted += n_results
+                await asyncio.sleep(0)  # let queued API writes in between chunks
+
+        # Compact: hand free pages back to the filesystem in small steps
+        while True:
+            _, _, freelist = await asyncio.to_thread(_db_pages)
+            if not freelist:
+                break
+            await asyncio.to_thread(_incremental_vacuum, min(freelist, VACUUM_STEP_PAGES))
+            _, _, remaining = await asyncio.to_thread(_db_pages)
+            if remaining >= freelist:
+                break  # auto_vacuum not enabled on this file
+
+        _, pages_after, _ = await asyncio.to_thread(_db_pages)
+        last_report = {
+            "finished_at": utcnow().isoformat(),
+            "runs_deleted": runs_deleted,
+            "results_deleted": results_deleted,
+            "bytes_reclaimed": max(0, pages_before - pages_after) * page_size,
+            "duration_ms": int((time.monotonic() - started) * 1000),
+        }
+        if runs_deleted:
+            http_cache.bump("runs")
+        print(f"[retention] {last_report}")
+        return last_report
@@ -0,0 +1,172 @@
+"""Usage rollups — per (bot, model, hour/day) run counters maintained incrementally.
+
+bot_runner calls record_run() inside the same write job that finishes a run, so
+/api/usage and /api/bots/{id}/stats never have to scan the runs table.
+
+Rebuild from history (e.g. after restoring a backup):
+
+    python -m rollups rebuild [--batch-size 5000]
+
+Retention deletes runs but not their rollups, so a rebuild only replaces each
+bot's buckets from its oldest remaining run on; older buckets are kept.
+"""
+import sys
+from datetime import datetime
+
+from sqlalchemy.dialects.sqlite import insert
+
+from models import Run, UsageRollup
+
+PERIODS = {
+    "hour": "%Y-%m-%d %H:00:00.000000",
+    "day": "%Y-%m-%d 00:00:00.000000",
+}
+
+_COUNTERS = ("runs", "completed", "failed", "duration_ms_total", "duration_count", "tokens_in", "tokens_out", "cost")
+
+
+def _bucket(ts: datetime, period: str) -> datetime:
+    ts = ts.replace(tzinfo=None, minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0) if period == "day" else ts
+
+
+async def record_run(db, run: Run):
+    """Add one finished run to its hour and day buckets (upsert, no read)."""
+    finished = run.finished_at or run.started_at
+    values = {
+        "runs": 1,
+        "completed": 1 if run.status == "completed" else 0,
+        "failed": 1 if run.status == "failed" else 0,
+        "duration_ms_total": run.duration_ms or 0,
+        "duration_count": 1 if run.duration_ms else 0,
+        "tokens_in": run.tokens_in or 0,
+        "tokens_out": run.tokens_out or 0,
+        "cost": run.cost_estimate or 0.0,
+    }
+    for period in PERIODS:
+        stmt = insert(UsageRollup).values(
+            bot_id=run.bot_id, model=run.model or "", period=period,
+            bucket=_bucket(finished, period), **values,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["bot_id", "model", "period", "bucket"],
+            set_={k: getattr(UsageRollup, k) + stmt.excluded[k] for k in _COUNTERS},
+        )
+        await db.execute(stmt)
+
+
+_BACKFILL_SQL = f"""
+INSERT INTO usage_rollups (bot_id, model, period, bucket, {", ".join(_COUNTERS)})
+SELECT r.bot_id, COALESCE(r.model, b.model, ''), ?, strftime(?, r.finished_at),
+       COUNT(*),
+       SUM(r.status = 'completed'),
+       SUM(r.status = 'failed'),
+       COALESCE(SUM(r.duration_ms), 0),
+       SUM(r.duration_ms IS NOT NULL AND r.duration_ms != 0),
+       COALESCE(SUM(r.tokens_in), 0),
+       COALESCE(SUM(r.tokens_out), 0),
+       COALESCE(SUM(r.cost_estimate), 0)
+FROM runs r LEFT JOIN bots b ON b.id = r.bot_id
+WHERE r.rowid > ? AND r.rowid <= ? AND r.finished_at IS NOT NULL AND r.finished_at <= ?
+GROUP BY 1, 2, 3, 4
+ON CONFLICT (bot_id, model, period, bucket) DO UPDATE SET
+{", ".join(f"{k} = {k} + excluded.{k}" for k in _COUNTERS)}
+"""
+
+
+_EDGE_MERGE_SQL = f"""
+INSERT INTO usage_rollups (bot_id, model, period, bucket, {", ".join(_COUNTERS)})
+SELECT bot_id, model, period, bucket, {", ".join(_COUNTERS)} FROM temp._rollup_edge WHERE 1
+ON CONFLICT (bot_id, model, period, bucket) DO UPDATE SET
+{", ".join(f"{k} = MAX({k}, excluded.{k})" for k in _COUNTERS)}
+"""
+
+
+def _replace_from_oldest_run(cursor, cutoff: str):
+    """Drop each bot's buckets from its oldest remaining run on; keep a copy of that first bucket.
+
+    Older buckets hold runs retention has deleted and can't be rebuilt. The first
+    bucket may be partly pruned, so _merge_edges() keeps the larger of old and
+    rebuilt counters there.
+    """
+    cursor.execute("DROP TABLE IF EXISTS temp._rollup_from")
+    cursor.execute("DROP TABLE IF EXISTS temp._rollup_edge")
+    cursor.execute("CREATE TEMP TABLE _rollup_from (bot_id TEXT, period TEXT, bucket DATETIME)")
+    for period, fmt in PERIODS.items():
+        cursor.execute(
+            "INSERT INTO temp._rollup_from SELECT bot_id, ?, strftime(?, MIN(finished_at)) FROM runs"
+            " WHERE finished_at IS NOT NULL AND finished_at <= ? GROUP BY bot_id",
+            (period, fmt, cutoff),
+        )
+    cursor.execute(
+        "CREATE TEMP TABLE _rollup_edge AS SELECT u.* FROM usage_rollups u JOIN temp._rollup_from f"
+        " ON f.bot_id = u.bot_id AND f.period = u.period AND f.bucket = u.bucket"
+    )
+    cursor.execute(
+        "DELETE FROM usage_rollups WHERE EXISTS (SELECT 1 FROM temp._rollup_from f WHERE f.bot_id ="
+        " usage_rollups.bot_id AND f.period = usage_rollups.period AND usage_rollups.bucket >= f.bucket)"
+    )
+
+
+def _merge_edges(cursor):
+    cursor.execute(_EDGE_MERGE_SQL)
+    cursor.execute("DROP TABLE temp._rollup_edge")
+    cursor.execute("DROP TABLE temp._rollup_from")
+
+
+def backfill(cursor, batch_size: int = 5000, on_batch=None) -> int:
+    """Rebuild rollups from the runs table in rowid batches. Returns runs scanned.
+
+    Works on any DB-API cursor (sqlite3 in migrations, engine.raw_connection() in the
+    CLI). Runs finishing while this executes are recorded live and excluded by the
+    cutoff taken up front. Buckets older than a bot's oldest run are left alone.
+    """
+    cutoff = cursor.execute("SELECT strftime('%Y-%m-%d %H:%M:%f', 'now')").fetchone()[0]
+    _replace_from_oldest_run(cursor, cutoff)
+    max_rowid = cursor.execute("SELECT COALESCE(MAX(rowid), 0) FROM runs").fetchone()[0]
+    if on_batch:
+        on_batch()
+    low = 0
+    while low < max_rowid:
+        high = low + batch_size
+        for period, fmt in PERIODS.items():
+            cursor.execute(_BACKFILL_SQL, (period, fmt, low, high, cutoff))
+        if on_batch:
+            on_batch()
+        low = high
+    _merge_edges(cursor)
+    return max_rowid
+
+
+def add_runs(cursor, after_rowid: int):
+    """Add the finished runs with a rowid above `after_rowid` to their buckets.
+
+    For runs inserted in bulk without record_run() (the workspace import): the
+    existing buckets are kept and only grow.
+    """
+    max_rowid = cursor.execute("SELECT COALESCE(MAX(rowid), 0) FROM runs").fetchone()[0]
+    for period, fmt in PERIODS.items():
+        # no cutoff — these runs finished elsewhere, none is still being recorded live
+        cursor.execute(_BACKFILL_SQL, (period, fmt, after_rowid, max_rowid, "9999-12-31 23:59:59"))
+
+
+def _main(argv):
+    import argparse
+    from database import engine
+
+    parser = argparse.ArgumentParser(prog="python -m rollups")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    conn = engine.raw_connection()
+    try:
+        scanned = backfill(conn.cursor(), args.batch_size, on_batch=conn.commit)
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"[rollups] rebuilt from {scanned} runs")
+
+
+if __name__ == "__main__":
+    _main(sys.argv[1:])
@@ -3,8 +3,11 @@ import json
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, get_async_db
 from models import Channel, BotChannel, new_id
+import http_cache
+from http_cache import etag_cached
 
 router = APIRouter(prefix="/api", tags=["channels"])
 
@@ -16,6 +19,7 @@ class ChannelCreate(BaseModel):
 
 
 @router.get("/channels")
+@etag_cached("channels")
 def list_channels(db: Session = Depends(get_db)):
     channels = db.query(Channel).all()
     result = []
@@ -37,7 +41,7 @@ def list_channels(db: Session = Depends(get_db)):
 
 
 @router.post("/channels")
-async def create_channel(data: ChannelCreate, db: Session = Depends(get_db)):
+async def create_channel(data: ChannelCreate, db: AsyncSession = Depends(get_async_db)):
     ch = Channel(
         id=new_id(), type=data.type, name=data.name or data.type.capitalize(),
         config=json.dumps(data.config), status="pending",
@@ -55,8 +59,8 @@ async def create_channel(data: ChannelCreate, db: Session = Depends(get_db)):
     elif data.type == "webhook":
         ch.status = "connected"
     db.add(ch)
-    db.commit()
-    db.refresh(ch)
+    await db.commit()
+    http_cache.bump("channels")
     return {"id": ch.id, "type": ch.type, "name": ch.name, "status": ch.status, "error_msg": ch.error_msg}
 
 
@@ -68,6 +72,7 @@ def delete_channel(channel_id: str, db: Session = Depends(get_db)):
     db.query(BotChannel).filter(BotChannel.channel_id == channel_id).delete()
     db.delete(ch)
     db.commit()
+    http_cache.bump("channels")
     return {"ok": True}
 
 
@@ -84,8 +89,8 @@ async def find_telegram_chat(data: dict):
 
 
 @router.post("/channels/{channel_id}/test")
-async def test_channel(channel_id: str, db: Session = Depends(get_db)):
-    ch = db.query(Channel).get(channel_id)
+async def test_channel(channel_id: str, db: AsyncSession = Depends(get_async_db)):
+    ch = await db.get(Channel, channel_id)
     if not ch:
         raise HTTPException(404)
     cfg = json.loads(ch.config)
@@ -94,7 +99,8 @@ async def test_channel(channel_id: str, db: Session = Depends(get_db)):
         result = await test_telegram(cfg.get("bot_token"), cfg.get("chat_id"))
         ch.status = "connected" if result.get("ok") else "error"
         ch.error_msg = None if result.get("ok") else result.get("description", "Fehler")
-        db.commit()
+        await db.commit()
+        http_cache.bump("channels")
         return {"ok": result.get("ok"), "error": ch.error_msg}
     return {"ok": False, "error": "Nicht unterstützt"}
 
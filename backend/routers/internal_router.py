@@ -0,0 +1,43 @@
+"""Internal routes for standalone workers (worker.py / worker_relay.py)."""
+import hmac
+import os
+from typing import List, Optional
+
+from fastapi import APIRouter, Header, HTTPException
+from pydantic import BaseModel
+
+from bot_runner import broadcast
+import events
+import run_replay
+
+router = APIRouter(prefix="/api", tags=["internal"])
+
+RELAY_TOKEN = os.getenv("WORKER_RELAY_TOKEN", "")
+FINAL_STATUSES = {"completed", "failed", "timeout", "cancelled"}
+
+
+class RelayItem(BaseModel):
+    kind: str  # ws | event
+    bot_id: Optional[str] = None
+    message: Optional[dict] = None
+    event: Optional[dict] = None
+
+
+class RelayBatch(BaseModel):
+    items: List[RelayItem]
+
+
+@router.post("/internal/relay")
+async def relay(batch: RelayBatch, x_relay_token: str = Header("")):
+    """Re-publish a worker's live run messages and events here, where the clients are."""
+    if not RELAY_TOKEN or not hmac.compare_digest(x_relay_token, RELAY_TOKEN):
+        raise HTTPException(403, "Ungültiges Relay-Token")
+    for item in batch.items:
+        if item.kind == "ws" and item.bot_id and item.message:
+            broadcast(item.bot_id, item.message)
+            if item.message.get("type") == "status" and item.message.get("status") in FINAL_STATUSES:
+                run_replay.finish(item.message["run_id"])
+        elif item.kind == "event" and item.event and item.event.get("type"):
+            data = {k: v for k, v in item.event.items() if k not in ("id", "type", "ts")}
+            events.publish(item.event["type"], **data)
+    return {"ok": True}
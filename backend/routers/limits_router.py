@@ -0,0 +1,12 @@
+"""Provider limits — current concurrency, bucket levels and adaptive decisions."""
+from fastapi import APIRouter
+
+import limits
+
+router = APIRouter(prefix="/api", tags=["limits"])
+
+
+@router.get("/limits")
+async def limits_status():
+    """Live state of every limit a run has touched since startup (see limits.py)."""
+    return limits.snapshot()
@@ -0,0 +1,18 @@
+"""Maintenance routes — retention & compaction."""
+from fastapi import APIRouter
+
+import retention
+
+router = APIRouter(prefix="/api", tags=["maintenance"])
+
+
+@router.get("/retention")
+def retention_status():
+    """Last retention report (None until the first run since startup)."""
+    return {"last_report": retention.last_report}
+
+
+@router.post("/retention/run")
+async def retention_run():
+    """Run retention + compaction now and return the report."""
+    return await retention.run_retention()
@@ -1,11 +1,17 @@
 """Pipeline management routes."""
 import asyncio
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from pydantic import BaseModel
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, get_async_db
 from models import Bot, Pipeline, PipelineStep, PipelineRun, new_id
+from pagination import paginate, limit_param
+from query_budget import query_budget
+import http_cache
+from http_cache import etag_cached
 
 router = APIRouter(prefix="/api", tags=["pipelines"])
 
@@ -19,29 +25,40 @@ class PipelineCreate(BaseModel):
 
 
 @router.get("/pipelines")
+@etag_cached("pipelines")
+@query_budget(3)
 def list_pipelines(db: Session = Depends(get_db)):
     pipelines = db.query(Pipeline).order_by(Pipeline.created_at.desc()).all()
+    ids = [p.id for p in pipelines]
+
+    # All steps with their bot in one query, grouped per pipeline
+    steps_by_pipeline = {pid: [] for pid in ids}
+    step_rows = db.query(PipelineStep, Bot.name, Bot.emoji).outerjoin(
+        Bot, Bot.id == PipelineStep.bot_id
+    ).filter(PipelineStep.pipeline_id.in_(ids)).order_by(PipelineStep.step_order).all()
+    for s, bot_name, bot_emoji in step_rows:
+        steps_by_pipeline[s.pipeline_id].append({
+            "id": s.id, "bot_id": s.bot_id, "step_order": s.step_order,
+            "input_mode": s.input_mode,
+            "bot_name": bot_name or "?",
+            "bot_emoji": bot_emoji or "🤖",
+        })
+
+    # Latest run per pipeline in one query (max started_at per pipeline, via the index)
+    latest = db.query(
+        PipelineRun.pipeline_id, func.max(PipelineRun.started_at).label("started_at")
+    ).filter(PipelineRun.pipeline_id.in_(ids)).group_by(PipelineRun.pipeline_id).subquery()
+    last_runs = {r.pipeline_id: r for r in db.query(PipelineRun).join(
+        latest, (PipelineRun.pipeline_id == latest.c.pipeline_id) & (PipelineRun.started_at == latest.c.started_at)
+    )}
+
     result = []
     for p in pipelines:
-        steps = db.query(PipelineStep).filter(
-            PipelineStep.pipeline_id == p.id
-        ).order_by(PipelineStep.step_order).all()
-        step_data = []
-        for s in steps:
-            bot = db.query(Bot).get(s.bot_id)
-            step_data.append({
-                "id": s.id, "bot_id": s.bot_id, "step_order": s.step_order,
-                "input_mode": s.input_mode,
-                "bot_name": bot.name if bot else "?",
-                "bot_emoji": bot.emoji if bot else "🤖",
-            })
-        last_run = db.query(PipelineRun).filter(
-            PipelineRun.pipeline_id == p.id
-        ).order_by(PipelineRun.started_at.desc()).first()
+        last_run = last_runs.get(p.id)
         result.append({
             "id": p.id, "name": p.name, "description": p.description,
             "schedule": p.schedule, "enabled": p.enabled,
-            "error_policy": p.error_policy, "steps": step_data,
+            "error_policy": p.error_policy, "steps": steps_by_pipeline[p.id],
             "last_status": last_run.status if last_run else None,
             "last_run_at": last_run.started_at.isoformat() if last_run and last_run.started_at else None,
             "created_at": p.created_at.isoformat() if p.created_at else None,
@@ -63,6 +80,7 @@ def create_pipeline(data: PipelineCreate, db: Session = Depends(get_db)):
             step_order=i + 1, input_mode=step.get("input_mode", "forward"),
         ))
     db.commit()
+    http_cache.bump("pipelines")
     return {"id": p.id, "name": p.name}
 
 
@@ -75,12 +93,13 @@ def delete_pipeline(pipeline_id: str, db: Session = Depends(get_db)):
     db.query(PipelineRun).filter(PipelineRun.pipeline_id == pipeline_id).delete()
     db.delete(p)
     db.commit()
+    http_cache.bump("pipelines")
     return {"ok": True}
 
 
 @router.post("/pipelines/{pipeline_id}/run")
-async def run_pipeline_endpoint(pipeline_id: str, db: Session = Depends(get_db)):
-    p = db.query(Pipeline).get(pipeline_id)
+async def run_pipeline_endpoint(pipeline_id: str, db: AsyncSession = Depends(get_async_db)):
+    p = await db.get(Pipeline, pipeline_id)
     if not p:
         raise HTTPException(404)
     from pipeline_runner import run_pipeline
@@ -89,10 +108,10 @@ async def run_pipeline_endpoint(pipeline_id: str, db: Session = Depends(get_db))
 
 
 @router.get("/pipelines/{pipeline_id}/runs")
-def list_pipeline_runs(pipeline_id: str, db: Session = Depends(get_db)):
-    runs = db.query(PipelineRun).filter(
-        PipelineRun.pipeline_id == pipeline_id
-    ).order_by(PipelineRun.started_at.desc()).limit(20).all()
+def list_pipeline_runs(pipeline_id: str, response: Response, cursor: Optional[str] = None,
+                       limit: int = limit_param(20), db: Session = Depends(get_db)):
+    query = db.query(PipelineRun).filter(PipelineRun.pipeline_id == pipeline_id)
+    runs = paginate(query, response, PipelineRun.started_at, PipelineRun.id, cursor, limit)
     return [{
         "id": r.id, "status": r.status, "current_step": r.current_step,
         "started_at": r.started_at.isoformat() if r.started_at else None,
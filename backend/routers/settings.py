@@ -1,10 +1,15 @@
 """Settings & API key management routes."""
 import asyncio
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from database import get_db
 from models import Setting, utcnow
+import http_cache
+import limits
+import llm_clients
+import settings_cache
+from http_cache import etag_cached
 
 router = APIRouter(prefix="/api", tags=["settings"])
 
@@ -12,6 +17,7 @@ SENSITIVE_KEYS = {"openai_api_key", "anthropic_api_key", "google_api_key", "mist
 
 
 @router.get("/settings")
+@etag_cached("settings")
 def get_settings(db: Session = Depends(get_db)):
     settings = db.query(Setting).all()
     result = {}
@@ -30,6 +36,11 @@ class SettingsUpdate(BaseModel):
 
 @router.put("/settings")
 def update_settings(data: SettingsUpdate, db: Session = Depends(get_db)):
+    if data.settings.get(limits.SETTING_KEY):
+        try:
+            limits.parse_config(str(data.settings[limits.SETTING_KEY]))
+        except ValueError as e:
+            raise HTTPException(400, str(e))
     for key, value in data.settings.items():
         if value and "•" in str(value):
             continue
@@ -40,6 +51,9 @@ def update_settings(data: SettingsUpdate, db: Session = Depends(get_db)):
         else:
             db.add(Setting(key=key, value=str(value)))
     db.commit()
+    settings_cache.invalidate()
+    http_cache.bump("settings")
+    llm_clients.invalidate_settings(data.settings)
     return {"ok": True}
 
 
@@ -55,19 +69,17 @@ async def validate_key(data: ValidateKeyRequest):
 
     try:
         if provider == "openai":
-            import openai
-            client = openai.AsyncOpenAI(api_key=key)
-            models = await client.models.list()
+            async with llm_clients.throwaway("openai", key) as client:
+                models = await client.models.list()
             model_ids = sorted([m.id for m in models.data if any(m.id.startswith(p) for p in ("gpt", "o1", "o3", "o4"))])[:20]
             return {"valid": True, "models": model_ids}
 
         elif provider == "anthropic":
-            import anthropic
-            client = anthropic.AsyncAnthropic(api_key=key)
-            await client.messages.create(
-                model="claude-haiku-4-20250414", max_tokens=1,
-                messages=[{"role": "user", "content": "hi"}]
-            )
+            async with llm_clients.throwaway("anthropic", key) as client:
+                await client.messages.create(
+                    model="claude-haiku-4-20250414", max_tokens=1,
+                    messages=[{"role": "user", "content": "hi"}]
+                )
             return {"valid": True, "models": ["claude-haiku-4-20250414", "claude-sonnet-4-20250514", "claude-opus-4-20250514"]}
 
         elif provider == "google":
@@ -78,16 +90,14 @@ async def validate_key(data: ValidateKeyRequest):
             return {"valid": True, "models": model_ids[:20]}
 
         elif provider == "mistral":
-            from mistralai import Mistral
-            client = Mistral(api_key=key)
-            models = await asyncio.to_thread(client.models.list)
+            async with llm_clients.throwaway("mistral", key) as client:
+                models = await asyncio.to_thread(client.models.list)
             model_ids = [m.id for m in models.data] if models.data else ["mistral-small-latest", "mistral-large-latest"]
             return {"valid": True, "models": model_ids[:20]}
 
         elif provider == "ollama":
-            import openai
-            client = openai.AsyncOpenAI(base_url=f"{key}/v1", api_key="ollama")
-            models = await client.models.list()
+            async with llm_clients.throwaway("ollama", "ollama", f"{key}/v1") as client:
+                models = await client.models.list()
             model_ids = [m.id for m in models.data]
             return {"valid": True, "models": model_ids}
 
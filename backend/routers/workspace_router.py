@@ -0,0 +1,31 @@
+"""Workspace routes — whole-instance export / import."""
+import os
+
+from fastapi import APIRouter, HTTPException, UploadFile, File
+from fastapi.responses import StreamingResponse
+
+import workspace
+
+router = APIRouter(prefix="/api", tags=["workspace"])
+
+BOT_DATA = os.getenv("BOT_DATA_PATH", "/srv/openOrchestrator/bot-data")
+
+
+@router.get("/workspace/export")
+def export_workspace(include_runs: bool = False, gzip: bool = True):
+    """Bots, triggers, pipelines, steps, channels (+ runs/results) as NDJSON-in-tar."""
+    filename = "workspace.tar.gz" if gzip else "workspace.tar"
+    return StreamingResponse(
+        workspace.stream_archive(include_runs, gzip),
+        media_type="application/gzip" if gzip else "application/x-tar",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+
+@router.post("/workspace/import")
+def import_workspace(file: UploadFile = File(...)):
+    """Bulk-load a workspace archive in one transaction. Existing ids are kept."""
+    try:
+        return {"ok": True, "tables": workspace.import_archive(file.file, docs_root=BOT_DATA)}
+    except ValueError as e:
+        raise HTTPException(400, str(e))
@@ -0,0 +1,217 @@
+"""Durable side of the run queue — one run_jobs row per queued or running run.
+
+run_queue keeps the dispatch order in memory; this table is what survives a
+deploy or a crash. A job row is
+
+  * inserted (state "queued") when the run is submitted,
+  * leased when a worker starts the run: state "leased", its worker_id and
+    lease_expires_at = now + LEASE_S. The claim is a conditional UPDATE, so a
+    run is never started twice,
+  * renewed by heartbeat() every HEARTBEAT_S while the run executes,
+  * deleted once the run has finished (the Run row holds the outcome).
+
+Only the worker holding the lease writes the outcome (owns()) and drops the
+row (complete()), so a worker that lost its lease can't overwrite the run or
+remove the job of the worker that took it over.
+
+A lease that is not renewed means its worker is gone. recover() resolves such
+jobs deterministically, oldest first:
+
+  * the run already finished (crash between finish and cleanup) → drop the job,
+  * fewer than MAX_ATTEMPTS starts → back to "queued", run status too,
+  * otherwise → the run fails ("Abgebrochen: Worker ausgefallen").
+
+At startup, leases held by our own WORKER_ID are stale by definition and are
+recovered right away; those of other workers only once they expire, so every
+worker process needs its own WORKER_ID. Startup recovery also fails runs left
+"running" without a job row (from before this table existed) and gives
+"queued" runs without one their row back.
+
+Several processes share the table (API node, `python -m worker`s). A job row
+that disappears under a running run means it was cancelled or its bot deleted
+through another process; one that is no longer leased to this worker was
+recovered after its lease lapsed (slow or partitioned worker) and may already
+run elsewhere. heartbeat() reports both so the worker stops them.
+"""
+import os
+import socket
+from datetime import timedelta
+from typing import Iterable, List, Tuple
+
+from sqlalchemy import delete, exists, func, or_, select, update
+from sqlalchemy.dialects.sqlite import insert
+
+from models import Run, RunBody, RunJob, utcnow
+import db_writer
+import http_cache
+import rollups
+import search_index
+
+WORKER_ID = os.getenv("WORKER_ID") or socket.gethostname()
+LEASE_S = float(os.getenv("RUN_LEASE_S", "60"))
+HEARTBEAT_S = float(os.getenv("RUN_HEARTBEAT_S", "15"))
+MAX_ATTEMPTS = int(os.getenv("RUN_MAX_ATTEMPTS", "2"))
+
+
+async def enqueue(run_id: str, bot_id: str, priority: int):
+    """Persist the job of a submitted run (no-op if it has one, e.g. after recovery)."""
+    async def persist(db):
+        await db.execute(insert(RunJob).values(
+            run_id=run_id, bot_id=bot_id, priority=priority, state="queued", attempts=0, created_at=utcnow(),
+        ).on_conflict_do_nothing(index_elements=["run_id"]))
+
+    await db_writer.submit(persist)
+
+
+async def claim(run_id: str) -> bool:
+    """Lease a queued job for this worker. False if it is gone (cancelled) or leased elsewhere."""
+    now = utcnow()
+
+    async def lease(db):
+        result = await db.execute(
+            update(RunJob).where(
+                RunJob.run_id == run_id, RunJob.state == "queued",
+                exists().where(Run.id == run_id, Run.status == "queued"),
+            ).values(
+                state="leased", worker_id=WORKER_ID, attempts=RunJob.attempts + 1,
+                lease_expires_at=now + timedelta(seconds=LEASE_S), heartbeat_at=now,
+            )
+        )
+        return result.rowcount == 1
+
+    return await db_writer.submit(lease)
+
+
+async def complete(run_id: str):
+    """The run is over here — drop its job, unless it was recovered and belongs to another worker now."""
+    async def drop(db):
+        await db.execute(delete(RunJob).where(RunJob.run_id == run_id, RunJob.worker_id == WORKER_ID))
+
+    await db_writer.submit(drop)
+
+
+def _held_here():
+    return (RunJob.state == "leased") & (RunJob.worker_id == WORKER_ID)
+
+
+async def owns(db, run: Run) -> bool:
+    """Whether this worker may write the outcome of `run` (call from a db_writer job).
+
+    True while it holds the lease. Without a job row only if the run is still
+    unfinished — the row was dropped here (complete()) or never existed;
+    cancelling or finishing elsewhere sets finished_at.
+    """
+    job = await db.get(RunJob, run.id)
+    if job is None:
+        return run.finished_at is None
+    return job.state == "leased" and job.worker_id == WORKER_ID
+
+
+async def heartbeat(run_ids: List[str]) -> List[str]:
+    """Extend the leases of the runs this worker is executing. Returns those it no longer holds.
+
+    Lost means the job is gone (cancelled, bot deleted) or its lease lapsed and
+    was recovered — requeued, maybe already claimed by another worker. Either
+    way this worker must stop the run.
+    """
+    if not run_ids:
+        return []
+    now = utcnow()
+
+    async def renew(db):
+        await db.execute(
+            update(RunJob).where(_held_here(), RunJob.run_id.in_(run_ids))
+            .values(lease_expires_at=now + timedelta(seconds=LEASE_S), heartbeat_at=now)
+        )
+        held = set((await db.execute(
+            select(RunJob.run_id).filter(_held_here(), RunJob.run_id.in_(run_ids))
+        )).scalars())
+        return [run_id for run_id in run_ids if run_id not in held]
+
+    return await db_writer.submit(renew)
+
+
+async def queued(db, limit: int, exclude: List[str] = ()) -> List[Tuple[Run, str]]:
+    """Up to `limit` unleased jobs as (run, input), highest priority and oldest first."""
+    return (await db.execute(
+        select(Run, RunBody.input).join(RunJob, RunJob.run_id == Run.id)
+        .outerjoin(RunBody, RunBody.run_id == Run.id)
+        .filter(RunJob.state == "queued", Run.status == "queued", RunJob.run_id.notin_(exclude))
+        .order_by(RunJob.priority, RunJob.created_at, RunJob.run_id).limit(limit)
+    )).all()
+
+
+async def backlog(db) -> Tuple[List[str], int]:
+    """(ids of the unleased jobs in claim order, number of leased jobs) — the queue as workers see it."""
+    queued_ids = list((await db.execute(
+        select(RunJob.run_id).filter(RunJob.state == "queued")
+        .order_by(RunJob.priority, RunJob.created_at, RunJob.run_id)
+    )).scalars())
+    leased = (await db.execute(
+        select(func.count()).select_from(RunJob).filter(RunJob.state == "leased")
+    )).scalar_one()
+    return queued_ids, leased
+
+
+async def _fail(db, run: Run, message: str):
+    from bot_runner import _duration_ms
+    run.status = "failed"
+    run.error_message = message
+    run.finished_at = utcnow()
+    run.duration_ms = _duration_ms(run)
+    await rollups.record_run(db, run)
+    await search_index.index_run(db, run.id, body=message)
+
+
+async def recover(startup: bool = False, running: Iterable[str] = ()) -> int:
+    """Requeue or fail jobs with stale leases (see module docstring). Returns how many were requeued.
+
+    `running`: runs this process is executing right now. Their lease may have run
+    out while the db_writer was busy, but they are alive — never recovered.
+    """
+    now = utcnow()
+    running = set(running)
+
+    async def sweep(db):
+        stale = RunJob.lease_expires_at < now
+        if startup:
+            stale = or_(stale, RunJob.worker_id == WORKER_ID)
+        rows = (await db.execute(
+            select(RunJob, Run).outerjoin(Run, Run.id == RunJob.run_id)
+            .filter(RunJob.state == "leased", stale).order_by(RunJob.created_at, RunJob.run_id)
+        )).all()
+        requeued = failed = 0
+        for job, run in rows:
+            if job.run_id in running:
+                continue
+            if run is None or run.status not in ("queued", "running"):
+                await db.delete(job)
+            elif job.attempts < MAX_ATTEMPTS:
+                job.state, job.worker_id, job.lease_expires_at = "queued", None, None
+                run.status = "queued"
+                requeued += 1
+            else:
+                await db.delete(job)
+                await _fail(db, run, f"Abgebrochen: Worker ausgefallen ({job.attempts} Versuche)")
+                failed += 1
+
+        if startup:
+            from run_queue import priority_of
+            await db.flush()
+            has_job = exists().where(RunJob.run_id == Run.id)
+            for run in (await db.execute(
+                select(Run).filter(Run.status == "running", ~has_job).order_by(Run.started_at, Run.id)
+            )).scalars().all():
+                await _fail(db, run, "Abgebrochen durch Neustart")
+                failed += 1
+            for run in (await db.execute(select(Run).filter(Run.status == "queued", ~has_job))).scalars().all():
+                db.add(RunJob(run_id=run.id, bot_id=run.bot_id, priority=priority_of(run.trigger)))
+
+        if requeued or failed:
+            print(f"[run_jobs] recovered stale runs: {requeued} requeued, {failed} failed")
+        return requeued, failed
+
+    requeued, failed = await db_writer.submit(sweep)
+    if requeued or failed:
+        http_cache.bump("runs")
+    return requeued
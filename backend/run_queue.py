@@ -0,0 +1,368 @@
+"""Run queue — every bot run goes through here before it executes.
+
+Runs are created with status "queued" and submitted here instead of being
+started as tasks right away. The dispatcher starts a run as soon as a slot is
+free on every limit that applies to it (limits.py), picking
+
+  1. by priority class: manual > pipeline > trigger > schedule,
+  2. within a class, round-robin across bots (FIFO per bot),
+
+so an hourly schedule burst or a trigger storm can't starve the "Run" button,
+and one bot with many pending runs can't take every slot. A run blocked on one
+provider doesn't hold back runs for other providers.
+
+The order lives in memory; durability comes from run_jobs.py. Every submitted
+run gets a run_jobs row, which the worker leases when it starts the run and
+renews with a heartbeat while it executes. The lease loop here also sweeps
+expired leases, and restore() runs the startup recovery before re-submitting
+every run that is "queued" again — so a deploy or a crash neither drops queued
+work nor leaves runs stuck at "running".
+
+Execution can move out of the API process: with EMBEDDED_WORKER=0 the API node
+only persists jobs and watches their runs finish, and standalone workers
+(`python -m worker`, see worker.py) poll run_jobs every WORKER_POLL_S, queue
+what they find here and claim it through the same dispatcher. Any number of
+workers can share one database; the conditional claim keeps a run to one.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from database import AsyncSessionLocal
+from models import Bot, Run
+import events
+import http_cache
+import limits
+import run_jobs
+import settings_cache
+
+PRIORITIES = ("manual", "pipeline", "trigger", "schedule")
+EMBEDDED_WORKER = os.getenv("EMBEDDED_WORKER", "1") != "0"
+POLL_S = float(os.getenv("WORKER_POLL_S", "1"))
+POLL_BATCH = int(os.getenv("WORKER_POLL_BATCH", "100"))
+
+
+def priority_of(trigger: Optional[str]) -> int:
+    kind = (trigger or "manual").split(":", 1)[0]
+    return PRIORITIES.index(kind) if kind in PRIORITIES else 0
+
+
+class Job:
+    __slots__ = ("bot", "run", "input_context", "priority", "done")
+
+    def __init__(self, bot: Bot, run: Run, input_context: Optional[str]):
+        self.bot = bot
+        self.run = run
+        self.input_context = input_context
+        self.priority = priority_of(run.trigger)
+        self.done: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+# One OrderedDict per priority class: bot id -> that bot's pending jobs.
+# The order of the bots is the round-robin order.
+_classes: List["OrderedDict[str, Deque[Job]]"] = [OrderedDict() for _ in PRIORITIES]
+_jobs: Dict[str, Job] = {}  # run id -> queued job
+_remote: Dict[str, Job] = {}  # run id -> job a worker process executes (EMBEDDED_WORKER=0)
+# run id -> 1-based queue position. Rebuilt on the event loop after every change
+# to the queue (or, EMBEDDED_WORKER=0, every poll of run_jobs) and swapped in as
+# one assignment: the sync routes read it from the threadpool and must never
+# iterate _classes while the loop mutates it.
+_positions: Dict[str, int] = {}
+_remote_running = 0  # jobs leased by workers, as of the last poll
+_claimed = set()  # run ids whose job this process has leased
+_executes = True
+_wakeup: Optional[asyncio.Event] = None
+_dispatcher: Optional[asyncio.Task] = None
+_lease_keeper: Optional[asyncio.Task] = None
+_poller: Optional[asyncio.Task] = None
+_avg_run_s = 30.0  # moving average of run durations, for estimated waits
+
+
+def _wake():
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+def submit(bot: Bot, run: Run, input_context: Optional[str] = None) -> asyncio.Future:
+    """Queue a run (already inserted with status "queued"). The future resolves when it is over."""
+    from bot_runner import broadcast
+    known = _jobs.get(run.id) or _remote.get(run.id)
+    if known is not None:  # already re-queued by the lease loop
+        return known.done
+    job = Job(bot, run, input_context)
+    if _executes:
+        _enqueue_local(job)
+        _publish_positions()
+    else:
+        _remote[run.id] = job  # _poll_loop resolves job.done once a worker has finished it
+    asyncio.ensure_future(run_jobs.enqueue(run.id, bot.id, job.priority))
+    broadcast(bot.id, {"type": "status", "bot_id": bot.id, "run_id": run.id, "status": "queued"})
+    events.publish("run_queued", run_id=run.id, bot_id=bot.id, priority=PRIORITIES[job.priority])
+    _wake()
+    return job.done
+
+
+def _enqueue_local(job: Job):
+    _classes[job.priority].setdefault(job.bot.id, deque()).append(job)
+    _jobs[job.run.id] = job
+
+
+def _publish_positions():
+    global _positions
+    _positions = {job.run.id: pos for pos, job in enumerate(_order(), start=1)}
+
+
+async def run_and_wait(bot: Bot, run: Run, input_context: Optional[str] = None):
+    """Queue a run and wait until it has finished (pipelines run their steps in order)."""
+    await submit(bot, run, input_context)
+
+
+def cancel(run_id: str) -> bool:
+    """Take a queued run out of the queue. False if it isn't queued (anymore)."""
+    from bot_runner import broadcast
+    job = _jobs.pop(run_id, None)
+    if job is not None:
+        bots = _classes[job.priority]
+        pending = bots.get(job.bot.id)
+        if pending is not None:
+            pending.remove(job)
+            if not pending:
+                del bots[job.bot.id]
+        _publish_positions()
+    else:
+        job = _remote.pop(run_id, None)  # a worker drops it once the job row is gone
+        if job is None:
+            return False
+    broadcast(job.bot.id, {"type": "status", "bot_id": job.bot.id, "run_id": run_id, "status": "cancelled"})
+    events.publish("run_finished", run_id=run_id, bot_id=job.bot.id, status="cancelled")
+    if not job.done.done():
+        job.done.set_result(None)
+    return True
+
+
+def _order() -> Iterator[Job]:
+    """Queued jobs in the order the dispatcher would consider them."""
+    for bots in _classes:
+        pending = [list(jobs) for jobs in bots.values()]
+        for i in range(max((len(p) for p in pending), default=0)):
+            for jobs in pending:
+                if i < len(jobs):
+                    yield jobs[i]
+
+
+def size() -> int:
+    return len(_jobs) if _executes else len(_positions)
+
+
+def running() -> int:
+    """Runs executing right now — here, or (EMBEDDED_WORKER=0) on the workers."""
+    from bot_runner import active_tasks
+    return len(active_tasks) if _executes else _remote_running
+
+
+def position(run_id: str) -> Optional[Tuple[int, int]]:
+    """(1-based queue position, estimated wait in seconds) of a queued run. Safe from any thread.
+
+    With EMBEDDED_WORKER=0 the position is the run's place in run_jobs claim order
+    (priority, then age) as of the last poll; workers' round-robin isn't modelled.
+    """
+    pos = _positions.get(run_id)
+    if pos is None:
+        return None
+    rounds = math.ceil(pos / max(1, running()))
+    return pos, int(rounds * _avg_run_s)
+
+
+def annotate(runs):
+    """Set queue_position / estimated_wait_s on queued Run rows (RunSummaryOut fields)."""
+    for run in runs:
+        pos = position(run.id) if run.status == "queued" else None
+        run.queue_position, run.estimated_wait_s = pos if pos else (None, None)
+    return runs
+
+
+# ── Dispatcher ────────────────────────────────────────────
+
+def _dispatch(settings):
+    from bot_runner import lease_for
+    started = 0
+    for bots in _classes:
+        progress = True
+        while progress and bots:
+            progress = False
+            for bot_id in list(bots):
+                pending = bots[bot_id]
+                job = pending[0]
+                lease = lease_for(job.bot, settings)
+                if not lease.try_acquire():
+                    continue  # its provider/model/key is full — look at the next bot
+                pending.popleft()
+                if pending:
+                    bots.move_to_end(bot_id)
+                else:
+                    del bots[bot_id]
+                _jobs.pop(job.run.id, None)
+                _start(job, lease)
+                started += 1
+                progress = True
+    if started:
+        _publish_positions()
+
+
+async def _execute(job: Job, lease: limits.Lease):
+    from bot_runner import run_bot
+    if not await run_jobs.claim(job.run.id):
+        return  # cancelled meanwhile, or another worker claimed it first
+    _claimed.add(job.run.id)
+    try:
+        await run_bot(job.bot, job.run, AsyncSessionLocal, job.input_context, lease=lease)
+    finally:
+        _claimed.discard(job.run.id)  # before the job row goes, so the heartbeat won't cancel us
+        await run_jobs.complete(job.run.id)
+
+
+def _start(job: Job, lease: limits.Lease):
+    from bot_runner import active_tasks, _save_error
+    started = time.monotonic()
+    task = asyncio.create_task(_execute(job, lease))
+    active_tasks[job.run.id] = task
+
+    def finished(t: asyncio.Task):
+        global _avg_run_s
+        lease.release()  # no-op unless the task was cancelled before it got to run
+        active_tasks.pop(job.run.id, None)
+        if t.cancelled():
+            asyncio.ensure_future(_save_error(job.run.id, "cancelled", "Manuell abgebrochen", [], job.bot.model))
+        else:
+            _avg_run_s += 0.2 * (time.monotonic() - started - _avg_run_s)
+        if not job.done.done():
+            job.done.set_result(None)
+
+    task.add_done_callback(finished)
+
+
+async def _dispatch_loop():
+    while True:
+        await _wakeup.wait()
+        _wakeup.clear()
+        try:
+            _dispatch(await settings_cache.snapshot())
+        except Exception as e:
+            print(f"[run_queue] dispatch failed: {e}")
+
+
+async def _lease_loop():
+    """Heartbeat the runs executing here; requeue runs whose worker's lease expired."""
+    from bot_runner import active_tasks
+    while True:
+        await asyncio.sleep(run_jobs.HEARTBEAT_S)
+        try:
+            for run_id in await run_jobs.heartbeat(list(_claimed)):
+                task = active_tasks.get(run_id)
+                if run_id in _claimed and task is not None:
+                    print(f"[run_queue] lost the job of run {run_id} (removed or recovered elsewhere) — stopping it")
+                    task.cancel()
+            if await run_jobs.recover(running=_claimed) and _executes:
+                await _requeue()
+        except Exception as e:
+            print(f"[run_queue] lease upkeep failed: {e}")
+
+
+async def _check_remote():
+    """EMBEDDED_WORKER=0: resolve the runs workers have finished, refresh positions and counts."""
+    global _positions, _remote_running
+    async with AsyncSessionLocal() as db:
+        statuses = dict((await db.execute(
+            select(Run.id, Run.status).filter(Run.id.in_(list(_remote)))
+        )).all()) if _remote else {}
+        queued_ids, running = await run_jobs.backlog(db)
+    positions = {run_id: pos for pos, run_id in enumerate(queued_ids, start=1)}
+    changed = positions != _positions or running != _remote_running
+    _positions, _remote_running = positions, running
+    for run_id, job in list(_remote.items()):
+        if statuses.get(run_id) not in ("queued", "running"):
+            del _remote[run_id]
+            changed = True
+            if not job.done.done():
+                job.done.set_result(None)
+    if changed:  # workers' events only arrive with the relay configured
+        http_cache.bump("runs")
+
+
+async def _poll_loop():
+    """Shared-queue upkeep: workers pick up jobs queued by other processes, the API node watches its runs."""
+    while True:
+        await asyncio.sleep(POLL_S)
+        try:
+            if _executes:
+                await _requeue()
+            else:
+                await _check_remote()
+        except Exception as e:
+            print(f"[run_queue] poll failed: {e}")
+
+
+def start(execute: bool = EMBEDDED_WORKER, poll: bool = False):
+    """Start the queue. execute=False: only persist jobs (workers run them); poll: pick up others' jobs."""
+    global _wakeup, _dispatcher, _lease_keeper, _poller, _executes
+    _executes = execute
+    _wakeup = asyncio.Event()
+    if execute:
+        limits.add_listener(_wake)
+        _dispatcher = asyncio.create_task(_dispatch_loop())
+    _lease_keeper = asyncio.create_task(_lease_loop())
+    if poll or not execute:
+        _poller = asyncio.create_task(_poll_loop())
+    _wake()
+
+
+async def drain(timeout: float) -> int:
+    """Stop taking runs and wait up to `timeout` seconds for the running ones. Returns how many are left."""
+    from bot_runner import active_tasks
+    for task in (_dispatcher, _poller):
+        if task is not None:
+            task.cancel()
+    running = [t for t in active_tasks.values() if not t.done()]
+    if running:
+        await asyncio.wait(running, timeout=timeout)
+    return sum(not t.done() for t in running)
+
+
+async def stop():
+    for task in (_dispatcher, _lease_keeper, _poller):
+        if task is not None:
+            task.cancel()
+
+
+async def _requeue() -> int:
+    """Queue here every job waiting in run_jobs that isn't queued or executing here yet."""
+    from bot_runner import active_tasks
+    async with AsyncSessionLocal() as db:
+        rows = await run_jobs.queued(db, POLL_BATCH, exclude=[*_jobs, *active_tasks])
+        bots = {b.id: b for b in (await db.execute(
+            select(Bot).filter(Bot.id.in_({run.bot_id for run, _ in rows}))
+        )).scalars()} if rows else {}
+    queued = 0
+    for run, input_context in rows:
+        bot = bots.get(run.bot_id)
+        if bot is not None and run.id not in _jobs:  # announced when it was submitted
+            _enqueue_local(Job(bot, run, input_context))
+            queued += 1
+    if queued:
+        _publish_positions()
+    _wake()
+    return queued
+
+
+async def restore():
+    """Startup: recover what the last process left behind (run_jobs.recover), then re-queue it."""
+    await run_jobs.recover(startup=True)
+    if _executes:
+        restored = await _requeue()
+        if restored:
+            print(f"[run_queue] restored {restored} queued runs")
@@ -0,0 +1,86 @@
+"""Per-run replay buffers — late WebSocket subscribers see the whole live log.
+
+Every log/status message of an active run gets a process-wide sequence number
+("seq") and is appended to a bounded ring for that run (RUN_REPLAY_MAX
+messages). A socket that opens mid-run asks for everything after the last seq
+it saw (0 = all) and then continues with live frames — no Run.log read needed.
+
+Buffers are dropped RUN_REPLAY_GRACE_S after the run finishes (so a client
+connecting right at completion still gets the tail), or after RUN_REPLAY_TTL_S
+without activity for runs that never reported finishing.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Dict, List
+
+MAX_MESSAGES = int(os.getenv("RUN_REPLAY_MAX", "5000"))
+GRACE_S = float(os.getenv("RUN_REPLAY_GRACE_S", "15"))
+TTL_S = float(os.getenv("RUN_REPLAY_TTL_S", "3600"))
+SWEEP_INTERVAL_S = 60.0
+
+
+class RunBuffer:
+    __slots__ = ("bot_id", "run_id", "messages", "touched")
+
+    def __init__(self, bot_id: str, run_id: str):
+        self.bot_id = bot_id
+        self.run_id = run_id
+        self.messages: deque = deque(maxlen=MAX_MESSAGES)
+        self.touched = time.monotonic()
+
+
+_seq = 0
+_buffers: Dict[str, RunBuffer] = {}
+_last_sweep = time.monotonic()
+
+
+def record(bot_id: str, run_id: str, message: dict) -> dict:
+    """Stamp the message with the next seq and remember it for replay."""
+    global _seq
+    _seq += 1
+    message["seq"] = _seq
+    buf = _buffers.get(run_id)
+    if buf is None:
+        buf = _buffers[run_id] = RunBuffer(bot_id, run_id)
+    buf.messages.append(message)
+    buf.touched = time.monotonic()
+    _maybe_sweep(buf.touched)
+    return message
+
+
+def finish(run_id: str):
+    """The run is over — drop its buffer after the grace period."""
+    if run_id not in _buffers:
+        return
+    if GRACE_S <= 0:
+        _buffers.pop(run_id, None)
+        return
+    asyncio.get_running_loop().call_later(GRACE_S, _buffers.pop, run_id, None)
+
+
+def replay(bot_id: str, since: int = 0) -> List[dict]:
+    """Buffered messages of the bot's runs with seq > since, oldest first.
+
+    A seq from a previous process (larger than anything issued here) replays
+    everything that is buffered.
+    """
+    if since > _seq:
+        since = 0
+    messages = [
+        msg for buf in list(_buffers.values()) if buf.bot_id == bot_id
+        for msg in buf.messages if msg["seq"] > since
+    ]
+    messages.sort(key=lambda m: m["seq"])
+    return messages
+
+
+def _maybe_sweep(now: float):
+    global _last_sweep
+    if now - _last_sweep < SWEEP_INTERVAL_S:
+        return
+    _last_sweep = now
+    for run_id, buf in list(_buffers.items()):
+        if now - buf.touched > TTL_S:
+            del _buffers[run_id]
@@ -1,12 +1,13 @@
 """APScheduler integration — runs bots on cron schedules."""
-import asyncio
+import os
 import random
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 
-from database import SessionLocal
-from models import Bot, Run, new_id
-from bot_runner import run_bot, active_tasks
+from database import SessionLocal, AsyncSessionLocal
+from models import Bot, Run, new_id, utcnow
+import db_writer
+import run_queue
 
 scheduler = AsyncIOScheduler()
 _registered_jobs: dict = {}
@@ -40,30 +41,28 @@ def _parse_schedule(schedule: str):
 
 async def _scheduled_run(bot_id: str):
     """Execute a scheduled bot run."""
-    db = SessionLocal()
-    try:
-        bot = db.query(Bot).get(bot_id)
+    async with AsyncSessionLocal() as db:
+        bot = await db.get(Bot, bot_id)
         if not bot or not bot.enabled:
             return
 
-        run = Run(id=new_id(), bot_id=bot_id, trigger="schedule", status="running")
-        db.add(run)
-        db.commit()
-        db.refresh(run)
-
-        # Detach
-        bot_data = Bot(
-            id=bot.id, name=bot.name, emoji=bot.emoji, description=bot.description,
-            prompt=bot.prompt, model=bot.model, tools=bot.tools, schedule=bot.schedule,
-            docs_path=bot.docs_path, notify=bot.notify, enabled=bot.enabled,
-            max_runtime_seconds=bot.max_runtime_seconds,
-        )
-        run_data = Run(id=run.id, bot_id=run.bot_id, trigger=run.trigger, status=run.status, started_at=run.started_at)
+    run = Run(id=new_id(), bot_id=bot_id, trigger="schedule", status="queued", started_at=utcnow())
 
-        task = asyncio.create_task(run_bot(bot_data, run_data, lambda: SessionLocal()))
-        active_tasks[run.id] = task
-    finally:
-        db.close()
+    async def insert_run(wdb):
+        wdb.add(run)
+
+    await db_writer.submit(insert_run)
+
+    # Detach
+    bot_data = Bot(
+        id=bot.id, name=bot.name, emoji=bot.emoji, description=bot.description,
+        prompt=bot.prompt, model=bot.model, tools=bot.tools, schedule=bot.schedule,
+        docs_path=bot.docs_path, notify=bot.notify, enabled=bot.enabled,
+        max_runtime_seconds=bot.max_runtime_seconds,
+    )
+    run_data = Run(id=run.id, bot_id=run.bot_id, trigger=run.trigger, status=run.status, started_at=run.started_at)
+
+    run_queue.submit(bot_data, run_data)
 
 
 def register_bot(bot_id: str, schedule: str):
@@ -104,23 +103,41 @@ def unregister_bot(bot_id: str):
         pass
 
 
-def init_scheduler():
-    """Load all scheduled bots and start the scheduler."""
+def sync_bots():
+    """(Re)register every enabled scheduled bot and drop jobs of bots that no longer are."""
     db = SessionLocal()
     try:
-        bots = db.query(Bot).filter(
+        bots = db.query(Bot.id, Bot.schedule).filter(
             Bot.schedule.isnot(None),
             Bot.schedule != "",
             Bot.enabled == True,
         ).all()
-
-        for bot in bots:
-            register_bot(bot.id, bot.schedule)
-
-        print(f"[scheduler] Loaded {len(bots)} scheduled bots")
     finally:
         db.close()
 
+    wanted = {f"bot_{bot_id}": schedule for bot_id, schedule in bots}
+    for job_id in list(_registered_jobs):
+        if job_id not in wanted:
+            unregister_bot(job_id[len("bot_"):])
+    for bot_id, schedule in bots:
+        if _registered_jobs.get(f"bot_{bot_id}") != schedule:
+            register_bot(bot_id, schedule)
+    print(f"[scheduler] Loaded {len(bots)} scheduled bots")
+
+
+def init_scheduler():
+    """Load all scheduled bots and start the scheduler."""
+    sync_bots()
+
+    # Nightly retention + compaction (no-op unless a retention policy is configured)
+    from retention import run_retention
+    scheduler.add_job(
+        run_retention,
+        trigger=CronTrigger.from_crontab(os.getenv("RETENTION_SCHEDULE", "30 3 * * *")),
+        id="retention",
+        replace_existing=True,
+    )
+
     if not scheduler.running:
         scheduler.start()
         print("[scheduler] Started")
@@ -25,6 +25,8 @@ class BotUpdate(BaseModel):
     notify: Optional[List[str]] = None
     enabled: Optional[bool] = None
     max_runtime_seconds: Optional[int] = None
+    retention_keep_runs: Optional[int] = None
+    retention_keep_days: Optional[int] = None
 
 
 class BotOut(BaseModel):
@@ -39,6 +41,8 @@ class BotOut(BaseModel):
     notify: List[str]
     enabled: Optional[bool] = True
     max_runtime_seconds: Optional[int] = 120
+    retention_keep_runs: Optional[int] = None
+    retention_keep_days: Optional[int] = None
     created_at: Optional[datetime]
     updated_at: Optional[datetime]
 
@@ -66,14 +70,12 @@ class TriggerOut(BaseModel):
         from_attributes = True
 
 
-class RunOut(BaseModel):
+class RunSummaryOut(BaseModel):
+    """Run metadata only — what list endpoints return. Bodies come from /api/runs/{id}."""
     id: str
     bot_id: str
     trigger: Optional[str]
     status: str
-    input: Optional[str]
-    output: Optional[str]
-    log: Optional[str]
     error_message: Optional[str] = None
     started_at: Optional[datetime]
     finished_at: Optional[datetime]
@@ -81,11 +83,20 @@ class RunOut(BaseModel):
     tokens_in: Optional[int] = None
     tokens_out: Optional[int] = None
     cost_estimate: Optional[float] = None
+    # Only set while status == "queued" (see run_queue.annotate)
+    queue_position: Optional[int] = None
+    estimated_wait_s: Optional[int] = None
 
     class Config:
         from_attributes = True
 
 
+class RunOut(RunSummaryOut):
+    input: Optional[str]
+    output: Optional[str]
+    log: Optional[str]
+
+
 class ResultOut(BaseModel):
     id: str
     bot_id: str
@@ -0,0 +1,190 @@
+"""Full-text search index — SQLite FTS5 over run outputs, result titles and (optionally) logs.
+
+One index row per finished run. search_docs maps the run id to a stable integer
+rowid (runs has no INTEGER PRIMARY KEY, so its own rowids may change on VACUUM);
+filters (bot/status/date) are a join back to runs. bot_runner writes the row in
+the same write job that finishes the run; a trigger on runs drops it again when
+the run is deleted (retention, bot deletion). Logs are only indexed when the
+setting search_index_logs is "true".
+
+Rebuild from history (e.g. after restoring a backup or toggling log indexing):
+
+    python -m search_index rebuild [--batch-size 2000]
+"""
+import re
+import sys
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import DateTime, text
+
+from database import unpack_text
+from models import naive_utc
+import settings_cache
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS search_docs (
+        id INTEGER PRIMARY KEY,
+        run_id TEXT NOT NULL UNIQUE
+    )""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+        title, body, log,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS runs_search_delete AFTER DELETE ON runs BEGIN
+        DELETE FROM search_index WHERE rowid = (SELECT id FROM search_docs WHERE run_id = old.id);
+        DELETE FROM search_docs WHERE run_id = old.id;
+    END""",
+]
+
+# Column weights for bm25(): title, body, log
+_WEIGHTS = "5.0, 1.0, 0.3"
+
+
+def _flag(value) -> bool:
+    return str(value or "").lower() in ("1", "true", "yes", "on")
+
+
+async def index_run(db, run_id: str, title: Optional[str] = None, body: Optional[str] = None, log: Optional[str] = None):
+    """(Re)index one run. Call from a db_writer job."""
+    with_logs = (await settings_cache.snapshot(db)).get_bool("search_index_logs")
+    params = {"run_id": run_id, "title": title, "body": body, "log": log if with_logs else None}
+    await db.execute(text("INSERT OR IGNORE INTO search_docs (run_id) VALUES (:run_id)"), params)
+    doc_id = (await db.execute(text("SELECT id FROM search_docs WHERE run_id = :run_id"), params)).scalar_one()
+    await db.execute(text("DELETE FROM search_index WHERE rowid = :doc_id"), {"doc_id": doc_id})
+    await db.execute(
+        text("INSERT INTO search_index (rowid, title, body, log) VALUES (:doc_id, :title, :body, :log)"),
+        {**params, "doc_id": doc_id},
+    )
+
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def match_query(q: str) -> Optional[str]:
+    """Turn free user input into a safe FTS5 MATCH expression.
+
+    Every word must occur; the last one is a prefix so results update while typing.
+    """
+    words = _TOKEN.findall(q or "")
+    if not words:
+        return None
+    terms = [f'"{w}"' for w in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+_SEARCH_SQL = """
+SELECT d.id AS doc_id, r.id, r.bot_id, r.status, r.started_at, r.finished_at,
+       b.name AS bot_name, b.emoji AS bot_emoji,
+       search_index.title AS title,
+       snippet(search_index, -1, '', '', '…', 32) AS preview,
+       bm25(search_index, {weights}) AS score
+FROM search_index
+JOIN search_docs d ON d.id = search_index.rowid
+JOIN runs r ON r.id = d.run_id
+LEFT JOIN bots b ON b.id = r.bot_id
+WHERE search_index MATCH :match {filters}
+ORDER BY score, d.id
+LIMIT :limit
+"""
+
+
+def search(db, q: str, bot_id: Optional[str] = None, status: Optional[str] = None,
+           since: Optional[datetime] = None, until: Optional[datetime] = None,
+           after: Optional[tuple] = None, limit: int = 20) -> list:
+    """Ranked (bm25) hits with snippets. db is a sync Session.
+
+    `after` is the (score, doc_id) of the last hit of the previous page.
+    """
+    match = match_query(q)
+    if not match:
+        return []
+    filters, params = [], {"match": match, "limit": limit}
+    if bot_id:
+        filters.append("r.bot_id = :bot_id")
+        params["bot_id"] = bot_id
+    if status:
+        filters.append("r.status = :status")
+        params["status"] = status
+    if since:
+        filters.append("r.started_at >= :since")
+        params["since"] = naive_utc(since)
+    if until:
+        filters.append("r.started_at < :until")
+        params["until"] = naive_utc(until)
+    if after:
+        score = f"bm25(search_index, {_WEIGHTS})"
+        filters.append(f"({score} > :after_score OR ({score} = :after_score AND d.id > :after_id))")
+        params["after_score"], params["after_id"] = after
+    sql = _SEARCH_SQL.format(weights=_WEIGHTS, filters="".join(f" AND {f}" for f in filters))
+    stmt = text(sql).columns(started_at=DateTime, finished_at=DateTime)
+    return db.execute(stmt, params).mappings().all()
+
+
+def rebuild(cursor, batch_size: int = 2000, on_batch=None) -> int:
+    """Re-create the index from runs/run_bodies/results in rowid batches. Returns runs indexed.
+
+    Works on any DB-API cursor (sqlite3 in migrations, engine.raw_connection() in the CLI).
+    """
+    for statement in SCHEMA:
+        cursor.execute(statement)
+    cursor.execute("DELETE FROM search_index")
+    cursor.execute("DELETE FROM search_docs")
+    indexed = index_runs(cursor, 0, batch_size, on_batch)
+    cursor.execute("INSERT INTO search_index (search_index) VALUES ('optimize')")
+    return indexed
+
+
+def index_runs(cursor, after_rowid: int, batch_size: int = 2000, on_batch=None) -> int:
+    """Index the finished runs with a rowid above `after_rowid` (just inserted, not indexed yet).
+
+    Used by rebuild() and by the workspace import, which only adds rows.
+    """
+    row = cursor.execute("SELECT value FROM settings WHERE key = 'search_index_logs'").fetchone()
+    with_logs = _flag(row[0] if row else None)
+    last_rowid, indexed = after_rowid, 0
+    while True:
+        rows = cursor.execute(
+            """SELECT r.rowid, r.id, (SELECT title FROM results WHERE run_id = r.id LIMIT 1),
+                      rb.output, r.error_message, rb.log
+               FROM runs r LEFT JOIN run_bodies rb ON rb.run_id = r.id
+               WHERE r.rowid > ? AND r.finished_at IS NOT NULL
+               ORDER BY r.rowid LIMIT ?""",
+            (last_rowid, batch_size),
+        ).fetchall()
+        if not rows:
+            break
+        last_rowid = rows[-1][0]
+        for _, run_id, title, output, error, log in rows:
+            cursor.execute("INSERT INTO search_docs (run_id) VALUES (?)", (run_id,))
+            cursor.execute(
+                "INSERT INTO search_index (rowid, title, body, log) VALUES (last_insert_rowid(), ?, ?, ?)",
+                (title, unpack_text(output) or error, unpack_text(log) if with_logs else None),
+            )
+        indexed += len(rows)
+        if on_batch:
+            on_batch()
+    return indexed
+
+
+def _main(argv):
+    import argparse
+    from database import engine
+
+    parser = argparse.ArgumentParser(prog="python -m search_index")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--batch-size", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    conn = engine.raw_connection()
+    try:
+        indexed = rebuild(conn.cursor(), args.batch_size, on_batch=conn.commit)
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"[search_index] indexed {indexed} runs")
+
+
+if __name__ == "__main__":
+    _main(sys.argv[1:])
@@ -0,0 +1,114 @@
+"""In-process settings cache.
+
+The settings table is tiny and changes only through PUT /api/settings, so it
+is loaded once into a SettingsSnapshot and served from memory until
+invalidate() drops it — routers/settings.update_settings calls that right
+after committing, so the next reader reloads.
+
+Every invalidate() bumps generation(); components that derive state from
+settings (clients, contexts, limiters) can compare generations instead of
+re-reading. A load that raced an invalidate is used once but not cached.
+
+Other processes (standalone workers, worker.py) never see that invalidate();
+they set SETTINGS_MAX_AGE_S and re-read the table when the snapshot is older —
+the generation only moves if something actually changed.
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import select
+
+from database import AsyncSessionLocal, SessionLocal
+from models import Setting
+
+_lock = threading.Lock()
+_generation = 0
+_snapshot: Optional["SettingsSnapshot"] = None
+_stored_at = 0.0
+MAX_AGE_S = float(os.getenv("SETTINGS_MAX_AGE_S", "0"))  # 0: cached until invalidate()
+
+
+class SettingsSnapshot:
+    """Immutable view of all settings at one generation, with typed getters."""
+
+    __slots__ = ("values", "generation")
+
+    def __init__(self, values: Dict[str, str], generation: int):
+        self.values = values
+        self.generation = generation
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        value = self.values.get(key)
+        return value if value else default
+
+    def get_int(self, key: str, default: Optional[int] = None) -> Optional[int]:
+        try:
+            return int(self.values[key])
+        except (KeyError, TypeError, ValueError):
+            return default
+
+    def get_bool(self, key: str, default: bool = False) -> bool:
+        value = self.values.get(key)
+        if not value:
+            return default
+        return value.lower() in ("1", "true", "yes", "on")
+
+
+def generation() -> int:
+    return _generation
+
+
+def invalidate():
+    """Drop the cached snapshot. Call after committing a settings change."""
+    global _generation, _snapshot
+    with _lock:
+        _generation += 1
+        _snapshot = None
+
+
+def _fresh(cached: Optional[SettingsSnapshot]) -> bool:
+    return cached is not None and (MAX_AGE_S <= 0 or time.monotonic() - _stored_at < MAX_AGE_S)
+
+
+def _store(values: Dict[str, str], loaded_at: int) -> SettingsSnapshot:
+    global _snapshot, _generation, _stored_at
+    with _lock:
+        if _snapshot is not None and _generation == loaded_at:  # re-read after MAX_AGE_S
+            if _snapshot.values == values:
+                _stored_at = time.monotonic()
+                return _snapshot
+            _generation += 1
+            loaded_at = _generation
+        snapshot = SettingsSnapshot(values, loaded_at)
+        if _generation == loaded_at:
+            _snapshot = snapshot
+            _stored_at = time.monotonic()
+    return snapshot
+
+
+async def snapshot(db=None) -> SettingsSnapshot:
+    """Current settings; loads them with `db` (an AsyncSession) or a fresh session on a miss."""
+    cached, loaded_at = _snapshot, _generation
+    if _fresh(cached):
+        return cached
+    if db is None:
+        async with AsyncSessionLocal() as session:
+            rows = (await session.execute(select(Setting.key, Setting.value))).all()
+    else:
+        rows = (await db.execute(select(Setting.key, Setting.value))).all()
+    return _store({key: value for key, value in rows}, loaded_at)
+
+
+def snapshot_sync(db=None) -> SettingsSnapshot:
+    """Same as snapshot() for sync code (threadpool routes); `db` is a sync Session."""
+    cached, loaded_at = _snapshot, _generation
+    if _fresh(cached):
+        return cached
+    if db is None:
+        with SessionLocal() as session:
+            rows = session.execute(select(Setting.key, Setting.value)).all()
+    else:
+        rows = db.execute(select(Setting.key, Setting.value)).all()
+    return _store({key: value for key, value in rows}, loaded_at)
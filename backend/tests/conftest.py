@@ -0,0 +1,24 @@
+"""Test setup — one throwaway SQLite database and bot-data folder per session.
+
+Modules read DATABASE_URL / BOT_DATA_PATH at import time, so they are set here,
+before anything from the backend is imported.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+_tmp = tempfile.mkdtemp(prefix="openorchestrator-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/test.db"
+os.environ["BOT_DATA_PATH"] = f"{_tmp}/bot-data"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def client():
+    """TestClient with the app's lifespan (db_writer, run queue, scheduler) running."""
+    from fastapi.testclient import TestClient
+    import main
+    with TestClient(main.app) as c:
+        yield c
@@ -0,0 +1,49 @@
+from datetime import timedelta
+
+import bot_context
+from database import AsyncSessionLocal, SessionLocal
+from models import Bot, Run, RunBody, new_id, utcnow
+
+
+def _completed_run(bot_id: str, output: str, finished_at) -> str:
+    run_id = new_id()
+    with SessionLocal() as db:
+        db.add(Run(id=run_id, bot_id=bot_id, status="completed", started_at=finished_at, finished_at=finished_at))
+        db.add(RunBody(run_id=run_id, output=output))
+        db.commit()
+    return run_id
+
+
+def _build(client, bot: Bot) -> str:
+    async def build():
+        async with AsyncSessionLocal() as db:
+            return await bot_context.build(bot, db)
+    return client.portal.call(build)  # on the app's event loop
+
+
+def test_completion_after_cache_miss(client):
+    """The miss loads a naive finished_at from SQLite; the next completion passes an aware one."""
+    bot = Bot(**{k: v for k, v in client.post("/api/bots", json={"name": "ctx", "prompt": "p"}).json().items()
+                 if k in ("id", "name", "description", "docs_path")})
+    _completed_run(bot.id, "altes Ergebnis", utcnow() - timedelta(hours=1))
+    bot_context.clear()
+
+    assert "altes Ergebnis" in _build(client, bot)  # cache miss → DB
+
+    finished_at = utcnow()
+    bot_context.record_output(bot.id, _completed_run(bot.id, "neues Ergebnis", finished_at), finished_at, "neues Ergebnis")
+    context = _build(client, bot)
+    assert "neues Ergebnis" in context and "altes Ergebnis" not in context
+
+    finished_at = utcnow() - timedelta(days=1)
+    bot_context.record_output(bot.id, _completed_run(bot.id, "verspätet", finished_at), finished_at, "verspätet")
+    assert "neues Ergebnis" in _build(client, bot)  # an older completion doesn't replace a newer one
+
+
+def test_output_completed_by_another_process_is_picked_up(client):
+    """A worker process completed the bot's latest run — this process never saw record_output for it."""
+    bot = Bot(**{k: v for k, v in client.post("/api/bots", json={"name": "ctx2", "prompt": "p"}).json().items()
+                 if k in ("id", "name", "description", "docs_path")})
+    bot_context.record_output(bot.id, new_id(), utcnow() - timedelta(minutes=5), "hier gelaufen")
+    _completed_run(bot.id, "auf einem Worker gelaufen", utcnow())  # no record_output in this process
+    assert "auf einem Worker gelaufen" in _build(client, bot)
@@ -0,0 +1,20 @@
+import events
+import query_budget
+
+
+def test_unchanged_poll_runs_no_queries_and_run_events_change_the_version(client, monkeypatch):
+    counts = []
+    check = query_budget._check
+
+    def record(name, budget, counter):
+        counts.append(counter.count)
+        check(name, budget, counter)
+
+    monkeypatch.setattr(query_budget, "_check", record)
+    version = client.get("/api/dashboard").json()["version"]
+    assert client.get("/api/dashboard", params={"version": version}).json() == {"version": version, "unchanged": True}
+    assert counts[-1] == 0
+
+    client.portal.call(lambda: events.publish("run_finished", run_id="x", bot_id="y", status="completed"))
+    polled = client.get("/api/dashboard", params={"version": version}).json()
+    assert polled["unchanged"] is False and polled["version"] != version
@@ -0,0 +1,34 @@
+import json
+from datetime import datetime
+
+from database import SessionLocal
+from models import Run, new_id
+
+
+def _bot_with_runs(client, *started):
+    bot_id = client.post("/api/bots", json={"name": "export", "prompt": "p"}).json()["id"]
+    with SessionLocal() as db:
+        for ts in started:
+            db.add(Run(id=new_id(), bot_id=bot_id, status="completed", started_at=ts, finished_at=ts,
+                       duration_ms=1500, tokens_in=3, tokens_out=4, cost_estimate=0.5))
+        db.commit()
+    return bot_id
+
+
+def test_since_with_an_offset_is_converted_to_utc(client):
+    bot_id = _bot_with_runs(client, datetime(2024, 1, 1, 7, 30), datetime(2024, 1, 1, 9, 0))
+    resp = client.get(f"/api/bots/{bot_id}/export/runs",
+                      params={"since": "2024-01-01T10:00:00+02:00", "until": "2024-01-01T12:00:00+02:00"})
+    rows = [json.loads(line) for line in resp.text.splitlines()]
+    assert [row["started_at"] for row in rows] == ["2024-01-01T09:00:00"]  # 08:00–10:00 UTC
+
+
+def test_export_csv_keeps_its_legacy_layout_unless_fields_are_given(client):
+    bot_id = _bot_with_runs(client, datetime(2024, 3, 1, 8, 0), datetime(2024, 3, 2, 8, 0))
+    lines = client.get(f"/api/bots/{bot_id}/export-csv").text.splitlines()
+    assert lines == ["Zeitpunkt;Status;Dauer (s);Tokens;Kosten ($);Output",
+                     "02.03.2024 08:00;completed;1.5;7;0.5000;",
+                     "01.03.2024 08:00;completed;1.5;7;0.5000;"]
+
+    lines = client.get(f"/api/bots/{bot_id}/export-csv", params={"fields": "status,tokens_in"}).text.splitlines()
+    assert lines[0] == "status;tokens_in" and lines[1] == "completed;3"
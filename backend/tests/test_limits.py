@@ -0,0 +1,45 @@
+import asyncio
+from types import SimpleNamespace
+
+import limits
+from bot_runner import _openai_stream
+
+
+class _Adaptive:
+    def __init__(self):
+        self.latencies = []
+
+    def record_success(self, latency):
+        self.latencies.append(latency)
+
+
+def _chunk(content=None, tool_calls=None, finish_reason=None):
+    delta = SimpleNamespace(content=content, tool_calls=tool_calls)
+    return SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=delta, finish_reason=finish_reason)])
+
+
+class _ToolCallOnlyClient:
+    """Streams one tool-call fragment right away, then takes a while to finish — no text at all."""
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        async def chunks():
+            fn = SimpleNamespace(name="search", arguments="{}")
+            yield _chunk(tool_calls=[SimpleNamespace(index=0, id="call_1", function=fn)])
+            await asyncio.sleep(0.3)
+            yield _chunk(finish_reason="tool_calls")
+        return chunks()
+
+
+def test_latency_of_a_tool_call_round_ends_at_its_first_chunk():
+    lease = limits.Lease([], [], [])
+    lease.adaptive = _Adaptive()
+    client = _ToolCallOnlyClient()
+
+    text, tool_calls, finish_reason, _, _ = asyncio.run(
+        lease.request(lambda: _openai_stream(client, {}, lambda text: None, lease.first_token)))
+
+    assert (text, finish_reason, tool_calls[0]["function"]["name"]) == ("", "tool_calls", "search")
+    assert lease.adaptive.latencies[0] < 0.2
@@ -0,0 +1,67 @@
+"""The pinned statement budgets hold no matter how much data there is (no N+1)."""
+import pytest
+
+import http_cache
+import query_budget
+import search_index
+from database import SessionLocal, engine
+from models import Bot, Pipeline, PipelineRun, PipelineStep, Result, Run, RunBody, new_id, utcnow
+
+ENDPOINTS = [
+    ("/api/pipelines", {}),
+    ("/api/activity", {}),
+    ("/api/search", {"q": "budgetwort"}),
+    ("/api/dashboard", {}),
+]
+
+
+def _seed(n: int):
+    """n more bots with a run (body, result) each, and n pipelines of two steps with a pipeline run."""
+    conn = engine.raw_connection()
+    try:
+        rowid_before = conn.cursor().execute("SELECT COALESCE(MAX(rowid), 0) FROM runs").fetchone()[0]
+    finally:
+        conn.close()
+    with SessionLocal() as db:
+        bot_ids = []
+        for i in range(n):
+            bot = Bot(id=new_id(), name=f"budget-{i}", prompt="p")
+            run = Run(id=new_id(), bot_id=bot.id, status="completed", model="gpt-test",
+                      started_at=utcnow(), finished_at=utcnow(), duration_ms=10)
+            db.add_all([bot, run, RunBody(run_id=run.id, output=f"budgetwort {i}"),
+                        Result(bot_id=bot.id, run_id=run.id, title=f"Ergebnis {i}")])
+            bot_ids.append(bot.id)
+        db.flush()
+        for i in range(n):
+            pipeline = Pipeline(id=new_id(), name=f"budget-pipeline-{i}")
+            db.add(pipeline)
+            db.flush()
+            db.add_all([PipelineStep(pipeline_id=pipeline.id, bot_id=bot_ids[(i + k) % n], step_order=k)
+                        for k in range(2)])
+            db.add(PipelineRun(pipeline_id=pipeline.id, status="completed"))
+        db.commit()
+    conn = engine.raw_connection()
+    try:
+        search_index.index_runs(conn.cursor(), rowid_before)
+        conn.commit()
+    finally:
+        conn.close()
+    http_cache.bump_all()
+
+
+@pytest.mark.parametrize("path,params", ENDPOINTS)
+def test_statement_count_does_not_grow_with_data(client, monkeypatch, path, params):
+    counts = []
+    check = query_budget._check
+
+    def record(name, budget, counter):
+        counts.append((counter.count, budget))
+        check(name, budget, counter)
+
+    monkeypatch.setattr(query_budget, "_check", record)
+    monkeypatch.setattr(query_budget, "STRICT", True)
+    for n in (2, 20):
+        _seed(n)
+        assert client.get(path, params=params).status_code == 200
+    (small, budget), (large, _) = counts
+    assert small == large <= budget
@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from database import SessionLocal
+from models import Bot, Run, new_id, utcnow
+
+
+def test_run_retention_prunes_beyond_keep_runs(client):
+    bot_id = client.post("/api/bots", json={"name": "ret", "prompt": "p"}).json()["id"]
+    now = utcnow()
+    with SessionLocal() as db:
+        db.get(Bot, bot_id).retention_keep_runs = 1
+        for i in range(3):
+            db.add(Run(id=new_id(), bot_id=bot_id, status="completed",
+                       started_at=now - timedelta(hours=i + 1), finished_at=now - timedelta(hours=i + 1)))
+        db.commit()
+
+    resp = client.post("/api/retention/run")
+    assert resp.status_code == 200
+    assert resp.json()["runs_deleted"] == 2
+    with SessionLocal() as db:
+        assert db.query(Run).filter(Run.bot_id == bot_id).count() == 1
+    assert client.get("/api/retention").json()["last_report"]["runs_deleted"] == 2
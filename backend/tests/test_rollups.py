@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+
+import rollups
+from database import SessionLocal, engine
+from models import Run, UsageRollup, new_id, utcnow
+
+
+def _rollup(db, bot_id: str, period: str, bucket: datetime) -> UsageRollup:
+    return db.get(UsageRollup, (bot_id, "gpt-test", period, bucket))
+
+
+def _finished_run(db, bot_id: str, finished_at: datetime):
+    db.add(Run(id=new_id(), bot_id=bot_id, status="completed", model="gpt-test",
+               started_at=finished_at, finished_at=finished_at, duration_ms=1000, tokens_in=10))
+
+
+def test_rebuild_keeps_buckets_of_pruned_runs(client):
+    bot_id = client.post("/api/bots", json={"name": "rollups", "prompt": "p"}).json()["id"]
+    today = utcnow().replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
+    pruned_day, edge_day = today - timedelta(days=30), today - timedelta(days=10)
+    with SessionLocal() as db:
+        # Rollups as recorded live: 3 runs 30 days ago and 2 on the edge day; retention
+        # has since deleted all of them but one run of the edge day.
+        db.add(UsageRollup(bot_id=bot_id, model="gpt-test", period="day", bucket=pruned_day,
+                           runs=3, completed=3, tokens_in=30))
+        db.add(UsageRollup(bot_id=bot_id, model="gpt-test", period="day", bucket=edge_day,
+                           runs=2, completed=2, tokens_in=20))
+        _finished_run(db, bot_id, edge_day + timedelta(hours=9))
+        _finished_run(db, bot_id, today - timedelta(days=1, hours=-9))
+        db.commit()
+
+    conn = engine.raw_connection()
+    try:
+        rollups.backfill(conn.cursor())
+        rollups.backfill(conn.cursor())  # idempotent
+        conn.commit()
+    finally:
+        conn.close()
+
+    with SessionLocal() as db:
+        assert _rollup(db, bot_id, "day", pruned_day).runs == 3
+        assert _rollup(db, bot_id, "day", edge_day).runs == 2  # partly pruned: not shrunk to 1
+        assert _rollup(db, bot_id, "day", today - timedelta(days=1)).runs == 1
+        assert _rollup(db, bot_id, "hour", edge_day + timedelta(hours=9)).runs == 1  # missing → rebuilt
@@ -0,0 +1,100 @@
+from datetime import timedelta
+
+import run_jobs
+from database import AsyncSessionLocal, SessionLocal
+from models import Run, RunJob, new_id, utcnow
+
+
+def _run_with_job(client, run_status: str, **job) -> str:
+    bot_id = client.post("/api/bots", json={"name": "jobs", "prompt": "p"}).json()["id"]
+    run_id = new_id()
+    with SessionLocal() as db:
+        db.add(Run(id=run_id, bot_id=bot_id, status=run_status, started_at=utcnow()))
+        db.add(RunJob(run_id=run_id, bot_id=bot_id, **job))
+        db.commit()
+    return run_id
+
+
+def _queued_ids(client) -> set:
+    async def queued():
+        async with AsyncSessionLocal() as db:
+            return {run.id for run, _ in await run_jobs.queued(db, 1000)}
+    return client.portal.call(queued)
+
+
+def test_finished_run_is_never_claimed_again(client):
+    run_id = _run_with_job(client, "completed", state="queued")  # a job row left behind
+    assert run_id not in _queued_ids(client)
+    assert client.portal.call(run_jobs.claim, run_id) is False
+
+
+def test_lease_of_a_run_still_executing_here_is_not_recovered(client):
+    expired = utcnow() - timedelta(minutes=5)
+    run_id = _run_with_job(client, "running", state="leased", worker_id=run_jobs.WORKER_ID,
+                           attempts=1, lease_expires_at=expired)
+
+    client.portal.call(lambda: run_jobs.recover(running={run_id}))
+    with SessionLocal() as db:
+        assert db.get(Run, run_id).status == "running"
+        assert db.get(RunJob, run_id).state == "leased"
+
+    client.portal.call(run_jobs.complete, run_id)
+    with SessionLocal() as db:
+        assert db.get(RunJob, run_id) is None
+
+
+def test_worker_that_lost_its_lease_writes_nothing(client):
+    """Recovered and claimed by worker-b: this worker's late outcome and cleanup are dropped."""
+    from bot_runner import _save_error
+    run_id = _run_with_job(client, "running", state="leased", worker_id="worker-b", attempts=2,
+                           lease_expires_at=utcnow() + timedelta(minutes=5))
+
+    assert client.portal.call(lambda: _save_error(run_id, "failed", "zu spät", ["log von A"])) is False
+    client.portal.call(run_jobs.complete, run_id)
+    with SessionLocal() as db:
+        run = db.get(Run, run_id)
+        assert (run.status, run.finished_at, run.error_message) == ("running", None, None)
+        assert db.get(RunJob, run_id).worker_id == "worker-b"
+
+
+def test_remote_positions_and_running_come_from_run_jobs(client, monkeypatch):
+    """EMBEDDED_WORKER=0: the API node executes nothing itself, workers hold the leases."""
+    import run_queue
+    monkeypatch.setattr(run_queue, "_executes", False)
+    monkeypatch.setattr(run_queue, "_positions", {})
+    now = utcnow()
+    leased = _run_with_job(client, "running", state="leased", worker_id="worker-x", attempts=1,
+                           lease_expires_at=now + timedelta(minutes=5))
+    later = _run_with_job(client, "queued", state="queued", priority=3, created_at=now)
+    first = _run_with_job(client, "queued", state="queued", priority=0, created_at=now)
+    client.portal.call(run_queue._check_remote)
+
+    assert run_queue.running() >= 1
+    assert run_queue.position(first)[0] < run_queue.position(later)[0]
+    assert run_queue.position(leased) is None
+    with SessionLocal() as db:
+        run = db.get(Run, first)
+        run_queue.annotate([run])
+        assert run.queue_position is not None and run.estimated_wait_s is not None
+    with SessionLocal() as db:
+        db.query(RunJob).filter(RunJob.run_id.in_([leased, later, first])).delete()
+        db.commit()
+
+
+def test_heartbeat_reports_a_run_another_worker_took_over(client, monkeypatch):
+    """Worker A's lease lapses, recovery requeues the job, worker B claims it: A must stop."""
+    worker_a = run_jobs.WORKER_ID
+    run_id = _run_with_job(client, "running", state="leased", worker_id=worker_a, attempts=1,
+                           lease_expires_at=utcnow() - timedelta(minutes=5))
+
+    client.portal.call(run_jobs.recover)  # another process sweeps the stale lease before A's heartbeat
+    with SessionLocal() as db:
+        assert (db.get(Run, run_id).status, db.get(RunJob, run_id).state) == ("queued", "queued")
+    assert client.portal.call(run_jobs.heartbeat, [run_id]) == [run_id]
+
+    monkeypatch.setattr(run_jobs, "WORKER_ID", "worker-b")
+    assert client.portal.call(run_jobs.claim, run_id) is True
+    monkeypatch.setattr(run_jobs, "WORKER_ID", worker_a)
+    assert client.portal.call(run_jobs.heartbeat, [run_id]) == [run_id]
+    with SessionLocal() as db:
+        assert db.get(RunJob, run_id).worker_id == "worker-b"
@@ -0,0 +1,23 @@
+from collections import OrderedDict
+
+import run_queue
+from models import Bot, Run
+
+
+def test_positions_are_published_round_robin_and_read_without_the_queue(client, monkeypatch):
+    monkeypatch.setattr(run_queue, "_classes", [OrderedDict() for _ in run_queue.PRIORITIES])
+    monkeypatch.setattr(run_queue, "_jobs", {})
+    monkeypatch.setattr(run_queue, "_positions", {})
+    bots = {name: Bot(id=name, name=name) for name in ("a", "b")}
+    runs = [Run(id=run_id, bot_id=bot_id, status="queued", trigger="manual")
+            for run_id, bot_id in (("a1", "a"), ("a2", "a"), ("b1", "b"))]
+
+    async def enqueue():
+        for run in runs:
+            run_queue._enqueue_local(run_queue.Job(bots[run.bot_id], run, None))
+        run_queue._publish_positions()
+    client.portal.call(enqueue)
+
+    monkeypatch.setattr(run_queue, "_classes", None)  # annotate() must not touch the live queue
+    run_queue.annotate(runs)
+    assert [run.queue_position for run in runs] == [1, 3, 2]
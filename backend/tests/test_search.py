@@ -0,0 +1,29 @@
+from datetime import datetime
+
+import search_index
+from database import SessionLocal, engine
+from models import Run, RunBody, new_id
+
+
+def test_search_converts_since_with_an_offset_to_utc(client):
+    bot_id = client.post("/api/bots", json={"name": "suche", "prompt": "p"}).json()["id"]
+    conn = engine.raw_connection()
+    try:
+        rowid_before = conn.cursor().execute("SELECT COALESCE(MAX(rowid), 0) FROM runs").fetchone()[0]
+    finally:
+        conn.close()
+    with SessionLocal() as db:
+        for ts in (datetime(2024, 1, 1, 7, 30), datetime(2024, 1, 1, 9, 0)):
+            run_id = new_id()
+            db.add(Run(id=run_id, bot_id=bot_id, status="completed", started_at=ts, finished_at=ts))
+            db.add(RunBody(run_id=run_id, output=f"zeitzonentest {ts:%H:%M}"))
+        db.commit()
+    conn = engine.raw_connection()
+    try:
+        search_index.index_runs(conn.cursor(), rowid_before)
+        conn.commit()
+    finally:
+        conn.close()
+
+    hits = client.get("/api/search", params={"q": "zeitzonentest", "since": "2024-01-01T10:00:00+02:00"}).json()
+    assert [h["started_at"] for h in hits] == ["2024-01-01T09:00:00"]
@@ -0,0 +1,8 @@
+import llm_clients
+
+
+def test_validating_a_key_leaves_no_pooled_client(client):
+    before = dict(llm_clients._clients)
+    resp = client.post("/api/settings/validate-key", json={"provider": "ollama", "key": "http://127.0.0.1:9"})
+    assert resp.json()["valid"] is False
+    assert llm_clients._clients == before
@@ -0,0 +1,70 @@
+import io
+import json
+import os
+import tarfile
+
+from database import SessionLocal
+from models import Bot, UsageRollup
+
+
+def _archive(tables) -> bytes:
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as tar:
+        members = [("manifest.json", json.dumps({"format": 1, "tables": list(tables)}).encode())]
+        members += [(f"{table}.ndjson", "".join(json.dumps(r) + "\n" for r in rows).encode())
+                    for table, rows in tables.items()]
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+def _import(client, bots, **tables):
+    archive = _archive({"bots": bots, **tables})
+    return client.post("/api/workspace/import", files={"file": ("ws.tar.gz", archive)})
+
+
+def test_import_rejects_path_like_bot_ids(client, tmp_path):
+    bot_data = os.environ["BOT_DATA_PATH"]
+    for bad in ("../../escaped", str(tmp_path / "abs"), "a/b", ".."):
+        resp = _import(client, [{"id": bad, "name": "x", "prompt": "p", "docs_path": "/etc"}])
+        assert resp.status_code == 400, bad
+    assert not os.path.exists(os.path.join(bot_data, "..", "..", "escaped"))
+    assert not (tmp_path / "abs").exists()
+    with SessionLocal() as db:
+        assert db.query(Bot).filter(Bot.name == "x", Bot.prompt == "p", Bot.docs_path == "/etc").count() == 0
+
+
+def test_import_gives_bots_a_local_docs_dir(client):
+    resp = _import(client, [{"id": "imp00001", "name": "imp", "prompt": "p", "docs_path": "/etc"}])
+    assert resp.status_code == 200
+    with SessionLocal() as db:
+        docs_path = db.get(Bot, "imp00001").docs_path
+    assert docs_path == os.path.join(os.path.realpath(os.environ["BOT_DATA_PATH"]), "imp00001")
+    assert os.path.isdir(docs_path)
+
+
+def test_import_indexes_and_counts_only_the_imported_runs(client):
+    finished = "2026-01-05 10:30:00.000000"
+    run = {"id": "imprun01", "bot_id": "imp00002", "status": "completed", "model": "gpt-import",
+           "started_at": finished, "finished_at": finished, "duration_ms": 500, "tokens_in": 7}
+    resp = _import(client, [{"id": "imp00002", "name": "imp2", "prompt": "p"}],
+                   runs=[run], run_bodies=[{"run_id": "imprun01", "output": "zebrafisch ergebnis"}])
+    assert resp.json()["tables"]["runs"]["inserted"] == 1
+    assert [h["id"] for h in client.get("/api/search", params={"q": "zebrafisch"}).json()] == ["imprun01"]
+
+    _import(client, [], runs=[run])  # already there: nothing is counted twice
+    with SessionLocal() as db:
+        day = db.query(UsageRollup).filter(UsageRollup.bot_id == "imp00002", UsageRollup.period == "day").one()
+        assert (day.runs, day.tokens_in) == (1, 7)
+
+
+def test_export_streams_a_readable_archive(client):
+    resp = client.get("/api/workspace/export", params={"include_runs": True})
+    assert resp.status_code == 200
+    with tarfile.open(fileobj=io.BytesIO(resp.content), mode="r:gz") as tar:
+        names = tar.getnames()
+        bots = [json.loads(line) for line in tar.extractfile("bots.ndjson")]
+    assert names[0] == "manifest.json" and "runs.ndjson" in names
+    assert any(b["id"] == "imp00001" for b in bots)
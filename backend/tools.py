@@ -5,6 +5,8 @@ import httpx
 import asyncio
 from typing import Optional
 
+import bot_context
+
 
 class WebSearchTool:
     """Search the web using Brave Search API."""
@@ -114,6 +116,7 @@ class FilesTool:
         try:
             with open(path, "w", encoding="utf-8") as f:
                 f.write(content)
+            bot_context.invalidate_docs(self.base_path)
             return f"Datei '{safe}' gespeichert ({len(content)} Zeichen)."
         except Exception as e:
             return f"Fehler beim Schreiben: {e}"
@@ -0,0 +1,71 @@
+"""Standalone run worker — `python -m worker` (from the backend directory).
+
+Executes runs from the shared run_jobs table (run_jobs.py) against the same
+database as the API node, so execution scales out across cores or machines
+while the API node only serves requests, schedules and orchestrates pipelines:
+
+  API node:  EMBEDDED_WORKER=0 uvicorn main:app ...
+  workers:   WORKER_ID=worker-1 WORKER_API_URL=http://api:8080 python -m worker
+
+A worker polls for queued jobs every WORKER_POLL_S, claims them with a lease
+and runs them through its own dispatcher — priorities and provider limits
+(limits.py) therefore apply per worker. Give every worker a stable, unique
+WORKER_ID: a restarted worker then reclaims its stale leases right away,
+others' only after RUN_LEASE_S. Settings are re-read every SETTINGS_MAX_AGE_S.
+Live logs reach the UI through worker_relay when WORKER_API_URL and
+WORKER_RELAY_TOKEN are set (the same token on the API node).
+
+On SIGTERM/SIGINT the worker stops claiming and gives running runs up to
+WORKER_DRAIN_S to finish. Runs still going after that keep their lease and are
+recovered like after a crash — requeued, not lost.
+"""
+import asyncio
+import os
+import signal
+import socket
+
+os.environ.setdefault("WORKER_ID", f"{socket.gethostname()}-worker-{os.getpid()}")
+os.environ.setdefault("SETTINGS_MAX_AGE_S", "10")
+
+from database import dispose_engines
+import db_writer
+import llm_clients
+import migrations
+import run_jobs
+import run_queue
+import worker_relay
+
+DRAIN_S = float(os.getenv("WORKER_DRAIN_S", "60"))
+
+
+async def main():
+    if not migrations.is_current():
+        raise SystemExit("[worker] Datenbank-Schema veraltet — bitte zuerst den API-Server starten")
+    db_writer.start_writer()
+    run_queue.start(execute=True, poll=True)
+    await run_queue.restore()
+    worker_relay.start()
+    print(f"[worker] {run_jobs.WORKER_ID} bereit")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    print(f"[worker] Stoppe — warte bis zu {DRAIN_S:.0f}s auf laufende Runs")
+    left = await run_queue.drain(DRAIN_S)
+    await run_queue.stop()
+    await worker_relay.stop()
+    await db_writer.stop_writer()
+    await llm_clients.close_all()
+    if left:
+        # Exit without cancelling them: a cancelled run would be saved as "cancelled",
+        # an abandoned one is requeued once its lease is recovered.
+        print(f"[worker] {left} Runs an die Lease-Recovery übergeben")
+        os._exit(0)
+    await dispose_engines()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
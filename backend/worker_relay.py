@@ -0,0 +1,89 @@
+"""Forwards a standalone worker's live run messages and events to the API node.
+
+A worker (worker.py) executes runs in its own process, so what bot_runner
+broadcasts (log lines, tokens, status) and what events.publish() emits would
+only reach that process' WebSocket hub and event ring, which nobody listens
+to. start() subscribes to both and ships them in batches — one
+POST {WORKER_API_URL}/api/internal/relay per RELAY_FLUSH_MS — and
+routers/internal_router.py re-publishes them on the API node, so the UI
+follows a remote run live, just like an embedded one.
+
+Relaying is best effort: the queue holds at most RELAY_MAX_PENDING messages
+(oldest dropped first) and a failed POST drops its batch. Run status and
+output are always in the database. Without WORKER_API_URL the relay is off.
+"""
+import asyncio
+import os
+from collections import deque
+from typing import Optional
+
+import httpx
+
+import bot_runner
+import events
+
+API_URL = os.getenv("WORKER_API_URL", "").rstrip("/")
+TOKEN = os.getenv("WORKER_RELAY_TOKEN", "")
+FLUSH_S = float(os.getenv("RELAY_FLUSH_MS", "100")) / 1000
+MAX_PENDING = int(os.getenv("RELAY_MAX_PENDING", "5000"))
+
+_pending: deque = deque(maxlen=MAX_PENDING)
+_wakeup: Optional[asyncio.Event] = None
+_task: Optional[asyncio.Task] = None
+
+
+def _on_broadcast(bot_id: str, message: dict):
+    _pending.append({"kind": "ws", "bot_id": bot_id, "message": message})
+    _wakeup.set()
+
+
+def _on_event(event: dict):
+    _pending.append({"kind": "event", "event": event})
+    _wakeup.set()
+
+
+async def _send(client: httpx.AsyncClient):
+    batch = list(_pending)
+    _pending.clear()
+    try:
+        resp = await client.post(f"{API_URL}/api/internal/relay", json={"items": batch},
+                                 headers={"X-Relay-Token": TOKEN})
+        resp.raise_for_status()
+    except Exception as e:
+        print(f"[worker_relay] dropped {len(batch)} messages: {e}")
+
+
+async def _relay_loop():
+    async with httpx.AsyncClient(timeout=10.0) as client:
+        try:
+            while True:
+                await _wakeup.wait()
+                await asyncio.sleep(FLUSH_S)  # collect a batch
+                _wakeup.clear()
+                await _send(client)
+        except asyncio.CancelledError:
+            if _pending:
+                await _send(client)
+            raise
+
+
+def start():
+    global _wakeup, _task
+    if not API_URL:
+        print("[worker_relay] No WORKER_API_URL — live logs of this worker's runs stay local")
+        return
+    _wakeup = asyncio.Event()
+    bot_runner.add_broadcast_listener(_on_broadcast)
+    events.add_listener(_on_event)
+    _task = asyncio.create_task(_relay_loop())
+    print(f"[worker_relay] Relaying to {API_URL}")
+
+
+async def stop():
+    """Send what is still pending and stop."""
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
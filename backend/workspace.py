@@ -0,0 +1,262 @@
+"""Workspace export / import — whole-instance NDJSON-in-tar archives.
+
+Archive layout (tar, optionally gzipped):
+
+    manifest.json         {"format": 1, "schema_version": N, "tables": [...]}
+    <table>.ndjson        one JSON object per row, raw column values
+
+Rows are copied as stored (SQL-level, no ORM), so compressed run bodies travel
+as-is and nothing is re-encoded. Blobs are wrapped as {"$b64": "..."}.
+
+Export streams: build_archive runs in a thread and writes the tar ("w|" stream
+mode) into a bounded pipe that stream_archive yields from, so the first bytes
+go out while later tables are still being read.
+
+Import streams each member, inserts in executemany batches with INSERT OR IGNORE
+(existing ids win) inside one transaction, then adds only the inserted runs to
+the usage rollups and the search index (they get rowids above the previous
+maximum), and resyncs the scheduler.
+"""
+import base64
+import io
+import json
+import os
+import queue
+import re
+import tarfile
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import IO, Iterator, Optional
+
+from database import engine
+
+CONFIG_TABLES = ["bots", "triggers", "pipelines", "pipeline_steps", "channels", "bot_channels"]
+HISTORY_TABLES = ["runs", "run_bodies", "results", "pipeline_runs"]
+FORMAT_VERSION = 1
+BATCH_ROWS = 5000
+STREAM_CHUNK = 256 * 1024
+PIPE_CHUNKS = 8  # chunks buffered between the export thread and the response
+BOT_ID_RE = re.compile(r"[A-Za-z0-9_-]{1,64}")  # new_id() and older hand-picked ids; never a path
+
+
+def _encode(value):
+    if isinstance(value, bytes):
+        return {"$b64": base64.b64encode(value).decode()}
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict) and "$b64" in value:
+        return base64.b64decode(value["$b64"])
+    return value
+
+
+def _schema_version(cur) -> int:
+    return cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+def _add_member(tar: tarfile.TarFile, name: str, fileobj: IO[bytes]):
+    info = tarfile.TarInfo(name)
+    info.size = fileobj.seek(0, os.SEEK_END)
+    info.mtime = int(time.time())
+    fileobj.seek(0)
+    tar.addfile(info, fileobj)
+
+
+def build_archive(out: IO[bytes], include_runs: bool = False, gzip: bool = True) -> dict:
+    """Write the archive to `out`; returns row counts per table.
+
+    All tables are read in one snapshot. Each member is spooled to a temp file
+    first (tar needs sizes up front), so memory stays flat. `out` only needs write().
+    """
+    tables = CONFIG_TABLES + (HISTORY_TABLES if include_runs else [])
+    counts = {}
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("BEGIN")
+        manifest = {
+            "format": FORMAT_VERSION,
+            "schema_version": _schema_version(cur),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "tables": tables,
+        }
+        with tarfile.open(fileobj=out, mode="w|gz" if gzip else "w|") as tar:
+            _add_member(tar, "manifest.json", io.BytesIO(json.dumps(manifest).encode()))
+            for table in tables:
+                cur.execute(f"SELECT * FROM {table}")
+                columns = [d[0] for d in cur.description]
+                counts[table] = 0
+                with tempfile.TemporaryFile() as member:
+                    while True:
+                        rows = cur.fetchmany(BATCH_ROWS)
+                        if not rows:
+                            break
+                        member.write("".join(
+                            json.dumps(dict(zip(columns, map(_encode, row))), ensure_ascii=False) + "\n"
+                            for row in rows
+                        ).encode("utf-8"))
+                        counts[table] += len(rows)
+                    _add_member(tar, f"{table}.ndjson", member)
+        conn.rollback()
+    finally:
+        conn.close()
+    print(f"[workspace] exported {counts}")
+    return counts
+
+
+class _Pipe:
+    """Write end for build_archive in a thread, read end for the response — bounded by PIPE_CHUNKS."""
+
+    _DONE = object()
+
+    def __init__(self):
+        self._chunks = queue.Queue(maxsize=PIPE_CHUNKS)
+        self._buf = bytearray()
+        self.closed = False
+
+    def _put(self, item) -> bool:
+        while not self.closed:  # closed: the client went away
+            try:
+                self._chunks.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def write(self, data) -> int:
+        self._buf += data
+        if len(self._buf) >= STREAM_CHUNK:
+            if not self._put(bytes(self._buf)):
+                raise BrokenPipeError("Export abgebrochen")
+            self._buf.clear()
+        return len(data)
+
+    def finish(self, error: Optional[BaseException] = None):
+        if error is None and self._buf:
+            self._put(bytes(self._buf))
+        self._put(error or self._DONE)
+
+    def chunks(self) -> Iterator[bytes]:
+        try:
+            while True:
+                item = self._chunks.get()
+                if item is self._DONE:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            self.closed = True
+
+
+def stream_archive(include_runs: bool = False, gzip: bool = True) -> Iterator[bytes]:
+    """Yield the archive in chunks while it is being built (for StreamingResponse)."""
+    pipe = _Pipe()
+
+    def produce():
+        try:
+            build_archive(pipe, include_runs, gzip)
+        except BrokenPipeError:
+            return
+        except Exception as e:
+            pipe.finish(e)
+        else:
+            pipe.finish()
+
+    threading.Thread(target=produce, name="workspace-export", daemon=True).start()
+    yield from pipe.chunks()
+
+
+def _table_columns(cur, table: str) -> list:
+    return [row[1] for row in cur.execute(f"PRAGMA table_info({table})")]
+
+
+def import_archive(fileobj: IO[bytes], docs_root: Optional[str] = None) -> dict:
+    """Load an archive written by build_archive. Returns {table: {"rows", "inserted"}}.
+
+    Unknown tables are skipped and unknown columns dropped, so archives from older
+    or newer schema versions still load. With docs_root, imported bots get a
+    fresh local docs directory; the archive's own docs_path is never used.
+    Raises ValueError for a bot id that isn't a plain name.
+    """
+    import bot_context
+    import http_cache
+    import rollups
+    import search_index
+    from scheduler import sync_bots
+
+    report = {}
+    allowed = set(CONFIG_TABLES + HISTORY_TABLES)
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            runs_before = cur.execute("SELECT COALESCE(MAX(rowid), 0) FROM runs").fetchone()[0]
+            with tarfile.open(fileobj=fileobj, mode="r|*") as tar:
+                for member in tar:
+                    table = member.name.rsplit(".ndjson", 1)[0]
+                    if not member.isfile() or not member.name.endswith(".ndjson") or table not in allowed:
+                        continue
+                    report[table] = _import_member(cur, table, tar.extractfile(member), docs_root)
+            if report.get("runs", {}).get("inserted"):
+                rollups.add_runs(cur, runs_before)
+                search_index.index_runs(cur, runs_before)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    finally:
+        conn.close()
+
+    http_cache.bump_all()
+    bot_context.clear()
+    if report.get("bots", {}).get("inserted"):
+        sync_bots()
+    print(f"[workspace] imported {report}")
+    return report
+
+
+def _docs_dir(docs_root: str, bot_id) -> str:
+    """Local docs directory for an imported bot — the id comes from the archive, so check it."""
+    root = os.path.realpath(docs_root)
+    path = os.path.realpath(os.path.join(root, bot_id)) if isinstance(bot_id, str) else None
+    if not isinstance(bot_id, str) or not BOT_ID_RE.fullmatch(bot_id) or os.path.dirname(path) != root:
+        raise ValueError(f"Ungültige Bot-ID im Archiv: {bot_id!r}")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _import_member(cur, table: str, lines: IO[bytes], docs_root: Optional[str]) -> dict:
+    known = _table_columns(cur, table)
+    rows = inserted = 0
+    columns = sql = None
+    batch = []
+
+    def flush():
+        nonlocal inserted
+        if batch:
+            cur.executemany(sql, batch)
+            inserted += cur.rowcount
+            batch.clear()
+
+    for line in lines:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if columns is None:
+            columns = [c for c in record if c in known]
+            if table == "bots" and "docs_path" not in columns:
+                columns.append("docs_path")
+            sql = f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        if table == "bots":
+            record["docs_path"] = _docs_dir(docs_root, record.get("id")) if docs_root else None
+        batch.append([_decode(record.get(c)) for c in columns])
+        rows += 1
+        if len(batch) >= BATCH_ROWS:
+            flush()
+    flush()
+    return {"rows": rows, "inserted": inserted}
@@ -0,0 +1,135 @@
+"""WebSocket hub — non-blocking fan-out of per-bot log/status messages.
+
+publish() never awaits a socket. Each connection owns a bounded outgoing queue
+drained by its own writer task, so a slow or stalled browser tab only ever
+delays itself:
+
+  * log lines are coalesced per connection and flushed as one frame every
+    COALESCE_MS ({"type": "log", "run_id", "bot_id", "lines": [...], "seq"},
+    seq being that of the last line — see run_replay);
+  * when a queue is full the oldest frame is dropped; a connection that keeps
+    overflowing (MAX_DROPS in a row) is closed with 1013 so it can reconnect;
+  * one socket can subscribe to any number of bot ids (see main.ws_multiplex),
+    and empty subscriber sets are removed.
+"""
+import asyncio
+import os
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Set
+
+from fastapi import WebSocket
+
+QUEUE_MAX = int(os.getenv("WS_QUEUE_MAX", "256"))
+COALESCE_S = float(os.getenv("WS_COALESCE_MS", "50")) / 1000
+MAX_DROPS = int(os.getenv("WS_MAX_DROPS", "64"))
+
+
+class Connection:
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.bots: Set[str] = set()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_MAX)
+        self.dropped = 0
+        self.closed = False
+        self._pending_logs: Dict[tuple, dict] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def send(self, message: dict):
+        """Queue a frame without waiting; drop the oldest one if the client is behind."""
+        if self.closed:
+            return
+        if message.get("type") == "log":
+            key = (message.get("bot_id"), message.get("run_id"))
+            pending = self._pending_logs.setdefault(key, {"lines": [], "seq": None})
+            pending["lines"].append(message["line"])
+            pending["seq"] = message.get("seq")
+            if self._flush_handle is None:
+                self._flush_handle = asyncio.get_running_loop().call_later(COALESCE_S, self._flush_logs)
+            return
+        self._flush_logs()  # keep log/status ordering
+        self._enqueue(message)
+
+    def _flush_logs(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending_logs = self._pending_logs, {}
+        for (bot_id, run_id), batch in pending.items():
+            self._enqueue({"type": "log", "bot_id": bot_id, "run_id": run_id, **batch})
+
+    def _enqueue(self, frame: dict):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            if self.dropped >= MAX_DROPS:
+                self.close(code=1013)
+                return
+        else:
+            self.dropped = 0
+        self.queue.put_nowait(frame)
+
+    async def _write_loop(self):
+        try:
+            while True:
+                frame = await self.queue.get()
+                await self.websocket.send_json(frame)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            pass  # socket gone — the receive loop notices and unregisters
+        finally:
+            self.closed = True
+
+    def close(self, code: int = 1000):
+        if self.closed:
+            return
+        self.closed = True
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        self._writer.cancel()
+        asyncio.create_task(self._close_socket(code))
+
+    async def _close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+
+_subscribers: Dict[str, Set[Connection]] = defaultdict(set)
+
+
+def subscribe(conn: Connection, bot_ids: Iterable[str]):
+    for bot_id in bot_ids:
+        conn.bots.add(bot_id)
+        _subscribers[bot_id].add(conn)
+
+
+def unsubscribe(conn: Connection, bot_ids: Optional[Iterable[str]] = None):
+    for bot_id in list(conn.bots if bot_ids is None else bot_ids):
+        conn.bots.discard(bot_id)
+        subs = _subscribers.get(bot_id)
+        if subs is not None:
+            subs.discard(conn)
+            if not subs:
+                del _subscribers[bot_id]
+
+
+def disconnect(conn: Connection):
+    unsubscribe(conn)
+    conn.close()
+
+
+def publish(bot_id: str, message: dict):
+    """Fan a message out to every connection subscribed to bot_id. Never blocks."""
+    message.setdefault("bot_id", bot_id)
+    for conn in list(_subscribers.get(bot_id, ())):
+        if conn.closed:
+            unsubscribe(conn)
+        else:
+            conn.send(message)
+
+
+def subscriber_count(bot_id: str) -> int:
+    return len(_subscribers.get(bot_id, ()))
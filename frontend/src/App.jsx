@@ -1,6 +1,6 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { Zap, Search, Link, Settings as SettingsIcon, Moon, Sun } from 'lucide-react';
-import { api } from './api';
+import { api, subscribeEvents } from './api';
 import Dashboard from './components/Dashboard';
 import BotDetail from './components/BotDetail';
 import NewBotModal from './components/NewBotModal';
@@ -39,9 +39,13 @@ export default function App() {
     return () => window.removeEventListener('keydown', handler);
   }, []);
 
+  const dashboardVersion = useRef(null);
+
   const refresh = async () => {
-    const [b, a, t] = await Promise.all([api.listBots(), api.activity(), api.listTriggers()]);
-    setBots(b); setActivity(a); setTriggers(t);
+    const d = await api.dashboard(dashboardVersion.current);
+    dashboardVersion.current = d.version;
+    if (d.unchanged) return;
+    setBots(d.bots); setActivity(d.activity); setTriggers(d.triggers);
   };
 
   const checkKeys = async () => {
@@ -51,7 +55,16 @@ export default function App() {
     } catch { setHasKeys(false); }
   };
 
-  useEffect(() => { refresh(); checkKeys(); const i = setInterval(refresh, 5000); return () => clearInterval(i); }, []);
+  useEffect(() => {
+    refresh(); checkKeys();
+    // Push-driven: refresh shortly after run/trigger/pipeline events; slow poll as a safety net
+    let pending = null;
+    const unsubscribe = subscribeEvents(() => {
+      if (!pending) pending = setTimeout(() => { pending = null; refresh(); }, 300);
+    });
+    const i = setInterval(refresh, 30000);
+    return () => { unsubscribe(); clearInterval(i); clearTimeout(pending); };
+  }, []);
 
   const nav = (page) => setView({ page });
 
@@ -20,6 +20,7 @@ export const api = {
   listResults: (id) => request(`/bots/${id}/results`),
   listDocs: (id) => request(`/bots/${id}/docs`),
   activity: () => request('/activity'),
+  dashboard: (version) => request(`/dashboard${version ? `?version=${version}` : ''}`),
   getSettings: () => request('/settings'),
   updateSettings: (settings) => request('/settings', { method: 'PUT', body: JSON.stringify({ settings }) }),
   validateKey: (provider, key) => request('/settings/validate-key', { method: 'POST', body: JSON.stringify({ provider, key }) }),
@@ -66,8 +67,25 @@ export const api = {
 
 export function connectWs(botId, onMessage) {
   const proto = location.protocol === 'https:' ? 'wss' : 'ws';
-  const ws = new WebSocket(`${proto}://${location.host}/ws/bots/${botId}`);
-  ws.onmessage = (e) => onMessage(JSON.parse(e.data));
-  ws.onclose = () => setTimeout(() => connectWs(botId, onMessage), 3000);
-  return ws;
+  let ws, timer, closed = false, seq = 0;
+  const open = () => {
+    // since=<last seq seen>: the server replays what the running runs logged meanwhile
+    ws = new WebSocket(`${proto}://${location.host}/ws/bots/${botId}?since=${seq}`);
+    ws.onmessage = (e) => {
+      const msg = JSON.parse(e.data);
+      if (msg.seq) seq = Math.max(seq, msg.seq);
+      onMessage(msg);
+    };
+    ws.onclose = () => { if (!closed) timer = setTimeout(open, 3000); };
+  };
+  open();
+  // close() stops reconnecting, so unmounted views don't leave sockets behind
+  return { close: () => { closed = true; clearTimeout(timer); ws.close(); } };
+}
+
+export function subscribeEvents(onEvent) {
+  // EventSource reconnects on its own and resends Last-Event-ID
+  const es = new EventSource(`${BASE}/events`);
+  es.onmessage = (e) => onEvent(JSON.parse(e.data));
+  return () => es.close();
 }
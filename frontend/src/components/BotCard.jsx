@@ -8,6 +8,7 @@ const SCHEDULE_LABELS = {
 };
 
 const STATUS_COLORS = {
+  queued:    '#8E8E93',
   running:   '#FF9F0A',
   completed: '#30D158',
   failed:    '#FF3B30',
@@ -8,6 +8,7 @@ export default function BotDetail({ botId, onBack, onRefresh, onEdit }) {
   const [results, setResults] = useState([]);
   const [docs, setDocs] = useState([]);
   const [logs, setLogs] = useState([]);
+  const [streams, setStreams] = useState({});  // run_id -> text streamed so far
   const [tab, setTab] = useState('results');
   const logRef = useRef(null);
 
@@ -21,12 +22,16 @@ export default function BotDetail({ botId, onBack, onRefresh, onEdit }) {
   useEffect(() => { load(); }, [botId]);
   useEffect(() => {
     const ws = connectWs(botId, (msg) => {
-      if (msg.type === 'log') setLogs(prev => [...prev, msg.line]);
+      if (msg.type === 'log') setLogs(prev => [...prev, ...(msg.lines || [msg.line])]);
+      if (msg.type === 'token') setStreams(prev => ({ ...prev, [msg.run_id]: (prev[msg.run_id] || '') + msg.text }));
+      if (msg.type === 'status' && msg.status !== 'running' && msg.status !== 'queued') {
+        setStreams(prev => { const next = { ...prev }; delete next[msg.run_id]; return next; });
+      }
       if (msg.type === 'run_complete') load();
     });
     return () => ws.close();
   }, [botId]);
-  useEffect(() => { if (logRef.current) logRef.current.scrollTop = logRef.current.scrollHeight; }, [logs]);
+  useEffect(() => { if (logRef.current) logRef.current.scrollTop = logRef.current.scrollHeight; }, [logs, streams]);
 
   if (!bot) return <div className="empty-state"><div className="empty-title">Loading...</div></div>;
 
@@ -139,6 +144,11 @@ export default function BotDetail({ botId, onBack, onRefresh, onEdit }) {
                 }} className={r.status === 'running' ? 'pulse-dot' : ''} />
                 <span style={{ width: 80, color: 'var(--text-secondary)', fontWeight: 500 }}>{r.status}</span>
                 <span style={{ color: 'var(--text-tertiary)', fontSize: 13 }}>{r.trigger}</span>
+                {r.status === 'queued' && r.queue_position != null && (
+                  <span style={{ color: 'var(--text-tertiary)', fontSize: 12 }}>
+                    #{r.queue_position} · ~{Math.max(1, Math.round(r.estimated_wait_s / 60))} min
+                  </span>
+                )}
                 <span style={{ flex: 1 }} />
                 <span style={{ color: 'var(--text-tertiary)', fontSize: 12 }}>
                   {r.started_at ? new Date(r.started_at).toLocaleString('en-US') : ''}
@@ -163,9 +173,12 @@ export default function BotDetail({ botId, onBack, onRefresh, onEdit }) {
 
         {tab === 'log' && (
           <div ref={logRef} className="log-output" style={{ height: 320 }}>
-            {logs.length === 0 ? (
+            {logs.length === 0 && Object.keys(streams).length === 0 ? (
               <p style={{ color: 'var(--text-quaternary)' }}>Start a bot run to see live logs...</p>
             ) : logs.map((line, i) => <div key={i} style={{ padding: '1px 0' }}>{line}</div>)}
+            {Object.entries(streams).map(([runId, text]) => (
+              <div key={runId} style={{ padding: '1px 0', whiteSpace: 'pre-wrap', color: 'var(--text-secondary)' }}>{text}</div>
+            ))}
           </div>
         )}
       </div>
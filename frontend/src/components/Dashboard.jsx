@@ -122,6 +122,7 @@ function Chip({ emoji, label }) {
 function ActivityFeed({ activity, onSelect }) {
   const [expanded, setExpanded] = useState(null);
   const STATUS = {
+    queued:    { color: 'var(--text-tertiary)', label: 'Queued', dotClass: '' },
     running:   { color: '#C93400', label: 'Running', dotClass: 'pulse-dot' },
     completed: { color: '#248A3D', label: 'Done', dotClass: '' },
     failed:    { color: '#D70015', label: 'Error', dotClass: '' },